@@ -1,21 +1,44 @@
 """
 FastAPI Server pour E2B CrewAI
 Expose les tools via HTTP REST pour OpenWebUI
+
+mcp_server (CrewAI, E2B SDK) se charge en arrière-plan au démarrage: /health
+répond immédiatement (liveness), /ready passe à 200 une fois le warm-up terminé.
+
+Plusieurs workers (API_WORKERS) ou réplicas partagent sandboxes, sessions et jobs
+via shared_state.py : une session ouverte sur un autre worker y est reprise.
+
+Une tâche dont le client se déconnecte, annulée (DELETE /tasks/{request_id}) ou
+hors délai (REQUEST_TIMEOUT) est arrêtée, ses sandboxes en cours d'exécution
+avec elle (voir cancellation.py).
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+import asyncio
+import importlib
 import os
 import logging
+import sys
+import threading
+import uuid
 from dotenv import load_dotenv
 
-# Import la logique MCP existante
-from mcp_server import (
-    execute_crewai_task,
-    list_active_sandboxes,
-    cleanup_sandbox
-)
+from artifacts import get_artifact_store
+from cancellation import get_request_registry, request_timeout
+from coalescing import get_task_coalescer
+from crawl_cache import get_crawl_cache
+from events import format_sse
+from execution_engine import EngineBusyError, get_execution_engine
+from jobs import FINISHED_STATUSES, JobManager
+from llm_cache import get_completion_cache
+import metrics
+import tracing
+from memoize import get_execution_memo
+from scheduler import BATCH, current_tenant, get_task_scheduler, tenant_from_headers
+from shared_state import get_sandbox_directory
 
 load_dotenv()
 
@@ -37,19 +60,189 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["traceparent"],
 )
 
 
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    """Root span of every request, continuing the caller's trace when it sends a traceparent"""
+    with tracing.span(
+        "http.request",
+        traceparent=request.headers.get("traceparent"),
+        method=request.method,
+        path=request.url.path
+    ) as request_span:
+        response = await call_next(request)
+        request_span.set(status_code=response.status_code)
+    response.headers["traceparent"] = request_span.traceparent
+    return response
+
+
+@app.middleware("http")
+async def identify_tenant(request: Request, call_next):
+    """Tenant of the request, whose tasks share the scheduler's slots fairly with other tenants"""
+    current_tenant.set(tenant_from_headers(request.headers))
+    return await call_next(request)
+
+
+# Background jobs for long-running tasks
+job_manager = None
+
+# Deadline of a job, longer than that of a request someone waits for (REQUEST_TIMEOUT)
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "3600"))
+
+# Set once the MCP logic is imported and sandboxes are pre-warming
+_ready = threading.Event()
+_warm_up_error = None
+
+
+def _mcp():
+    """MCP logic, imported on first use (CrewAI and the E2B SDK are slow to load)"""
+    return importlib.import_module("mcp_server")
+
+
+async def _mcp_async():
+    # Waits for the warm-up import if it is still running, off the event loop
+    if "mcp_server" in sys.modules and _ready.is_set():
+        return sys.modules["mcp_server"]
+    return await asyncio.to_thread(_mcp)
+
+
+def _warm_up():
+    global _warm_up_error
+    try:
+        _mcp().warm_up()
+        _ready.set()
+    except Exception as e:
+        _warm_up_error = str(e)
+        logger.error(f"Warm-up failed: {str(e)}")
+
+
+def _worker_status() -> dict:
+    """Heartbeat fields: the worker's sandboxes and sessions once mcp_server is loaded"""
+    if "mcp_server" not in sys.modules:
+        return {}
+    return sys.modules["mcp_server"].worker_status()
+
+
+async def _run_job(task: str, sandbox_id: str = None, session_id: str = None, coalesce: bool = True,
+                   priority: str = BATCH, timeout: float = None) -> dict:
+    server = await _mcp_async()
+    return await server.execute_crewai_task(
+        task, sandbox_id, session_id, coalesce=coalesce, priority=priority, timeout=timeout or JOB_TIMEOUT
+    )
+
+
+@app.on_event("startup")
+async def on_startup():
+    global job_manager
+
+    directory = get_sandbox_directory()
+    if directory is not None:
+        directory.start_heartbeat(_worker_status)
+        job_manager = JobManager(_run_job, worker=directory.worker, is_alive=directory.is_alive)
+    else:
+        job_manager = JobManager(_run_job)
+    job_manager.recover()
+    job_manager.start()
+    get_request_registry().start()
+    metrics.start_worker()
+
+    # Heavy imports and sandbox pre-warming, /health answers meanwhile
+    threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    job_manager.stop()
+    get_request_registry().stop()
+    metrics.stop_worker()
+    directory = get_sandbox_directory()
+    if directory is not None:
+        directory.stop()
+    if "mcp_server" in sys.modules:
+        sys.modules["mcp_server"].shutdown_sandbox_pools()
+    tracing.shutdown()
+
+
 # Request models
 class TaskRequest(BaseModel):
     task: str
     sandbox_id: Optional[str] = None
+    # Conversation id keeping execute_python state across tasks
+    session_id: Optional[str] = None
+    # Return the time spent per operation (LLM calls, tools, sandboxes)
+    include_timings: bool = False
+    # Share the run of an identical task already in progress
+    coalesce: bool = True
+    # Scheduling class: interactive, research or batch (estimated from the task by default,
+    # batch for jobs)
+    priority: Optional[str] = None
+    # Deadline in seconds, REQUEST_TIMEOUT (JOB_TIMEOUT for jobs) by default
+    timeout: Optional[float] = None
+    # Id to cancel the task with DELETE /tasks/{request_id} (also read from X-Request-Id)
+    request_id: Optional[str] = None
 
 
 class CleanupRequest(BaseModel):
     sandbox_id: str
 
 
+class CrawlBatchRequest(BaseModel):
+    urls: List[str]
+    concurrency: Optional[int] = None
+    timeout: Optional[float] = None
+
+
+def _ensure_capacity():
+    """Reject with 429 a task that would not be admitted, before starting its stream or job"""
+    scheduler = get_task_scheduler()
+    if scheduler is not None:
+        available = scheduler.has_capacity(current_tenant.get())
+    else:
+        available = get_execution_engine().has_capacity()
+    if not available:
+        raise HTTPException(
+            status_code=429,
+            detail="Server busy, retry later",
+            headers={"Retry-After": "5"}
+        )
+
+
+def _request_id(request: TaskRequest, http_request: Request):
+    return request.request_id or http_request.headers.get("X-Request-Id")
+
+
+async def _wait_unless_disconnected(http_request: Request, execution: asyncio.Task) -> dict:
+    """
+    Wait for a task execution, cancelling it if the client disconnects meanwhile
+
+    Starlette does not cancel a handler whose client went away, so the connection
+    is polled every CANCEL_POLL_INTERVAL.
+    """
+    interval = get_request_registry().poll_interval
+    try:
+        while not execution.done():
+            await asyncio.wait({execution}, timeout=interval)
+            if not execution.done() and await http_request.is_disconnected():
+                logger.info("Client disconnected, cancelling its task")
+                execution.cancel()
+                return {"success": False, "error": "Client disconnected", "cancelled": True}
+    except asyncio.CancelledError:
+        execution.cancel()
+        raise
+    if execution.cancelled():
+        # DELETE /tasks/{request_id}
+        return {"success": False, "error": "Task cancelled", "cancelled": True}
+    return execution.result()
+
+
+def _job_summary(job: dict) -> dict:
+    """Job record without the (potentially large) result"""
+    return {key: value for key, value in job.items() if key != "result"}
+
+
 # Endpoints
 @app.get("/")
 def root():
@@ -62,11 +255,51 @@ def root():
 
 @app.get("/health")
 def health():
-    return {"status": "healthy"}
+    """Liveness: the process answers, whether or not warm-up is done"""
+    crawl_cache = get_crawl_cache()
+    llm_cache = get_completion_cache()
+    python_memo = get_execution_memo()
+    artifact_store = get_artifact_store()
+    coalescer = get_task_coalescer()
+    scheduler = get_task_scheduler()
+    directory = get_sandbox_directory()
+    return {
+        "status": "healthy",
+        "ready": _ready.is_set(),
+        "worker": directory.worker if directory else None,
+        # From the last heartbeat: /health stays clear of shared-state I/O (and its lock timeouts)
+        "workers": directory.worker_count if directory else 1,
+        "tasks": get_execution_engine().stats(),
+        "scheduler": scheduler.stats() if scheduler else None,
+        "coalescing": coalescer.stats() if coalescer else None,
+        "crawl_cache": crawl_cache.stats() if crawl_cache else None,
+        "llm_cache": llm_cache.stats() if llm_cache else None,
+        "python_memo": python_memo.stats() if python_memo else None,
+        "artifacts": artifact_store.stats() if artifact_store else None
+    }
+
+
+@app.get("/ready")
+def ready():
+    """Readiness: 200 once CrewAI and the E2B SDK are loaded and sandboxes are pre-warming"""
+    if _ready.is_set():
+        return {"status": "ready"}
+    if _warm_up_error:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": _warm_up_error})
+    return JSONResponse(status_code=503, content={"status": "starting"})
+
+
+@app.get("/metrics")
+def api_metrics():
+    """Prometheus metrics (sandbox, tool and crew latencies, load, cache hits)"""
+    content = metrics.render()
+    if content is None:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    return Response(content=content, media_type=metrics.CONTENT_TYPE_LATEST)
 
 
 @app.post("/execute_crewai_task")
-async def api_execute_task(request: TaskRequest):
+async def api_execute_task(request: TaskRequest, http_request: Request):
     """
     Execute a task using CrewAI agent in E2B sandbox
 
@@ -75,28 +308,225 @@ async def api_execute_task(request: TaskRequest):
     - Web search via Browserbase/DuckDuckGo
     - Academic research via ArXiv
     - More MCP tools
+
+    The task is stopped if the client disconnects, if it is cancelled with
+    DELETE /tasks/{request_id}, or once its deadline passes.
     """
     try:
         logger.info(f"Executing task: {request.task[:100]}...")
 
-        result = await execute_crewai_task(
+        server = await _mcp_async()
+        execution = asyncio.create_task(server.execute_crewai_task(
             task=request.task,
-            sandbox_id=request.sandbox_id
-        )
+            sandbox_id=request.sandbox_id,
+            session_id=request.session_id,
+            timings=request.include_timings,
+            coalesce=request.coalesce,
+            priority=request.priority,
+            timeout=request.timeout
+        ))
+        with get_request_registry().track(
+            _request_id(request, http_request), execution, request.timeout or request_timeout()
+        ):
+            result = await _wait_unless_disconnected(http_request, execution)
 
         logger.info(f"Task completed: {result.get('success', False)}")
         return result
 
+    except EngineBusyError as e:
+        logger.warning(f"Task rejected: {str(e)}")
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         logger.error(f"Task execution failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/execute_crewai_task/stream")
+async def api_stream_task(request: TaskRequest, http_request: Request):
+    """
+    Execute a task and stream its progress as Server-Sent Events
+
+    Events: `accepted` (with the request id to cancel the task with), `agent_step`
+    (thoughts and tool calls), `tool_start`, `tool_output` (partial execute_python /
+    crawl_website output), `tool_end`, and a last `final` event carrying the same
+    payload as /execute_crewai_task. Closing the connection cancels the task.
+    """
+    _ensure_capacity()
+
+    logger.info(f"Streaming task: {request.task[:100]}...")
+    server = await _mcp_async()
+    request_id = _request_id(request, http_request) or uuid.uuid4().hex
+
+    async def event_source():
+        # Cancelled by Starlette when the client disconnects, which cancels the task
+        async for event in server.stream_crewai_task(
+            request.task, request.sandbox_id, request.session_id, request.include_timings,
+            request.coalesce, request.priority, request.timeout, request_id
+        ):
+            yield format_sse(event)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Disable proxy buffering (nginx) so events reach the client immediately
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+@app.post("/jobs", status_code=202)
+async def api_submit_job(request: TaskRequest):
+    """
+    Submit a task as a background job
+
+    Returns immediately with a job id; poll `/jobs/{job_id}` for status and
+    `/jobs/{job_id}/result` for the result.
+    """
+    _ensure_capacity()
+
+    job = job_manager.submit(
+        request.task, request.sandbox_id, request.session_id,
+        coalesce=request.coalesce, priority=request.priority or BATCH, timeout=request.timeout
+    )
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "status_url": f"/jobs/{job['job_id']}",
+        "result_url": f"/jobs/{job['job_id']}/result"
+    }
+
+
+@app.get("/jobs")
+def api_list_jobs(status: Optional[str] = None, limit: int = 50):
+    """List recent jobs, optionally filtered by status"""
+    jobs = job_manager.list(status=status, limit=min(limit, 500))
+    return {
+        "jobs": [_job_summary(job) for job in jobs],
+        "count": len(jobs)
+    }
+
+
+@app.get("/jobs/{job_id}")
+def api_get_job(job_id: str):
+    """Get job status"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return _job_summary(job)
+
+
+@app.get("/jobs/{job_id}/result")
+def api_get_job_result(job_id: str):
+    """Get the result of a finished job (202 with its status while still pending)"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job["status"] not in FINISHED_STATUSES:
+        return JSONResponse(status_code=202, content=_job_summary(job))
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "result": job["result"],
+        "error": job["error"]
+    }
+
+
+@app.delete("/jobs/{job_id}")
+async def api_cancel_job(job_id: str):
+    """Cancel a queued or running job"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return _job_summary(job)
+
+
+@app.delete("/tasks/{request_id}")
+async def api_cancel_task(request_id: str):
+    """
+    Cancel a running task by the request id it was submitted with
+
+    The crew stops at its next step and its running sandbox code is killed, unless an
+    identical submission shares the run (see coalescing.py). Tasks running on another
+    worker are cancelled through the shared state.
+    """
+    if not await asyncio.to_thread(get_request_registry().cancel, request_id):
+        raise HTTPException(status_code=404, detail=f"Task {request_id} not found")
+    return {"request_id": request_id, "status": "cancelling"}
+
+
+@app.post("/crawl_batch")
+async def api_crawl_batch(request: CrawlBatchRequest):
+    """
+    Crawl several URLs concurrently with one shared browser
+
+    Results come back in completion order; failed or timed out pages are
+    reported individually instead of failing the whole batch.
+    """
+    if not request.urls:
+        raise HTTPException(status_code=400, detail="urls must not be empty")
+
+    server = await _mcp_async()
+    try:
+        results = await get_execution_engine().run(
+            server.crawl_many, request.urls, request.concurrency, request.timeout
+        )
+    except EngineBusyError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except Exception as e:
+        logger.error(f"Batch crawl failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "results": results,
+        "count": len(results),
+        "succeeded": sum(1 for result in results if result.get("success"))
+    }
+
+
+@app.get("/artifacts/{handle}")
+def api_get_artifact(handle: str, offset: int = 0, length: Optional[int] = None):
+    """Full text (or a character range) of an artifact referenced in a task result"""
+    store = get_artifact_store()
+    content = store.get(handle) if store else None
+    if content is None:
+        raise HTTPException(status_code=404, detail=f"Artifact {handle} not found")
+    end = offset + length if length is not None else None
+    return PlainTextResponse(content[offset:end])
+
+
+@app.get("/sessions")
+async def api_list_sessions():
+    """List active Python sessions (stateful execute_python kernels)"""
+    server = await _mcp_async()
+    return await server.list_sessions()
+
+
+@app.delete("/sessions/{session_id}")
+async def api_reset_session(session_id: str):
+    """Clear the Python state of a session"""
+    server = await _mcp_async()
+    result = await server.reset_session(session_id)
+    if not result["success"]:
+        raise HTTPException(status_code=404, detail=result["error"])
+    return result
+
+
 @app.get("/list_sandboxes")
 async def api_list_sandboxes():
     """List all active E2B sandboxes"""
     try:
-        result = await list_active_sandboxes()
+        server = await _mcp_async()
+        result = await server.list_active_sandboxes()
         return result
     except Exception as e:
         logger.error(f"Failed to list sandboxes: {str(e)}")
@@ -105,9 +535,10 @@ async def api_list_sandboxes():
 
 @app.delete("/cleanup_sandbox/{sandbox_id}")
 async def api_cleanup_sandbox(sandbox_id: str):
-    """Remove a sandbox from cache"""
+    """Kill a pooled sandbox"""
     try:
-        result = await cleanup_sandbox(sandbox_id)
+        server = await _mcp_async()
+        result = await server.cleanup_sandbox(sandbox_id)
         return result
     except Exception as e:
         logger.error(f"Failed to cleanup sandbox: {str(e)}")
@@ -125,12 +556,23 @@ if __name__ == "__main__":
         logger.error(f"Missing environment variables: {', '.join(missing)}")
         raise Exception(f"Missing required environment variables: {', '.join(missing)}")
 
-    logger.info("Starting E2B CrewAI API server...")
+    workers = int(os.getenv("API_WORKERS", "1"))
+    shared_state = os.getenv("SHARED_STATE", "sqlite").lower()
+    if workers > 1 and shared_state in ("none", "memory"):
+        # Workers would not see each other: each would fail the others' jobs as left over on recovery
+        logger.error(f"API_WORKERS={workers} needs a shared state across processes, not SHARED_STATE={shared_state}")
+        raise Exception(f"SHARED_STATE={shared_state} only supports a single worker, use sqlite or redis")
+    if workers > 1:
+        # Any worker answers /metrics: they aggregate through files in this directory
+        metrics.prepare_multiprocess()
+    logger.info(f"Starting E2B CrewAI API server ({workers} worker(s))...")
     logger.info("API documentation available at: http://0.0.0.0:8000/docs")
 
+    # Import string: each worker process imports the app itself
     uvicorn.run(
-        app,
+        "api_server:app",
         host="0.0.0.0",
         port=8000,
+        workers=workers,
         log_level="info"
     )
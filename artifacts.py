@@ -0,0 +1,255 @@
+"""
+Artifacts
+Content-addressed store keeping large tool outputs out of the LLM context
+
+Outputs above a size threshold (crawled markdown, dataframes, logs) are stored
+under the hash of their content and the tool returns a compact handle plus a
+summary (size, outline of the headings with their offsets, preview). The agent
+reads the slices it needs with the read_artifact tool instead of carrying the
+whole text through every model round trip.
+
+Files live on disk, bounded by total size (least recently read evicted first).
+Disabled with ARTIFACTS_ENABLED=false.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger("e2b-crewai-mcp")
+
+HANDLE_PREFIX = "art_"
+HANDLE_PATTERN = re.compile(r"^art_[0-9a-f]{16}$")
+HEADING_PATTERN = re.compile(r"^(#{1,4})\s+(.+)$", re.MULTILINE)
+
+
+def artifact_handle(content: str) -> str:
+    return HANDLE_PREFIX + hashlib.sha256(content.encode()).hexdigest()[:16]
+
+
+class ArtifactStore:
+    """
+    Disk-backed, content-addressed text artifacts
+
+    Args:
+        root: Directory of the store (ARTIFACT_DIR)
+        max_bytes: Size budget, least recently read artifacts evicted beyond (ARTIFACT_STORE_MB)
+        threshold: Outputs longer than this many characters become artifacts (ARTIFACT_THRESHOLD)
+        preview_chars: Characters of the output shown in the summary (ARTIFACT_PREVIEW_CHARS)
+        max_content: Largest page content fetched from a crawl when artifacts are on (ARTIFACT_MAX_CONTENT)
+    """
+
+    def __init__(self, root: str = None, max_bytes: int = None, threshold: int = None,
+                 preview_chars: int = None, max_content: int = None):
+        self.root = root or os.getenv("ARTIFACT_DIR", ".artifacts")
+        self.max_bytes = int(max_bytes if max_bytes is not None
+                             else float(os.getenv("ARTIFACT_STORE_MB", "256")) * 1024 * 1024)
+        self.threshold = int(threshold if threshold is not None else os.getenv("ARTIFACT_THRESHOLD", "4000"))
+        self.preview_chars = int(preview_chars if preview_chars is not None
+                                 else os.getenv("ARTIFACT_PREVIEW_CHARS", "1500"))
+        self.max_content = int(max_content if max_content is not None
+                               else os.getenv("ARTIFACT_MAX_CONTENT", "500000"))
+
+        self._lock = threading.Lock()
+        self._stats = {"stored": 0, "deduplicated": 0, "reads": 0, "evictions": 0}
+        os.makedirs(self.root, exist_ok=True)
+        self._bytes = sum(size for _, size, _ in self._files())
+
+    # Public API
+
+    def put(self, content: str, kind: str = "text", source: str = None) -> str:
+        """Store a text (a no-op if the same content is already stored), returns its handle"""
+        handle = artifact_handle(content)
+        path = self._path(handle)
+        if os.path.exists(path):
+            os.utime(path)
+            self._count("deduplicated")
+            return handle
+
+        data = content.encode()
+        meta = {"kind": kind, "source": source, "created_at": time.time(), "chars": len(content)}
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        with open(self._meta_path(handle), "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._bytes += len(data)
+            self._stats["stored"] += 1
+            over_budget = self._bytes > self.max_bytes
+        if over_budget:
+            self._evict()
+        return handle
+
+    def get(self, handle: str):
+        """Full text of an artifact, None if unknown or evicted"""
+        if not HANDLE_PATTERN.match(handle or ""):
+            return None
+        path = self._path(handle)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        self._count("reads")
+        return content
+
+    def metadata(self, handle: str) -> dict:
+        try:
+            with open(self._meta_path(handle)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def offload(self, content: str, kind: str = "text", source: str = None) -> str:
+        """
+        Text to hand to the agent: the content itself when small, a handle and summary otherwise
+        """
+        if content is None or len(content) <= self.threshold:
+            return content
+        handle = self.put(content, kind, source)
+        return self.summarize(handle, content, kind, source)
+
+    def summarize(self, handle: str, content: str, kind: str = "text", source: str = None) -> str:
+        """Compact description of an artifact: size, outline with offsets, preview, how to read more"""
+        lines = content.count("\n") + 1
+        origin = f" from {source}" if source else ""
+        parts = [f"[Artifact {handle}: {kind}{origin}, {len(content):,} chars, {lines:,} lines]"]
+
+        outline = [
+            f"  {match.start()}: {match.group(1)} {match.group(2).strip()[:100]}"
+            for match in HEADING_PATTERN.finditer(content)
+        ]
+        if outline:
+            shown = outline[:20]
+            if len(outline) > len(shown):
+                shown.append(f"  ... {len(outline) - len(shown)} more headings")
+            parts.append("Outline (offset: heading):\n" + "\n".join(shown))
+
+        preview = content[:self.preview_chars]
+        cut = preview.rfind("\n")
+        if len(content) > self.preview_chars and cut > self.preview_chars // 2:
+            preview = preview[:cut]
+        parts.append(f"Preview:\n{preview}")
+        parts.append(
+            f'Read more with the Artifact Reader: handle="{handle}", offset=<char offset>, length=<chars>, '
+            f'or query="<words>" to find the relevant passages'
+        )
+        return "\n\n".join(parts)
+
+    def read(self, handle: str, offset: int = 0, length: int = 4000, query: str = None) -> str:
+        """
+        Slice of an artifact for the agent
+
+        Args:
+            handle: Artifact handle
+            offset: First character to return
+            length: Characters to return (capped at the store threshold)
+            query: Words to look for instead: returns the matching lines with their offsets
+
+        Returns:
+            The requested text, with a header telling where it sits in the artifact
+        """
+        content = self.get(handle)
+        if content is None:
+            return f"Error: artifact {handle} not found (unknown handle or evicted)"
+
+        if query:
+            return self._search(handle, content, query)
+
+        offset = max(0, min(int(offset or 0), len(content)))
+        length = max(1, min(int(length or 4000), self.threshold))
+        end = min(len(content), offset + length)
+        header = f"[Artifact {handle}: chars {offset}-{end} of {len(content):,}]"
+        footer = f"\n\n[Next: offset={end}]" if end < len(content) else "\n\n[End of artifact]"
+        return f"{header}\n{content[offset:end]}{footer}"
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "bytes": self._bytes}
+
+    # Internals
+
+    def _search(self, handle: str, content: str, query: str, max_matches: int = 20) -> str:
+        words = [word.lower() for word in re.findall(r"\w+", query)]
+        if not words:
+            return "Error: empty query"
+        matches = []
+        offset = 0
+        for line in content.splitlines(keepends=True):
+            lowered = line.lower()
+            score = sum(1 for word in words if word in lowered)
+            if score:
+                matches.append((score, offset, line.strip()[:300]))
+            offset += len(line)
+        if not matches:
+            return f"[Artifact {handle}: no line matches {query!r}]"
+        best = sorted(matches, key=lambda match: (-match[0], match[1]))[:max_matches]
+        lines = "\n".join(f"  {line_offset}: {text}" for _, line_offset, text in sorted(best, key=lambda m: m[1]))
+        return (
+            f"[Artifact {handle}: {len(matches)} lines match {query!r}, best {len(best)} (offset: line)]\n"
+            f"{lines}\n\nRead around a match with offset=<offset>"
+        )
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _path(self, handle: str) -> str:
+        return os.path.join(self.root, f"{handle}.txt")
+
+    def _meta_path(self, handle: str) -> str:
+        return os.path.join(self.root, f"{handle}.json")
+
+    def _files(self):
+        """(path, size, last access) of every stored artifact"""
+        files = []
+        for name in os.listdir(self.root):
+            if not name.endswith(".txt"):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((path, stat.st_size, stat.st_mtime))
+        return files
+
+    def _evict(self):
+        """Delete least recently read artifacts until under budget"""
+        for path, size, _ in sorted(self._files(), key=lambda item: item[2]):
+            with self._lock:
+                if self._bytes <= self.max_bytes:
+                    return
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            try:
+                os.remove(path[:-len(".txt")] + ".json")
+            except FileNotFoundError:
+                pass
+            with self._lock:
+                self._bytes -= size
+                self._stats["evictions"] += 1
+
+
+_artifact_store = None
+_artifact_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    """Process-wide artifact store, None when ARTIFACTS_ENABLED=false"""
+    global _artifact_store
+    if os.getenv("ARTIFACTS_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    with _artifact_store_lock:
+        if _artifact_store is None:
+            _artifact_store = ArtifactStore()
+        return _artifact_store
@@ -0,0 +1,91 @@
+"""
+Crew setup micro-benchmark
+Per-request cost of building a crew: fresh LLM + Agent every time vs CrewFactory
+
+No model call is made, only object construction is measured.
+
+Usage:
+    python benchmarks/bench_crew_setup.py [-n 200] [--threads 8]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+from crewai import Agent, Task, Crew, LLM
+from crewai.tools import tool
+
+from crew_factory import CrewFactory
+
+AGENT_CONFIG = {
+    "role": "Python Executor and Advanced Web Researcher",
+    "goal": "Execute Python code, crawl websites and solve complex data analysis tasks",
+    "backstory": "You are an expert Python programmer and web researcher. " * 20,
+}
+
+
+@tool("Echo")
+def echo(text: str) -> str:
+    """Return the input unchanged."""
+    return text
+
+
+def create_crew_per_request(task_description: str):
+    """Previous behaviour: everything, LLM client included, built for each request"""
+    agent = Agent(
+        **AGENT_CONFIG,
+        tools=[echo],
+        llm=LLM(model="gpt-4o", api_key=os.getenv("OPENAI_API_KEY")),
+        verbose=True
+    )
+    task = Task(description=task_description, agent=agent, expected_output="Complete solution with execution results")
+    return Crew(agents=[agent], tasks=[task], verbose=True)
+
+
+def measure(build, iterations: int) -> list:
+    timings = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        build(f"Task {i}")
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(label: str, timings: list):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<22} mean {statistics.mean(timings):7.2f} ms   p50 {statistics.median(timings):7.2f} ms   p95 {p95:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--iterations", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8, help="Workers for the concurrent factory run")
+    args = parser.parse_args()
+
+    factory = CrewFactory(AGENT_CONFIG, tools=[echo])
+    # Warm both paths (imports, pydantic schemas) before timing
+    create_crew_per_request("warm-up")
+    factory.create("warm-up")
+
+    before = measure(create_crew_per_request, args.iterations)
+    after = measure(factory.create, args.iterations)
+    report("per-request LLM+Agent", before)
+    report("CrewFactory", after)
+    print(f"speedup (mean)         x{statistics.mean(before) / statistics.mean(after):.2f}")
+
+    # Concurrent use: every crew must get its own agent and task, all sharing one LLM
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        crews = list(pool.map(factory.create, [f"Task {i}" for i in range(args.iterations)]))
+    agents = {id(crew.agents[0]) for crew in crews}
+    llms = {id(crew.agents[0].llm) for crew in crews}
+    print(f"concurrent run         {len(crews)} crews, {len(agents)} distinct agents, {len(llms)} shared LLM")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Import-time benchmark
+Measures the cold import cost of the entry points with `python -X importtime`
+
+Fails (exit code 1) when a module takes longer than its budget, so heavy
+imports creeping back to module level are caught before they slow down
+container start.
+
+Usage:
+    python benchmarks/bench_import_time.py [--runs 3] [--top 10]
+    python benchmarks/bench_import_time.py --budget api_server=1500 --budget mcp_server=1500
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import budget per module, in milliseconds
+DEFAULT_BUDGETS = {
+    "api_server": 1500.0,
+    "mcp_server": 1500.0,
+}
+
+# Must never be imported when the entry points load
+LAZY_MODULES = ("crewai", "e2b_code_interpreter", "litellm")
+
+
+def import_profile(module: str) -> dict:
+    """
+    Import a module in a fresh interpreter
+
+    Returns:
+        {"total_ms", "modules": {name: cumulative ms}} from the -X importtime report
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        last_line = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "unknown error"
+        raise RuntimeError(f"import {module} failed: {last_line}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative) / 1000
+    return {"total_ms": modules.get(module, 0.0), "modules": modules}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports to show")
+    parser.add_argument("--budget", action="append", default=[], metavar="MODULE=MS")
+    args = parser.parse_args()
+
+    budgets = dict(DEFAULT_BUDGETS)
+    for item in args.budget:
+        module, ms = item.split("=", 1)
+        budgets[module] = float(ms)
+
+    failed = False
+    for module, budget in budgets.items():
+        try:
+            profiles = [import_profile(module) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{module:<12} ERROR {str(e)}")
+            failed = True
+            continue
+
+        total = statistics.median(p["total_ms"] for p in profiles)
+        status = "ok" if total <= budget else "OVER BUDGET"
+        print(f"{module:<12} {total:8.1f} ms (median of {args.runs}, budget {budget:.0f} ms) {status}")
+        failed |= total > budget
+
+        eager = [name for name in LAZY_MODULES if name in profiles[-1]["modules"]]
+        if eager:
+            print(f"{'':<12} imported eagerly: {', '.join(eager)}")
+            failed = True
+
+        top_level = {name: ms for name, ms in profiles[-1]["modules"].items() if "." not in name and name != module}
+        for name, ms in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"{'':<12} {ms:8.1f} ms  {name}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Fakes
+Local stand-ins for the E2B SDK and the LLM, used by the load harness
+
+`FakeSandbox` mimics the parts of `e2b_code_interpreter.Sandbox` the servers
+use (create, run_code, commands, files, timeouts, kill) with tunable latencies
+and failure rates, and answers the crawl scripts with well-formed result
+lines. `FakeCrewFactory` replaces the CrewAI factory: each crew alternates fake
+LLM calls and real tool calls (execute_python, crawl_website, crawl_websites)
+following the plan given for its task, so pools, kernels, caches, the engine and
+tracing are exercised exactly as in production, without E2B or OpenAI.
+
+Latencies are {"mean": seconds, "jitter": seconds} (uniform in mean ± jitter),
+or a plain number, and are multiplied by the harness's time scale.
+"""
+import json
+import random
+import sys
+import threading
+import time
+import types
+import uuid
+
+import tracing
+
+CRAWL_RESULT_MARKER = "__CRAWL_RESULT__"
+
+
+class LatencyModel:
+    """Seeded latency and failure draws shared by the fakes"""
+
+    def __init__(self, config: dict = None, seed: int = 0, time_scale: float = 1.0):
+        self.config = config or {}
+        self.time_scale = time_scale
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, name: str):
+        """Sleep for the configured latency of an operation"""
+        latency = self.config.get(name, 0)
+        if isinstance(latency, dict):
+            mean, jitter = latency.get("mean", 0), latency.get("jitter", 0)
+            with self._lock:
+                latency = mean + self._random.uniform(-jitter, jitter)
+        if latency > 0:
+            time.sleep(latency * self.time_scale)
+
+    def fails(self, name: str) -> bool:
+        rate = self.config.get(f"{name}_failure_rate", 0)
+        with self._lock:
+            return rate > 0 and self._random.random() < rate
+
+
+class _Logs:
+    def __init__(self, stdout: list = None, stderr: list = None):
+        self.stdout = stdout or []
+        self.stderr = stderr or []
+
+
+class _Execution:
+    def __init__(self, text: str = None, stdout: list = None, error: str = None):
+        self.text = text
+        self.logs = _Logs(stdout)
+        self.error = error
+        self.results = []
+
+
+class _CommandResult:
+    def __init__(self, exit_code: int = 0, stdout: str = "", stderr: str = ""):
+        self.exit_code = exit_code
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+class _Commands:
+    def __init__(self, sandbox):
+        self._sandbox = sandbox
+
+    def run(self, command: str, timeout: float = None, background: bool = False, envs: dict = None, **kwargs):
+        self._sandbox._check_alive()
+        if not background:
+            self._sandbox.latency.delay("command")
+        if "VmRSS" in command:
+            # Kernel memory probe
+            return _CommandResult(stdout=f"VmRSS:\t  {self._sandbox.memory_mb * 1024} kB\n")
+        return _CommandResult()
+
+
+class _Files:
+    def __init__(self):
+        self.written = {}
+
+    def write(self, path: str, content):
+        self.written[path] = content
+
+
+class FakeSandbox:
+    """In-process stand-in for e2b_code_interpreter.Sandbox"""
+
+    # Set by install_fake_e2b
+    latency = LatencyModel()
+
+    _live = {}
+    _live_lock = threading.Lock()
+    created = 0
+
+    def __init__(self, template: str = None, timeout: int = 300):
+        self.sandbox_id = f"fake-{uuid.uuid4().hex[:12]}"
+        self.template = template
+        self.timeout = timeout
+        self.commands = _Commands(self)
+        self.files = _Files()
+        self._alive = True
+        self.runs = 0
+        # Reported by the kernel memory probe
+        self.memory_mb = 256
+
+    @classmethod
+    def create(cls, template: str = None, timeout: int = 300, **kwargs):
+        cls.latency.delay("create")
+        if cls.latency.fails("create"):
+            raise Exception("Fake sandbox creation failed")
+        sandbox = cls(template=template, timeout=timeout)
+        with cls._live_lock:
+            cls._live[sandbox.sandbox_id] = sandbox
+            cls.created += 1
+        return sandbox
+
+    @classmethod
+    def beta_create(cls, template: str = None, timeout: int = 300, **kwargs):
+        return cls.create(template=template, timeout=timeout)
+
+    @classmethod
+    def connect(cls, sandbox_id: str, **kwargs):
+        with cls._live_lock:
+            sandbox = cls._live.get(sandbox_id)
+        if sandbox is None:
+            raise Exception(f"Sandbox {sandbox_id} not found")
+        return sandbox
+
+    @classmethod
+    def live_count(cls) -> int:
+        with cls._live_lock:
+            return len(cls._live)
+
+    def run_code(self, code: str, on_stdout=None, on_stderr=None, envs: dict = None, timeout: float = None, **kwargs):
+        self._check_alive()
+        self.runs += 1
+        self.latency.delay("run")
+        if self.latency.fails("run"):
+            return _Execution(error="FakeError: simulated execution failure")
+
+        if CRAWL_RESULT_MARKER in code:
+            stdout = self._crawl_output(code)
+        else:
+            stdout = [f"ran {len(code)} chars\n"]
+        if on_stdout is not None:
+            for line in stdout:
+                on_stdout(line)
+        return _Execution(text=stdout[-1].strip() if stdout else None, stdout=stdout)
+
+    def _crawl_output(self, code: str) -> list:
+        """Result lines in the format of the one-shot and batch crawl scripts"""
+        if code.startswith("params = "):
+            params = json.loads(code.split("\n", 1)[0][len("params = "):])
+            lines = []
+            for url in params["urls"]:
+                self.latency.delay("crawl")
+                lines.append(CRAWL_RESULT_MARKER + json.dumps(self._page(url)) + "\n")
+            return lines
+        self.latency.delay("crawl")
+        return [CRAWL_RESULT_MARKER + json.dumps(self._page("page")) + "\n"]
+
+    def _page(self, url: str) -> dict:
+        if self.latency.fails("crawl"):
+            return {"url": url, "success": False, "content": None, "error": "Simulated crawl failure"}
+        return {
+            "url": url, "success": True, "content": f"# {url}\n\n" + "Lorem ipsum dolor sit amet. " * 40,
+            "error": None, "etag": None, "last_modified": None,
+        }
+
+    def is_running(self) -> bool:
+        return self._alive
+
+    def set_timeout(self, timeout: int):
+        self.timeout = timeout
+
+    def keep_alive(self, timeout: int):
+        self.timeout = timeout
+
+    def kill(self):
+        self._alive = False
+        with self._live_lock:
+            self._live.pop(self.sandbox_id, None)
+
+    def get_host(self, port: int) -> str:
+        return f"{port}-{self.sandbox_id}.fake.invalid"
+
+    def _check_alive(self):
+        if not self._alive:
+            raise Exception(f"Sandbox {self.sandbox_id} is not running")
+
+
+def install_fake_e2b(latency: LatencyModel):
+    """Register FakeSandbox as e2b_code_interpreter.Sandbox (before the servers import it)"""
+    FakeSandbox.latency = latency
+    module = types.ModuleType("e2b_code_interpreter")
+    module.Sandbox = FakeSandbox
+    sys.modules["e2b_code_interpreter"] = module
+    return module
+
+
+class FakeLLM:
+    """Completion backend answering after a simulated model latency"""
+
+    def __init__(self, latency: LatencyModel, model: str = "fake-llm"):
+        self.latency = latency
+        self.model = model
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def call(self, messages, **kwargs) -> str:
+        with tracing.span("llm.call", model=self.model, messages=len(messages)):
+            self.latency.delay("call")
+            if self.latency.fails("call"):
+                raise Exception("Simulated LLM error")
+            with self._lock:
+                self.calls += 1
+            return "Thought: done\nFinal Answer: ok"
+
+
+class FakeCrew:
+    """Agent loop: one LLM call before each tool call, and a last one for the answer"""
+
+    def __init__(self, llm: FakeLLM, plan: list, tools: dict, step_callback=None):
+        self.llm = llm
+        self.plan = plan
+        self.tools = tools
+        self.step_callback = step_callback
+
+    def kickoff(self):
+        messages = [{"role": "system", "content": "fake"}]
+        for step in self.plan:
+            thought = self.llm.call(messages)
+            output = self.tools[step["tool"]](step["input"])
+            if self.step_callback is not None:
+                self.step_callback(types.SimpleNamespace(
+                    thought=thought, tool=step["tool"], tool_input=step["input"], output=output
+                ))
+            messages.append({"role": "tool", "content": output})
+        return self.llm.call(messages)
+
+
+class FakeCrewFactory:
+    """
+    Drop-in for crew_factory.CrewFactory
+
+    Args:
+        llm: Shared FakeLLM
+        plans: Task description -> list of {"tool", "input"} steps
+        tools: Tool name -> callable (mcp_server.execute_python, ...)
+        step_callback: Forwarded like the real factory's
+    """
+
+    def __init__(self, llm: FakeLLM, plans: dict, tools: dict, step_callback=None):
+        self.llm = llm
+        self.plans = plans
+        self.tools = tools
+        self.step_callback = step_callback
+
+    def create(self, task_description: str) -> FakeCrew:
+        return FakeCrew(self.llm, self.plans.get(task_description, []), self.tools, self.step_callback)
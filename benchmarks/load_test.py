@@ -0,0 +1,534 @@
+"""
+Load test
+Drives the API server or the MCP call_tool path at a given concurrency
+
+In-process targets run the real servers (engine, pools, kernels, caches,
+tracing) against the fake E2B SDK and LLM from fakes.py, so no E2B or OpenAI
+credit is spent; the `http` target loads a running deployment instead.
+
+Reports throughput, p50/p95/p99 latency, error rate and memory, and exits with
+code 1 when the scenario's thresholds or the regression tolerance against a
+baseline report are exceeded (CI).
+
+Scenario file (JSON):
+    {
+      "name": "smoke",
+      "target": "api",                    # api | mcp | http
+      "endpoint": "/execute_crewai_task",  # api/http: or /execute_crewai_task/stream
+      "concurrency": 8,
+      "requests": 64,
+      "warmup_requests": 4,                # not measured
+      "seed": 1,
+      "time_scale": 1.0,                   # multiplies every fake latency
+      "env": {"CREW_MAX_WORKERS": "4"},    # applied before the servers are imported
+      "sandbox": {"create": {"mean": 1.0, "jitter": 0.3}, "run": 0.2, "crawl": 0.5,
+                  "command": 0.05, "run_failure_rate": 0.0},
+      "llm": {"call": {"mean": 0.8, "jitter": 0.2}, "call_failure_rate": 0.0},
+      "tasks": [
+        {"weight": 3, "task": "Compute", "steps": [{"tool": "execute_python", "input": "print(1)"}]}
+      ],
+      "thresholds": {"p95_max": 10, "throughput_min": 0.5, "error_rate_max": 0.01}
+    }
+
+Thresholds: p50_max, p95_max, p99_max (seconds), throughput_min (requests/s),
+error_rate_max (0-1), memory_peak_mb_max.
+
+Usage:
+    python benchmarks/load_test.py benchmarks/scenarios/smoke.json
+    python benchmarks/load_test.py benchmarks/scenarios/mixed.json --target mcp --concurrency 16
+    python benchmarks/load_test.py scenario.json --output report.json --baseline baseline.json --tolerance 0.2
+    python benchmarks/load_test.py scenario.json --target http --url http://localhost:8000
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULTS = {
+    "target": "api",
+    "endpoint": "/execute_crewai_task",
+    "concurrency": 4,
+    "requests": 20,
+    "warmup_requests": 0,
+    "seed": 0,
+    "time_scale": 1.0,
+    "env": {},
+    "sandbox": {},
+    "llm": {},
+    "tasks": [],
+    "thresholds": {},
+}
+
+# In-process runs: dummy credentials, no daemon to reach, state kept out of the repo
+BENCH_ENV = {
+    "E2B_API_KEY": "e2b-bench",
+    "OPENAI_API_KEY": "sk-bench",
+    "CRAWLER_DAEMON_ENABLED": "false",
+    "LLM_CACHE_ENABLED": "false",
+    "TRACE_EXPORTERS": "",
+    # Scenarios replay the same tasks concurrently: measure real runs unless a scenario opts in
+    "TASK_COALESCING": "false",
+}
+
+TOOLS = ("execute_python", "crawl_website", "crawl_websites")
+
+
+def load_scenario(path: str) -> dict:
+    """Read a scenario file and fill in the defaults"""
+    with open(path) as f:
+        scenario = {**DEFAULTS, **json.load(f)}
+    scenario.setdefault("name", os.path.splitext(os.path.basename(path))[0])
+
+    descriptions = [task["task"] for task in scenario["tasks"]]
+    if not descriptions:
+        raise ValueError(f"Scenario {path} has no tasks")
+    if len(set(descriptions)) != len(descriptions):
+        raise ValueError(f"Scenario {path}: task descriptions must be unique")
+    for task in scenario["tasks"]:
+        for step in task.get("steps", []):
+            if step["tool"] not in TOOLS:
+                raise ValueError(f"Scenario {path}: unknown tool {step['tool']}")
+    return scenario
+
+
+def request_sequence(scenario: dict, count: int) -> list:
+    """Task descriptions to send, drawn by weight with the scenario's seed (same order every run)"""
+    tasks = scenario["tasks"]
+    rng = random.Random(scenario["seed"])
+    return [task["task"] for task in rng.choices(tasks, weights=[t.get("weight", 1) for t in tasks], k=count)]
+
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        # ru_maxrss is in KB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class MemorySampler:
+    """Samples RSS in the background to report its peak"""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.start = self.peak = self.end = rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="memory-sampler", daemon=True)
+
+    def __enter__(self):
+        self.start = self.peak = rss_mb()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.end = rss_mb()
+        self.peak = max(self.peak, self.end)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_mb())
+
+
+# Targets
+
+def install_fakes(scenario: dict):
+    """Fake E2B SDK and crew factory wired into mcp_server, returns the fake LLM"""
+    from fakes import FakeCrewFactory, FakeLLM, LatencyModel, install_fake_e2b
+
+    seed, scale = scenario["seed"], scenario["time_scale"]
+    install_fake_e2b(LatencyModel(scenario["sandbox"], seed=seed, time_scale=scale))
+
+    import mcp_server
+
+    llm = FakeLLM(LatencyModel(scenario["llm"], seed=seed + 1, time_scale=scale))
+    plans = {task["task"]: task.get("steps", []) for task in scenario["tasks"]}
+    tools = {name: getattr(mcp_server, name) for name in TOOLS}
+    # get_crew_factory() returns the installed factory instead of building the CrewAI one
+    mcp_server._crew_factory = FakeCrewFactory(llm, plans, tools, mcp_server._on_agent_step)
+    return llm
+
+
+class AsgiClient:
+    """Minimal ASGI client: lifespan events and buffered HTTP requests"""
+
+    def __init__(self, app):
+        self.app = app
+        self._lifespan_queue = None
+        self._lifespan_task = None
+
+    async def startup(self):
+        self._lifespan_queue = asyncio.Queue()
+        started = asyncio.get_running_loop().create_future()
+
+        async def receive():
+            return await self._lifespan_queue.get()
+
+        async def send(message):
+            if message["type"].startswith("lifespan.startup") and not started.done():
+                started.set_result(message)
+
+        self._lifespan_task = asyncio.create_task(self.app({"type": "lifespan", "asgi": {"version": "3.0"}},
+                                                           receive, send))
+        await self._lifespan_queue.put({"type": "lifespan.startup"})
+        message = await started
+        if message["type"] != "lifespan.startup.complete":
+            raise RuntimeError(f"API startup failed: {message.get('message')}")
+
+    async def shutdown(self):
+        if self._lifespan_task is not None:
+            await self._lifespan_queue.put({"type": "lifespan.shutdown"})
+            await asyncio.wait_for(self._lifespan_task, timeout=30)
+
+    async def request(self, method: str, path: str, payload: dict = None):
+        """Returns (status code, body bytes)"""
+        body = json.dumps(payload).encode() if payload is not None else b""
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": b"", "root_path": "",
+            "headers": [(b"host", b"bench"), (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode())],
+            "client": ("127.0.0.1", 0), "server": ("bench", 80),
+        }
+        disconnected = asyncio.Event()
+        sent = False
+        status = None
+        chunks = []
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            disconnected.set()
+        return status, b"".join(chunks)
+
+
+def _task_succeeded(endpoint: str, status: int, body: bytes) -> bool:
+    if status != 200:
+        return False
+    if endpoint.endswith("/stream"):
+        # Last SSE frame is the "final" event
+        for frame in reversed(body.decode(errors="replace").split("\n\n")):
+            if frame.startswith("event: final"):
+                return json.loads(frame.split("data: ", 1)[1]).get("success", False)
+        return False
+    return json.loads(body).get("success", False)
+
+
+class ApiTarget:
+    """api_server.app in-process, through its ASGI interface"""
+
+    name = "api"
+
+    def __init__(self, scenario: dict):
+        self.scenario = scenario
+        self.endpoint = scenario["endpoint"]
+        self.llm = install_fakes(scenario)
+
+        import api_server
+        self.client = AsgiClient(api_server.app)
+
+    async def start(self):
+        await self.client.startup()
+        # Warm-up runs in a thread, wait for readiness like an orchestrator would
+        for _ in range(600):
+            status, _ = await self.client.request("GET", "/ready")
+            if status == 200:
+                return
+            await asyncio.sleep(0.1)
+        raise RuntimeError("API server never became ready")
+
+    async def send(self, task: str):
+        """Returns (succeeded, status label)"""
+        status, body = await self.client.request("POST", self.endpoint, {"task": task})
+        return _task_succeeded(self.endpoint, status, body), str(status)
+
+    async def stop(self):
+        await self.client.shutdown()
+
+
+class McpTarget:
+    """mcp_server.call_tool in-process, as the MCP stdio server dispatches it"""
+
+    name = "mcp"
+
+    def __init__(self, scenario: dict):
+        self.scenario = scenario
+        self.llm = install_fakes(scenario)
+
+        import mcp_server
+        self.server = mcp_server
+
+    async def start(self):
+        await asyncio.to_thread(self.server.warm_up)
+
+    async def send(self, task: str):
+        contents = await self.server.call_tool("execute_crewai_task", {"task": task})
+        result = json.loads(contents[0].text)
+        if result.get("retry_after") is not None:
+            return False, "busy"
+        return bool(result.get("success")), "ok" if result.get("success") else "error"
+
+    async def stop(self):
+        await asyncio.to_thread(self.server.shutdown_sandbox_pools)
+
+
+class HttpTarget:
+    """A running deployment over HTTP (real backends, no fakes)"""
+
+    name = "http"
+
+    def __init__(self, scenario: dict, url: str):
+        self.scenario = scenario
+        self.endpoint = scenario["endpoint"]
+        self.url = url.rstrip("/")
+        self.llm = None
+
+    async def start(self):
+        pass
+
+    def _post(self, task: str):
+        request = urllib.request.Request(
+            self.url + self.endpoint,
+            data=json.dumps({"task": task}).encode(),
+            method="POST",
+            headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=3600) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    async def send(self, task: str):
+        status, body = await asyncio.to_thread(self._post, task)
+        return _task_succeeded(self.endpoint, status, body), str(status)
+
+    async def stop(self):
+        pass
+
+
+def create_target(scenario: dict, url: str = None):
+    if scenario["target"] == "api":
+        return ApiTarget(scenario)
+    if scenario["target"] == "mcp":
+        return McpTarget(scenario)
+    if scenario["target"] == "http":
+        if not url:
+            raise ValueError("The http target needs --url")
+        return HttpTarget(scenario, url)
+    raise ValueError(f"Unknown target: {scenario['target']}")
+
+
+# Run and report
+
+async def run_load(target, tasks: list, concurrency: int) -> list:
+    """Send the tasks with at most `concurrency` in flight, returns (seconds, succeeded, status) per request"""
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(task):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                succeeded, status = await target.send(task)
+            except Exception as e:
+                succeeded, status = False, type(e).__name__
+            samples.append((time.perf_counter() - started, succeeded, status))
+
+    await asyncio.gather(*(one(task) for task in tasks))
+    return samples
+
+
+async def run_scenario(scenario: dict, url: str = None) -> dict:
+    target = create_target(scenario, url)
+    await target.start()
+    try:
+        warmup = request_sequence({**scenario, "seed": scenario["seed"] + 1000}, scenario["warmup_requests"])
+        if warmup:
+            await run_load(target, warmup, scenario["concurrency"])
+
+        tasks = request_sequence(scenario, scenario["requests"])
+        with MemorySampler() as memory:
+            started = time.perf_counter()
+            samples = await run_load(target, tasks, scenario["concurrency"])
+            duration = time.perf_counter() - started
+    finally:
+        await target.stop()
+
+    latencies = [seconds for seconds, _, _ in samples]
+    failed = sum(1 for _, succeeded, _ in samples if not succeeded)
+    report = {
+        "scenario": scenario["name"],
+        "target": target.name,
+        "concurrency": scenario["concurrency"],
+        "requests": len(samples),
+        "succeeded": len(samples) - failed,
+        "failed": failed,
+        "error_rate": round(failed / len(samples), 4) if samples else 0.0,
+        "statuses": dict(Counter(status for _, _, status in samples)),
+        "duration": round(duration, 3),
+        "throughput": round(len(samples) / duration, 3) if duration else 0.0,
+        "latency": {
+            "mean": round(statistics.mean(latencies), 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3) if latencies else 0.0,
+        },
+        "memory_mb": {
+            "start": round(memory.start, 1),
+            "peak": round(memory.peak, 1),
+            "end": round(memory.end, 1),
+        },
+    }
+    if target.name != "http":
+        from fakes import FakeSandbox
+        report["fakes"] = {
+            "sandboxes_created": FakeSandbox.created,
+            "sandboxes_alive": FakeSandbox.live_count(),
+            "llm_calls": target.llm.calls,
+        }
+    return report
+
+
+def check_thresholds(report: dict, thresholds: dict) -> list:
+    """Threshold violations of a report, as readable strings"""
+    checks = {
+        "p50_max": (report["latency"]["p50"], max),
+        "p95_max": (report["latency"]["p95"], max),
+        "p99_max": (report["latency"]["p99"], max),
+        "error_rate_max": (report["error_rate"], max),
+        "memory_peak_mb_max": (report["memory_mb"]["peak"], max),
+        "throughput_min": (report["throughput"], min),
+    }
+    violations = []
+    for name, limit in thresholds.items():
+        if name not in checks:
+            violations.append(f"unknown threshold {name}")
+            continue
+        value, bound = checks[name]
+        if (bound is max and value > limit) or (bound is min and value < limit):
+            violations.append(f"{name}: {value} (limit {limit})")
+    return violations
+
+
+def check_regression(report: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions beyond `tolerance` (fraction) against a previous report"""
+    violations = []
+    for key in ("p50", "p95", "p99"):
+        before, after = baseline["latency"][key], report["latency"][key]
+        if before and after > before * (1 + tolerance):
+            violations.append(f"{key} regressed: {after}s vs {before}s (+{(after / before - 1) * 100:.0f}%)")
+    before, after = baseline["throughput"], report["throughput"]
+    if before and after < before * (1 - tolerance):
+        violations.append(f"throughput regressed: {after}/s vs {before}/s ({(after / before - 1) * 100:.0f}%)")
+    return violations
+
+
+def print_report(report: dict):
+    latency = report["latency"]
+    print(f"scenario     {report['scenario']} (target {report['target']}, concurrency {report['concurrency']})")
+    print(f"requests     {report['requests']} in {report['duration']}s, {report['failed']} failed "
+          f"({report['error_rate'] * 100:.1f}%), statuses {report['statuses']}")
+    print(f"throughput   {report['throughput']} req/s")
+    print(f"latency      mean {latency['mean']}s  p50 {latency['p50']}s  p95 {latency['p95']}s  "
+          f"p99 {latency['p99']}s  max {latency['max']}s")
+    memory = report["memory_mb"]
+    print(f"memory       start {memory['start']} MB  peak {memory['peak']} MB  end {memory['end']} MB")
+    if "fakes" in report:
+        fakes = report["fakes"]
+        print(f"fakes        {fakes['sandboxes_created']} sandboxes created, {fakes['llm_calls']} LLM calls")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("scenario", help="Scenario JSON file")
+    parser.add_argument("--target", choices=("api", "mcp", "http"), help="Overrides the scenario's target")
+    parser.add_argument("--url", help="Base URL of the deployment (http target)")
+    parser.add_argument("--concurrency", type=int)
+    parser.add_argument("--requests", type=int)
+    parser.add_argument("--time-scale", type=float, help="Multiplies every fake latency")
+    parser.add_argument("--output", help="Write the report as JSON")
+    parser.add_argument("--baseline", help="Previous report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression vs baseline (fraction)")
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.scenario)
+    for key in ("target", "concurrency", "requests", "time_scale"):
+        value = getattr(args, key)
+        if value is not None:
+            scenario[key] = value
+
+    if scenario["target"] != "http":
+        # Before the servers are imported: module-level settings are read at import
+        state_dir = tempfile.mkdtemp(prefix="e2b-bench-")
+        os.environ.update({
+            **BENCH_ENV,
+            "JOBS_DB_PATH": os.path.join(state_dir, "jobs.db"),
+            "CRAWL_CACHE_DIR": os.path.join(state_dir, "crawl_cache"),
+            "SHARED_STATE_PATH": os.path.join(state_dir, "shared_state.db"),
+            **{key: str(value) for key, value in scenario["env"].items()},
+        })
+
+    report = asyncio.run(run_scenario(scenario, args.url))
+    print_report(report)
+
+    violations = check_thresholds(report, scenario["thresholds"])
+    if args.baseline:
+        with open(args.baseline) as f:
+            violations += check_regression(report, json.load(f), args.tolerance)
+    report["violations"] = violations
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    for violation in violations:
+        print(f"FAIL         {violation}")
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Cancellation
+Deadlines and cancellation of crew runs, down to their tool calls
+
+Each crew run gets a `CancelScope`, bound to the context (`current_scope`) so
+that the crew's worker thread and its tools see it. The scope is cancelled when
+nobody waits for the run any more (client disconnected, explicit cancel, job
+cancelled) or when its deadline passes, and then:
+
+- the crew stops at its next step: LLM calls, tools and the step callback call
+  `check()`, which raises `TaskCancelled`
+- sandboxes executing code for the run are killed (`on_cancel` callbacks), so
+  the execution stops now instead of at its timeout
+- tool timeouts never exceed what is left before the deadline (`budget()`)
+
+Requests are tracked by id in a `RequestRegistry` to be cancelled explicitly,
+through any worker when the shared state is enabled.
+"""
+import asyncio
+import contextvars
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from shared_state import get_sandbox_directory
+
+logger = logging.getLogger("e2b-crewai-mcp")
+
+# Shared state namespaces
+REQUESTS = "requests"
+CANCELLATIONS = "cancellations"
+
+# Shortest timeout handed to a tool, 0 means no timeout to some SDKs
+MIN_BUDGET = 1.0
+
+
+class TaskCancelled(Exception):
+    """Raised inside a crew run whose scope was cancelled or whose deadline passed"""
+
+
+def request_timeout():
+    """Default deadline of a task in seconds (REQUEST_TIMEOUT), None when disabled with 0"""
+    timeout = float(os.getenv("REQUEST_TIMEOUT", "900"))
+    return timeout if timeout > 0 else None
+
+
+class CancelScope:
+    """
+    Cancellation state and deadline of one crew run, safe to use from any thread
+
+    Args:
+        timeout: Seconds the run may take, None for no deadline
+        started_at: time.monotonic() the deadline counts from (now by default)
+    """
+
+    def __init__(self, timeout: float = None, started_at: float = None):
+        self.timeout = timeout
+        self.deadline = (started_at or time.monotonic()) + timeout if timeout else None
+        self.reason = None
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._ids = itertools.count()
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None or self.expired
+
+    def remaining(self):
+        """Seconds left before the deadline, None without one"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def budget(self, timeout: float) -> float:
+        """A tool timeout cut down to what is left before the deadline"""
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        remaining = max(MIN_BUDGET, remaining)
+        return min(timeout, remaining) if timeout else remaining
+
+    def cancel(self, reason: str = "Task cancelled"):
+        """Mark the run as cancelled and run the on_cancel callbacks (once)"""
+        with self._lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+        logger.info(f"{reason}, stopping {len(callbacks)} in-flight operation(s)")
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Cancellation callback failed: {str(e)}")
+
+    def check(self):
+        """
+        Raises:
+            TaskCancelled: If the run was cancelled or its deadline passed
+        """
+        if self.reason is not None:
+            raise TaskCancelled(self.reason)
+        if self.expired:
+            raise TaskCancelled(f"Deadline of {self.timeout:g}s exceeded")
+
+    @contextmanager
+    def on_cancel(self, callback):
+        """Call `callback()` if the run is cancelled while the block runs (e.g. kill its sandbox)"""
+        with self._lock:
+            key = next(self._ids)
+            self._callbacks[key] = callback
+            cancelled = self.reason is not None
+        if cancelled:
+            self._callbacks.pop(key, None)
+            callback()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._callbacks.pop(key, None)
+
+
+# Scope of the crew run executing in the current context, None outside of one
+current_scope = contextvars.ContextVar("current_scope", default=None)
+
+
+def check():
+    """Raise TaskCancelled if the current run was cancelled (no-op outside of a run)"""
+    scope = current_scope.get()
+    if scope is not None:
+        scope.check()
+
+
+def budget(timeout: float) -> float:
+    """Tool timeout within the current run's deadline"""
+    scope = current_scope.get()
+    return scope.budget(timeout) if scope is not None else timeout
+
+
+@contextmanager
+def on_cancel(callback):
+    """Call `callback()` if the current run is cancelled while the block runs (no-op for a None callback)"""
+    scope = current_scope.get()
+    if scope is None or callback is None:
+        yield
+        return
+    with scope.on_cancel(callback):
+        yield
+
+
+class RequestRegistry:
+    """
+    In-flight requests of this worker by request id, for explicit cancellation
+
+    With shared state, requests are published so a cancellation received by any
+    worker is forwarded to the one running the request, whose watcher picks it up.
+
+    Args:
+        state: Optional SharedState backend
+        worker: This worker's id, recorded with its requests
+        poll_interval: Seconds between two checks for forwarded cancellations (CANCEL_POLL_INTERVAL)
+    """
+
+    def __init__(self, state=None, worker: str = None, poll_interval: float = None):
+        self.state = state
+        self.worker = worker
+        self.poll_interval = float(poll_interval if poll_interval is not None
+                                   else os.getenv("CANCEL_POLL_INTERVAL", "1"))
+        self._requests = {}
+        self._watcher = None
+
+    @contextmanager
+    def track(self, request_id: str, task: asyncio.Task, ttl: float = None):
+        """
+        Make an asyncio task cancellable by request id for the duration of the block
+
+        Args:
+            ttl: Seconds the request is published for in the shared state (its deadline)
+        """
+        if not request_id:
+            yield
+            return
+        self._requests[request_id] = task
+        self._publish(request_id, ttl)
+        try:
+            yield
+        finally:
+            if self._requests.get(request_id) is task:
+                del self._requests[request_id]
+                self._unpublish(request_id)
+
+    def cancel(self, request_id: str) -> bool:
+        """
+        Cancel a request of this worker, or forward the cancellation to the worker running it
+
+        Returns:
+            False if no worker runs this request
+        """
+        task = self._requests.get(request_id)
+        if task is not None:
+            task.get_loop().call_soon_threadsafe(task.cancel)
+            logger.info(f"Request {request_id} cancelled")
+            return True
+        if self.state is None or self.state.get(REQUESTS, request_id) is None:
+            return False
+        self.state.put(CANCELLATIONS, request_id, {"requested_at": time.time()}, ttl=60)
+        logger.info(f"Request {request_id} cancellation forwarded to its worker")
+        return True
+
+    def active(self) -> list:
+        return list(self._requests)
+
+    def start(self):
+        """Watch for cancellations forwarded by other workers (call from the event loop)"""
+        if self.state is not None and self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch())
+
+    def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+
+    def _publish(self, request_id: str, ttl: float = None):
+        if self.state is None:
+            return
+        try:
+            self.state.put(REQUESTS, request_id, {"worker_id": self.worker, "started_at": time.time()},
+                           ttl=(ttl or 86400) + 60)
+        except Exception as e:
+            logger.warning(f"Failed to publish request {request_id}: {str(e)}")
+
+    def _unpublish(self, request_id: str):
+        if self.state is None:
+            return
+        try:
+            self.state.delete(REQUESTS, request_id)
+        except Exception as e:
+            logger.warning(f"Failed to unpublish request {request_id}: {str(e)}")
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                for request_id, task in list(self._requests.items()):
+                    if await asyncio.to_thread(self.state.get, CANCELLATIONS, request_id) is None:
+                        continue
+                    await asyncio.to_thread(self.state.delete, CANCELLATIONS, request_id)
+                    logger.info(f"Request {request_id} cancelled through another worker")
+                    task.cancel()
+            except Exception as e:
+                logger.warning(f"Cancellation watch failed: {str(e)}")
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_request_registry() -> RequestRegistry:
+    """Process-wide request registry, sharing cancellations through the sandbox directory's state"""
+    global _registry
+    with _registry_lock:
+        directory = get_sandbox_directory()
+        worker = directory.worker if directory is not None else None
+        if _registry is None or _registry.worker != worker:
+            # Rebuilt in a forked worker, like the directory
+            _registry = RequestRegistry(directory.state if directory is not None else None, worker)
+        return _registry
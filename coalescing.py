@@ -0,0 +1,115 @@
+"""
+Coalescing
+Single-flight execution of identical in-flight tasks
+
+Retries and double submissions of a task while its first run is still going
+attach to that run instead of building a crew of their own, and receive the
+same result. Submissions are keyed by a hash of the normalized task text and
+of the options that change the outcome (session, sandbox, timings). Nothing is
+kept once the run finishes: this is not a result cache.
+
+The run is cancelled only when every submission attached to it has gone away,
+so one client giving up does not fail the others.
+
+Disabled with TASK_COALESCING=false, or per submission (coalesce=false).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import unicodedata
+
+logger = logging.getLogger("e2b-crewai-mcp")
+
+
+def normalize_task(task: str) -> str:
+    """Task text up to insignificant differences (line endings, surrounding and trailing whitespace)"""
+    text = unicodedata.normalize("NFC", task or "").strip()
+    return "\n".join(line.rstrip() for line in text.splitlines())
+
+
+def task_key(task: str, **options) -> str:
+    """Coalescing key of a task submission"""
+    payload = json.dumps({"task": normalize_task(task), **options}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class _Flight:
+    """A running execution and the number of submissions waiting for it"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class TaskCoalescer:
+    """Shares one execution between the identical submissions made while it runs"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._stats = {"executions": 0, "coalesced": 0}
+
+    async def run(self, key: str, execute):
+        """
+        Run `execute()` or attach to the identical execution already in flight
+
+        Args:
+            key: Submission key (see `task_key`)
+            execute: Callable returning the coroutine to run when nothing is in flight
+
+        Returns:
+            (result, coalesced): coalesced is True when the result comes from another submission's run
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            coalesced = flight is not None
+            if coalesced:
+                self._stats["coalesced"] += 1
+            else:
+                flight = _Flight(asyncio.ensure_future(execute()))
+                self._flights[key] = flight
+                flight.task.add_done_callback(lambda _: self._forget(key, flight))
+                self._stats["executions"] += 1
+            flight.waiters += 1
+        if coalesced:
+            logger.info(f"Task {key[:12]} already in flight, attaching to it ({flight.waiters} submissions)")
+
+        try:
+            return await asyncio.shield(flight.task), coalesced
+        except asyncio.CancelledError:
+            with self._lock:
+                abandoned = flight.waiters == 1
+            if abandoned and not flight.task.done():
+                # Last submission gone: nobody wants the result any more
+                flight.task.cancel()
+            raise
+        finally:
+            with self._lock:
+                flight.waiters -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._flights)}
+
+    def _forget(self, key: str, flight: _Flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+
+_coalescer = None
+_coalescer_lock = threading.Lock()
+
+
+def get_task_coalescer():
+    """Process-wide task coalescer, None when TASK_COALESCING=false"""
+    global _coalescer
+    if os.getenv("TASK_COALESCING", "true").lower() not in ("1", "true", "yes"):
+        return None
+    with _coalescer_lock:
+        if _coalescer is None:
+            _coalescer = TaskCoalescer()
+        return _coalescer
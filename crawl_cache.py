@@ -0,0 +1,331 @@
+"""
+Crawl Cache
+Two-tier cache of crawl results keyed by normalized URL + crawl config
+
+- Memory tier: LRU bounded by total content size
+- Disk tier: one JSON file per entry, bounded by total size (oldest access evicted first)
+- Per-domain TTLs (CRAWL_CACHE_DOMAIN_TTLS="news.ycombinator.com=300,docs.python.org=86400")
+- Stale entries carrying an ETag / Last-Modified are revalidated with a
+  conditional request before falling back to a full crawl
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger("e2b-crewai-mcp")
+
+# Query parameters that never change page content
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid", "ref_src")
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL so equivalent spellings share a cache entry"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or "http"
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def cache_key(url: str, config: dict = None) -> str:
+    payload = json.dumps({"url": normalize_url(url), "config": config or {}}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def parse_domain_ttls(spec: str) -> dict:
+    """Parse "domain=seconds,domain=seconds" into a dict"""
+    ttls = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        domain, ttl = item.split("=", 1)
+        try:
+            ttls[domain.strip().lower()] = float(ttl)
+        except ValueError:
+            logger.warning(f"Ignoring invalid crawl cache TTL: {item}")
+    return ttls
+
+
+class CrawlCache:
+    """
+    Tiered crawl result cache
+
+    Args:
+        memory_max_bytes: Size budget of the in-memory LRU (CRAWL_CACHE_MEMORY_MB)
+        disk_dir: Directory of the disk tier, None to disable it (CRAWL_CACHE_DIR)
+        disk_max_bytes: Size budget of the disk tier (CRAWL_CACHE_DISK_MB)
+        default_ttl: Seconds an entry stays fresh (CRAWL_CACHE_TTL)
+        domain_ttls: Per-domain TTL overrides, matching subdomains too
+        revalidate_timeout: Seconds allowed for a conditional request
+    """
+
+    def __init__(
+        self,
+        memory_max_bytes: int = None,
+        disk_dir: str = None,
+        disk_max_bytes: int = None,
+        default_ttl: float = None,
+        domain_ttls: dict = None,
+        revalidate_timeout: float = 5.0,
+    ):
+        self.memory_max_bytes = int(memory_max_bytes if memory_max_bytes is not None
+                                    else float(os.getenv("CRAWL_CACHE_MEMORY_MB", "64")) * 1024 * 1024)
+        self.disk_dir = disk_dir if disk_dir is not None else os.getenv("CRAWL_CACHE_DIR", ".crawl_cache")
+        self.disk_max_bytes = int(disk_max_bytes if disk_max_bytes is not None
+                                  else float(os.getenv("CRAWL_CACHE_DISK_MB", "512")) * 1024 * 1024)
+        self.default_ttl = float(default_ttl if default_ttl is not None else os.getenv("CRAWL_CACHE_TTL", "900"))
+        self.domain_ttls = domain_ttls if domain_ttls is not None else parse_domain_ttls(
+            os.getenv("CRAWL_CACHE_DOMAIN_TTLS", ""))
+        self.revalidate_timeout = revalidate_timeout
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._stats = {
+            "memory_hits": 0, "disk_hits": 0, "revalidated": 0,
+            "misses": 0, "stores": 0, "evictions": 0,
+        }
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+
+    # Public API
+
+    def ttl_for(self, url: str) -> float:
+        host = (urlsplit(url).hostname or "").lower()
+        while host:
+            if host in self.domain_ttls:
+                return self.domain_ttls[host]
+            host = host.partition(".")[2]
+        return self.default_ttl
+
+    def get(self, url: str, config: dict = None):
+        """
+        Look up a cached crawl
+
+        Returns:
+            Cached content, or None on a miss (a stale entry that fails
+            revalidation counts as a miss)
+        """
+        key = cache_key(url, config)
+        entry, tier = self._lookup(key)
+        if entry is None:
+            self._count("misses")
+            return None
+
+        if entry["expires_at"] <= time.time():
+            if not self._revalidate(entry):
+                self._count("misses")
+                return None
+            entry["expires_at"] = time.time() + self.ttl_for(url)
+            self._store(key, entry)
+            self._count("revalidated")
+        else:
+            self._count(f"{tier}_hits")
+            if tier == "disk":
+                self._remember(key, entry)
+        return entry["content"]
+
+    def put(self, url: str, content: str, config: dict = None, etag: str = None, last_modified: str = None):
+        """Store a successful crawl"""
+        now = time.time()
+        entry = {
+            "url": normalize_url(url),
+            "content": content,
+            "fetched_at": now,
+            "expires_at": now + self.ttl_for(url),
+            "etag": etag,
+            "last_modified": last_modified,
+        }
+        self._store(cache_key(url, config), entry)
+        self._count("stores")
+
+    def get_or_crawl(self, url: str, crawl, config: dict = None) -> str:
+        """
+        Return the cached content for a URL or crawl it
+
+        Args:
+            url: Page to crawl
+            crawl: Callable(url) -> dict with "content", "success" and optional
+                "etag" / "last_modified" validators
+            config: Crawl configuration, part of the cache key
+        """
+        content = self.get(url, config)
+        if content is not None:
+            return content
+
+        result = crawl(url)
+        if result.get("success") and result.get("content"):
+            self.put(url, result["content"], config, result.get("etag"), result.get("last_modified"))
+        return result.get("content")
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"] + self._stats["revalidated"]
+            lookups = hits + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes,
+            }
+
+    # Internals
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _lookup(self, key: str):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return dict(entry), "memory"
+
+        entry = self._read_disk(key)
+        return (entry, "disk") if entry is not None else (None, None)
+
+    def _store(self, key: str, entry: dict):
+        self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def _remember(self, key: str, entry: dict):
+        size = len(entry["content"].encode())
+        if size > self.memory_max_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= len(old["content"].encode())
+            self._memory[key] = dict(entry)
+            self._memory_bytes += size
+            while self._memory_bytes > self.memory_max_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted["content"].encode())
+                self._stats["evictions"] += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_files(self):
+        """(path, size, last access) for every disk entry"""
+        files = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith(".json"):
+                path = os.path.join(self.disk_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((path, stat.st_size, stat.st_mtime))
+        return files
+
+    def _read_disk(self, key: str):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+            # mtime tracks last access for eviction
+            os.utime(path)
+            return entry
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Dropping unreadable crawl cache entry {path}: {str(e)}")
+            self._delete_disk(path)
+            return None
+
+    def _write_disk(self, key: str, entry: dict):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        data = json.dumps(entry)
+        if len(data) > self.disk_max_bytes:
+            return
+        try:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to write crawl cache entry {path}: {str(e)}")
+            return
+
+        with self._lock:
+            self._disk_bytes += len(data) - previous
+            over_budget = self._disk_bytes > self.disk_max_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _delete_disk(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+            self._stats["evictions"] += 1
+
+    def _evict_disk(self):
+        """Delete least recently accessed files until under budget"""
+        for path, _, _ in sorted(self._disk_files(), key=lambda item: item[2]):
+            with self._lock:
+                if self._disk_bytes <= self.disk_max_bytes:
+                    return
+            self._delete_disk(path)
+
+    def _revalidate(self, entry: dict) -> bool:
+        """Conditional request: True if the server confirms the cached copy (304)"""
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        if not headers:
+            return False
+
+        request = urllib.request.Request(entry["url"], headers=headers, method="GET")
+        try:
+            with urllib.request.urlopen(request, timeout=self.revalidate_timeout) as response:
+                return response.status == 304
+        except urllib.error.HTTPError as e:
+            return e.code == 304
+        except Exception as e:
+            logger.info(f"Revalidation failed for {entry['url']}: {str(e)}")
+            return False
+
+
+_crawl_cache = None
+_crawl_cache_lock = threading.Lock()
+
+
+def get_crawl_cache():
+    """Process-wide crawl cache, None when disabled (CRAWL_CACHE_ENABLED=false)"""
+    global _crawl_cache
+    if os.getenv("CRAWL_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    with _crawl_cache_lock:
+        if _crawl_cache is None:
+            _crawl_cache = CrawlCache()
+        return _crawl_cache
@@ -0,0 +1,259 @@
+"""
+Crawler Daemon
+Long-lived Crawl4AI service running INSIDE a crawler sandbox
+
+Keeps one browser warm across crawls instead of launching Chromium for every
+page. Uploaded and started by crawler_service.py; every request must carry the
+X-Crawler-Token header matching CRAWLER_DAEMON_TOKEN. Crawl requests carrying a
+traceparent header are logged with their trace id.
+
+Endpoints:
+    GET  /health      -> {"ok": true, "browser": true, "crawls": n, "restarts": n}
+    POST /crawl       -> {"url", "run_config", "timeout", "max_content", "extract"} -> crawl result
+                         ("extract": {"query", "token_budget", "chunk_chars"} adds the
+                         page's most relevant excerpts, see relevance.py)
+    POST /crawl_many  -> {"urls", "concurrency", "timeout", "run_config"} -> NDJSON, completion order
+"""
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import time
+
+from aiohttp import web
+from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
+
+try:
+    # Uploaded next to the daemon with the crawler template files
+    from relevance import select as select_excerpts
+except ImportError:
+    select_excerpts = None
+
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+
+# Error fragments meaning the browser (not the page) is gone
+BROWSER_DEAD_ERRORS = ("target closed", "browser has been closed", "connection closed", "browser closed")
+
+# Content size kept for a single crawl, as in the one-shot crawl script
+MAX_CONTENT = 8000
+
+
+class CrawlerService:
+    """Owns the warm AsyncWebCrawler and restarts it when the browser dies"""
+
+    def __init__(self):
+        self.crawler = None
+        self.crawls = 0
+        self.restarts = 0
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        async with self._lock:
+            if self.crawler is not None:
+                return
+            browser_config = BrowserConfig(headless=True, verbose=False, user_agent=USER_AGENT)
+            crawler = AsyncWebCrawler(config=browser_config)
+            await crawler.start()
+            self.crawler = crawler
+
+    async def restart(self):
+        async with self._lock:
+            crawler, self.crawler = self.crawler, None
+            self.restarts += 1
+        if crawler is not None:
+            try:
+                await crawler.close()
+            except Exception:
+                pass
+        await self.start()
+
+    def browser_alive(self) -> bool:
+        if self.crawler is None:
+            return False
+        try:
+            browser = self.crawler.crawler_strategy.browser_manager.browser
+            return browser is None or browser.is_connected()
+        except AttributeError:
+            # Internals differ across Crawl4AI versions, trust the crawler object
+            return True
+
+    async def arun(self, url: str, run_config):
+        """Crawl with one automatic browser restart if the browser died"""
+        for attempt in range(2):
+            if self.crawler is None or not self.browser_alive():
+                await self.restart()
+            try:
+                result = await self.crawler.arun(url=url, config=run_config)
+                self.crawls += 1
+                return result
+            except Exception as e:
+                if attempt == 0 and any(fragment in str(e).lower() for fragment in BROWSER_DEAD_ERRORS):
+                    await self.restart()
+                    continue
+                raise
+
+
+def extract_content(result):
+    markdown = getattr(result, "markdown", None)
+    if markdown:
+        return getattr(markdown, "raw_markdown", None) or str(markdown)
+    if getattr(result, "cleaned_html", None):
+        return result.cleaned_html
+    if getattr(result, "html", None):
+        return result.html[:5000]
+    return None
+
+
+def extract_headlines(html: str):
+    """Fallback for pages whose markdown is empty (news sites)"""
+    try:
+        from bs4 import BeautifulSoup
+    except ImportError:
+        return None
+    soup = BeautifulSoup(html, "html.parser")
+    headlines = []
+    for selector in (".titleline a", "h1, h2, h3", ".title", "article h1, article h2"):
+        for elem in soup.select(selector)[:10]:
+            text = elem.get_text().strip()
+            if len(text) > 10:
+                headlines.append(text)
+    return "\n".join(f"• {headline}" for headline in headlines[:15]) if headlines else None
+
+
+def smart_truncate(content: str, limit: int) -> str:
+    if not limit or len(content) <= limit:
+        return content
+    truncate_at = content.find("\n\n", int(limit * 0.875))
+    if 0 < truncate_at <= limit:
+        return content[:truncate_at] + "\n\n[Content truncated...]"
+    return content[:limit] + "\n[Content truncated...]"
+
+
+def relevant_excerpts(content: str, extract: dict):
+    """Excerpts of the untruncated page matching the query, None without a query or relevance.py"""
+    if not extract or not content or select_excerpts is None:
+        return None
+    return select_excerpts(
+        content, extract["query"], extract.get("token_budget", 1500), extract.get("chunk_chars", 1000)
+    )
+
+
+def to_result(url: str, result, started: float, limit: int = None, extract: dict = None) -> dict:
+    headers = {k.lower(): v for k, v in (getattr(result, "response_headers", None) or {}).items()}
+    content = extract_content(result) if result.success else None
+    if content and len(content.strip()) <= 50 and getattr(result, "html", None):
+        headlines = extract_headlines(result.html)
+        if headlines:
+            content = f"Headlines extracted from {url}:\n\n{headlines}"
+    success = bool(content and len(content.strip()) > 50)
+    return {
+        "url": url,
+        "success": success,
+        "content": smart_truncate(content, limit) if success else None,
+        "relevant": relevant_excerpts(content, extract) if success else None,
+        "error": None if success else (getattr(result, "error_message", None) or "No meaningful content extracted"),
+        "status_code": getattr(result, "status_code", None),
+        "etag": headers.get("etag"),
+        "last_modified": headers.get("last-modified"),
+        "elapsed": round(time.time() - started, 2),
+    }
+
+
+async def crawl_url(service: CrawlerService, url: str, run_config: dict, timeout: float, limit: int = None,
+                    extract: dict = None) -> dict:
+    started = time.time()
+    config = CrawlerRunConfig(cache_mode=CacheMode.BYPASS, **run_config)
+    try:
+        result = await asyncio.wait_for(service.arun(url, config), timeout=timeout)
+        crawled = to_result(url, result, started, limit, extract)
+        if not crawled["success"] and not result.success:
+            # Simple fallback config, as in the one-shot crawl script
+            simple = CrawlerRunConfig(cache_mode=CacheMode.BYPASS, word_count_threshold=1, page_timeout=15000)
+            fallback = await asyncio.wait_for(service.arun(url, simple), timeout=timeout)
+            if fallback.success:
+                crawled = to_result(url, fallback, started, limit, extract)
+        return crawled
+    except asyncio.TimeoutError:
+        return {"url": url, "success": False, "content": None, "error": f"Timed out after {timeout}s"}
+    except Exception as e:
+        return {"url": url, "success": False, "content": None, "error": str(e)}
+
+
+def create_app(service: CrawlerService, token: str) -> web.Application:
+
+    @web.middleware
+    async def check_token(request, handler):
+        if not hmac.compare_digest(request.headers.get("X-Crawler-Token", "").encode(), token.encode()):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        traceparent = request.headers.get("traceparent")
+        if traceparent and request.method == "POST":
+            # traceparent: 00-<trace id>-<parent span id>-<flags>
+            print(f"[trace {traceparent.split('-')[1] if traceparent.count('-') == 3 else traceparent}] "
+                  f"{request.method} {request.path}", flush=True)
+        return await handler(request)
+
+    async def health(request):
+        if not service.browser_alive():
+            try:
+                await service.restart()
+            except Exception as e:
+                return web.json_response({"ok": False, "browser": False, "error": str(e)}, status=503)
+        return web.json_response({
+            "ok": True,
+            "browser": service.browser_alive(),
+            "crawls": service.crawls,
+            "restarts": service.restarts,
+        })
+
+    async def crawl(request):
+        body = await request.json()
+        result = await crawl_url(
+            service, body["url"], body.get("run_config", {}),
+            body.get("timeout", 60), body.get("max_content", MAX_CONTENT), body.get("extract")
+        )
+        return web.json_response(result)
+
+    async def crawl_many(request):
+        body = await request.json()
+        semaphore = asyncio.Semaphore(max(1, body.get("concurrency", 5)))
+
+        async def bounded(url):
+            async with semaphore:
+                return await crawl_url(service, url, body.get("run_config", {}), body.get("timeout", 45))
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        for next_done in asyncio.as_completed([bounded(url) for url in body["urls"]]):
+            await response.write((json.dumps(await next_done) + "\n").encode())
+        await response.write_eof()
+        return response
+
+    app = web.Application(middlewares=[check_token])
+    app.router.add_get("/health", health)
+    app.router.add_post("/crawl", crawl)
+    app.router.add_post("/crawl_many", crawl_many)
+
+    async def on_startup(app):
+        await service.start()
+
+    async def on_cleanup(app):
+        if service.crawler is not None:
+            await service.crawler.close()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    web.run_app(
+        create_app(CrawlerService(), os.environ["CRAWLER_DAEMON_TOKEN"]),
+        host="0.0.0.0",
+        port=args.port,
+        access_log=None
+    )
@@ -0,0 +1,186 @@
+"""
+Crawler Service
+Host-side client of the crawler daemon running inside crawler sandboxes
+
+The daemon (crawler_daemon.py) is uploaded and started when a crawler sandbox is
+created, so the browser is already warm when the sandbox is leased. Requests go
+straight to the sandbox's public port and are authenticated with a per-daemon token.
+"""
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import tracing
+
+logger = logging.getLogger("e2b-crewai-mcp")
+
+DAEMON_PORT = int(os.getenv("CRAWLER_DAEMON_PORT", "8765"))
+DAEMON_PATH = "/home/user/crawler_daemon.py"
+DAEMON_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "crawler_daemon.py")
+START_TIMEOUT = float(os.getenv("CRAWLER_DAEMON_START_TIMEOUT", "60"))
+PROBE_TIMEOUT = 5.0
+
+
+class CrawlerDaemonError(Exception):
+    """Raised when the in-sandbox crawler daemon cannot be reached"""
+
+
+# sandbox_id -> {"url": ..., "token": ...}
+_daemons = {}
+_daemons_lock = threading.Lock()
+
+
+def _endpoint(sandbox):
+    with _daemons_lock:
+        return _daemons.get(sandbox.sandbox_id)
+
+
+def _request(endpoint: dict, path: str, payload: dict = None, timeout: float = PROBE_TIMEOUT):
+    """Open a request to the daemon, returns the raw response"""
+    data = json.dumps(payload).encode() if payload is not None else None
+    headers = {"X-Crawler-Token": endpoint["token"], "Content-Type": "application/json"}
+    trace_header = tracing.traceparent()
+    if trace_header:
+        headers["traceparent"] = trace_header
+    request = urllib.request.Request(
+        endpoint["url"] + path,
+        data=data,
+        method="POST" if data is not None else "GET",
+        headers=headers
+    )
+    try:
+        return urllib.request.urlopen(request, timeout=timeout)
+    except (urllib.error.URLError, OSError) as e:
+        raise CrawlerDaemonError(f"Crawler daemon unreachable: {str(e)}")
+
+
+def has_daemon(sandbox) -> bool:
+    """True if a daemon was started in this sandbox"""
+    return _endpoint(sandbox) is not None
+
+
+def probe(sandbox) -> bool:
+    """Health probe: True if the daemon answers and its browser is up"""
+    endpoint = _endpoint(sandbox)
+    if endpoint is None:
+        return False
+    try:
+        with _request(endpoint, "/health") as response:
+            return bool(json.loads(response.read()).get("ok"))
+    except Exception:
+        return False
+
+
+def start_daemon(sandbox):
+    """
+    Upload and start the crawler daemon, then wait until its browser is warm
+
+    Raises:
+        CrawlerDaemonError: If the daemon does not become healthy in time
+    """
+    token = secrets.token_urlsafe(24)
+    with open(DAEMON_SOURCE, "r") as f:
+        sandbox.files.write(DAEMON_PATH, f.read())
+
+    sandbox.commands.run(
+        f"python {DAEMON_PATH} --port {DAEMON_PORT}",
+        background=True,
+        envs={"CRAWLER_DAEMON_TOKEN": token}
+    )
+
+    with _daemons_lock:
+        _daemons[sandbox.sandbox_id] = {
+            "url": f"https://{sandbox.get_host(DAEMON_PORT)}",
+            "token": token
+        }
+
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        if probe(sandbox):
+            logger.info(f"Crawler daemon ready in sandbox {sandbox.sandbox_id}")
+            return
+        time.sleep(1)
+    raise CrawlerDaemonError(f"Crawler daemon did not start within {START_TIMEOUT:g}s")
+
+
+def forget(sandbox_id: str):
+    with _daemons_lock:
+        _daemons.pop(sandbox_id, None)
+
+
+def ensure_daemon(sandbox) -> bool:
+    """
+    Health check for pooled crawler sandboxes: probe, restart the daemon if it died
+
+    Returns:
+        False if the sandbox should be discarded
+    """
+    if probe(sandbox):
+        return True
+    logger.warning(f"Crawler daemon down in sandbox {sandbox.sandbox_id}, restarting")
+    try:
+        sandbox.commands.run(f"pkill -f {DAEMON_PATH} || true", timeout=10)
+        start_daemon(sandbox)
+        return True
+    except Exception as e:
+        logger.error(f"Crawler daemon restart failed in sandbox {sandbox.sandbox_id}: {str(e)}")
+        forget(sandbox.sandbox_id)
+        return False
+
+
+def crawl(sandbox, url: str, run_config: dict, timeout: float, max_content: int = None, extract: dict = None) -> dict:
+    """
+    Crawl one page through the sandbox's daemon
+
+    Args:
+        max_content: Characters of content returned (daemon default if None)
+        extract: {"query", "token_budget", "chunk_chars"} to also get the page's most
+            relevant excerpts under "relevant"
+    """
+    endpoint = _endpoint(sandbox)
+    if endpoint is None:
+        raise CrawlerDaemonError("No crawler daemon in sandbox")
+    payload = {"url": url, "run_config": run_config, "timeout": timeout}
+    if max_content is not None:
+        payload["max_content"] = max_content
+    if extract:
+        payload["extract"] = extract
+    with _request(endpoint, "/crawl", payload, timeout=timeout * 2 + 10) as response:
+        return json.loads(response.read())
+
+
+def crawl_many(sandbox, urls: list, run_config: dict, concurrency: int, timeout: float, on_result=None) -> list:
+    """
+    Crawl several pages through the sandbox's daemon
+
+    Args:
+        on_result: Optional callable(result) invoked as each page completes
+
+    Returns:
+        Results in completion order (possibly partial if the stream breaks)
+    """
+    endpoint = _endpoint(sandbox)
+    if endpoint is None:
+        raise CrawlerDaemonError("No crawler daemon in sandbox")
+
+    payload = {"urls": urls, "run_config": run_config, "concurrency": concurrency, "timeout": timeout}
+    results = []
+    try:
+        with _request(endpoint, "/crawl_many", payload, timeout=timeout * 2 + 10) as response:
+            for line in response:
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+    except Exception as e:
+        if not results:
+            raise CrawlerDaemonError(f"Batch crawl through daemon failed: {str(e)}")
+        logger.warning(f"Batch crawl stream interrupted after {len(results)} pages: {str(e)}")
+    return results
@@ -0,0 +1,150 @@
+"""
+Crew Factory
+Builds per-request crews around shared, immutable agent and LLM configuration
+
+The LLM client and the agent definition are created once and reused; each
+request only gets its own Agent/Task/Crew objects, since CrewAI mutates those
+while a crew runs (crew back-references, executors, usage counters) and they
+cannot be shared between concurrent tasks. Model calls of every crew go
+through one pooled HTTP client, so connections to the provider are kept alive
+across requests. With LLM_CACHE_ENABLED, identical completion requests are
+answered from the disk cache (see llm_cache.py). Each model call is recorded
+as an "llm.call" tracing span, and no call starts once the run is cancelled
+(see cancellation.py).
+"""
+import logging
+import os
+import threading
+
+from crewai import Agent, Task, Crew, LLM
+
+import cancellation
+import tracing
+from llm_cache import completion_key, get_completion_cache
+
+logger = logging.getLogger("e2b-crewai-mcp")
+
+_http_client_lock = threading.Lock()
+
+
+def install_shared_http_client():
+    """
+    Route litellm's synchronous calls through one pooled httpx client
+
+    Returns:
+        The shared client, or None if litellm/httpx are unavailable
+    """
+    try:
+        import httpx
+        import litellm
+    except ImportError:
+        return None
+
+    with _http_client_lock:
+        if getattr(litellm, "client_session", None) is None:
+            limits = httpx.Limits(
+                max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20")),
+                max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "10")),
+                keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60")),
+            )
+            litellm.client_session = httpx.Client(limits=limits, timeout=httpx.Timeout(600.0, connect=10.0))
+            logger.info("Shared LLM HTTP client installed")
+        return litellm.client_session
+
+
+class TracedLLM(LLM):
+    """LLM recording a tracing span per completion call"""
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+        # Between two steps of the agent: stop here if nobody waits for the run any more
+        cancellation.check()
+        message_count = len(messages) if isinstance(messages, list) else 1
+        with tracing.span("llm.call", model=self.model, messages=message_count) as span:
+            return self._complete(span, messages, tools, callbacks, available_functions, **kwargs)
+
+    def _complete(self, span, messages, tools, callbacks, available_functions, **kwargs):
+        return LLM.call(self, messages, tools=tools, callbacks=callbacks,
+                        available_functions=available_functions, **kwargs)
+
+
+class CachingLLM(TracedLLM):
+    """LLM replaying identical completion requests from the completion cache"""
+
+    def _complete(self, span, messages, tools, callbacks, available_functions, **kwargs):
+        cache = get_completion_cache()
+        # Native function calling runs tools inside the call, that must never be replayed
+        if cache is None or available_functions:
+            return super()._complete(span, messages, tools, callbacks, available_functions, **kwargs)
+
+        key = completion_key(
+            self.model, messages, tools,
+            temperature=getattr(self, "temperature", None),
+            stop=getattr(self, "stop", None),
+            max_tokens=getattr(self, "max_tokens", None)
+        )
+        cached = cache.get(key)
+        span.set(cached=cached is not None)
+        if cached is not None:
+            return cached
+
+        response = super()._complete(span, messages, tools, callbacks, None, **kwargs)
+        if isinstance(response, str):
+            cache.put(key, response, self.model)
+        return response
+
+
+class CrewFactory:
+    """
+    Creates single-agent crews for task descriptions
+
+    Args:
+        agent_config: Agent keyword arguments shared by every crew (role, goal, backstory, ...)
+        tools: Tools given to the agent
+        model: LLM model name (CREW_LLM_MODEL)
+        step_callback: Optional callable(step) attached to every crew
+        expected_output: Expected output of the per-request task
+        llm_class: LLM class to instantiate (CachingLLM when the completion cache is enabled, TracedLLM otherwise)
+    """
+
+    def __init__(self, agent_config: dict, tools: list, model: str = None, step_callback=None,
+                 expected_output: str = "Complete solution with execution results", llm_class=None):
+        self.agent_config = dict(agent_config)
+        self.tools = tuple(tools)
+        self.model = model or os.getenv("CREW_LLM_MODEL", "gpt-4o")
+        self.step_callback = step_callback
+        self.expected_output = expected_output
+        self.llm_class = llm_class or (CachingLLM if get_completion_cache() is not None else TracedLLM)
+
+        self._lock = threading.Lock()
+        self._llm = None
+
+    @property
+    def llm(self):
+        """Shared LLM, created on first use"""
+        with self._lock:
+            if self._llm is None:
+                install_shared_http_client()
+                self._llm = self.llm_class(model=self.model, api_key=os.getenv("OPENAI_API_KEY"))
+            return self._llm
+
+    def create(self, task_description: str) -> Crew:
+        """Build a crew for one request, safe to call from concurrent workers"""
+        agent = Agent(
+            **self.agent_config,
+            tools=list(self.tools),
+            llm=self.llm,
+            verbose=True
+        )
+
+        task = Task(
+            description=task_description,
+            agent=agent,
+            expected_output=self.expected_output
+        )
+
+        return Crew(
+            agents=[agent],
+            tasks=[task],
+            step_callback=self.step_callback,
+            verbose=True
+        )
@@ -0,0 +1,96 @@
+"""
+Events
+Live progress events (agent steps, tool calls, partial tool output, final answer)
+
+Producers call `emit(...)` from anywhere in a task, including crew worker
+threads: the emitter bound to the current context (see `current_emitter`)
+forwards the event, and nothing happens when no one is listening. Consumers
+iterate an `EventStream` from the event loop (SSE endpoint, MCP progress).
+"""
+import asyncio
+import contextvars
+import json
+import time
+
+# Emitter of the task running in the current context, None when not streaming
+current_emitter = contextvars.ContextVar("current_emitter", default=None)
+
+# Longest text carried by a single event
+MAX_EVENT_TEXT = 2000
+
+
+def truncate(text, limit: int = MAX_EVENT_TEXT) -> str:
+    text = "" if text is None else str(text)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+class EventStream:
+    """
+    Thread-safe event queue consumed by an asyncio task
+
+    Must be created on the event loop that consumes it.
+    """
+
+    _CLOSED = object()
+
+    def __init__(self, heartbeat: float = 15.0):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._closed = False
+        self.heartbeat = heartbeat
+
+    def emit(self, event_type: str, **data):
+        """Queue an event, safe to call from any thread"""
+        if self._closed:
+            return
+        event = {"type": event_type, "timestamp": time.time(), **data}
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, event)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, self._CLOSED)
+
+    async def __aiter__(self):
+        """Yield events until closed, `None` every `heartbeat` seconds of silence"""
+        while True:
+            try:
+                event = await asyncio.wait_for(self._queue.get(), timeout=self.heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if event is self._CLOSED:
+                return
+            yield event
+
+
+def emit(event_type: str, **data):
+    """Send an event to the current task's listener, if any"""
+    emitter = current_emitter.get()
+    if emitter is not None:
+        emitter.emit(event_type, **data)
+
+
+def format_sse(event: dict) -> str:
+    """Server-Sent Events frame for an event (`None` gives a keep-alive comment)"""
+    if event is None:
+        return ": keep-alive\n\n"
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+def describe(event: dict) -> str:
+    """One-line human readable summary of an event"""
+    event_type = event["type"]
+    if event_type == "agent_step":
+        if event.get("tool"):
+            return f"Agent using {event['tool']}: {truncate(event.get('thought'), 200)}"
+        return f"Agent: {truncate(event.get('thought') or event.get('output'), 200)}"
+    if event_type == "tool_start":
+        return f"{event['tool']} started"
+    if event_type == "tool_output":
+        return f"{event['tool']}: {truncate(event.get('text'), 200)}"
+    if event_type == "tool_end":
+        return f"{event['tool']} finished"
+    if event_type == "final":
+        return "Task completed" if event.get("success") else f"Task failed: {event.get('error')}"
+    return event_type
@@ -0,0 +1,131 @@
+"""
+Execution Engine
+Runs blocking crew executions in a worker pool so the event loop stays responsive
+
+`crew.kickoff()` is synchronous and can take minutes. The engine runs it in a
+bounded thread pool and admits at most `max_workers + max_queue` executions;
+anything beyond that is rejected with `EngineBusyError` (HTTP 429 in api_server).
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("e2b-crewai-mcp")
+
+
+class EngineBusyError(Exception):
+    """Raised when the admission queue is full"""
+
+    def __init__(self, message: str, retry_after: int = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ExecutionEngine:
+    """
+    Bounded worker pool for blocking task executions
+
+    Args:
+        max_workers: Executions running concurrently (CREW_MAX_WORKERS)
+        max_queue: Executions allowed to wait for a worker (CREW_MAX_QUEUE)
+    """
+
+    def __init__(self, max_workers: int = None, max_queue: int = None):
+        self.max_workers = int(max_workers if max_workers is not None else os.getenv("CREW_MAX_WORKERS", "4"))
+        self.max_queue = int(max_queue if max_queue is not None else os.getenv("CREW_MAX_QUEUE", "16"))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="crew-worker")
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._running = 0
+        self._stats = {"completed": 0, "failed": 0, "rejected": 0}
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def has_capacity(self) -> bool:
+        """True if a new execution would currently be admitted"""
+        with self._lock:
+            return self._admitted < self.capacity
+
+    def _admit(self):
+        with self._lock:
+            if self._admitted >= self.capacity:
+                self._stats["rejected"] += 1
+                raise EngineBusyError(
+                    f"Server busy: {self._running} tasks running, "
+                    f"{self._admitted - self._running} queued (limit {self.capacity})"
+                )
+            self._admitted += 1
+
+    def _run_in_worker(self, fn, *args, **kwargs):
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _release(self, future):
+        with self._lock:
+            self._admitted -= 1
+            if future.cancelled() or future.exception() is not None:
+                self._stats["failed"] += 1
+            else:
+                self._stats["completed"] += 1
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Run a blocking callable in the worker pool
+
+        Context variables of the caller are visible inside the worker. The
+        admission slot is held until the worker finishes, even if the caller
+        stops waiting.
+
+        Raises:
+            EngineBusyError: If the admission queue is full
+        """
+        self._admit()
+        ctx = contextvars.copy_context()
+        try:
+            future = self._executor.submit(ctx.run, self._run_in_worker, fn, *args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._admitted -= 1
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        """Snapshot of engine load"""
+        with self._lock:
+            return {
+                "running": self._running,
+                "queued": self._admitted - self._running,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                **self._stats,
+            }
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_execution_engine() -> ExecutionEngine:
+    """Process-wide engine shared by the MCP and HTTP entry points"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = ExecutionEngine()
+            logger.info(
+                f"Execution engine started (workers={_engine.max_workers}, queue={_engine.max_queue})"
+            )
+        return _engine
@@ -0,0 +1,387 @@
+"""
+Jobs
+Asynchronous job subsystem for long-running agent tasks
+
+Submitting a job returns its id immediately; the crew runs in the background
+through the execution engine and clients poll for status and result instead of
+holding an HTTP connection open for minutes.
+
+Storage is pluggable (JOB_STORE=sqlite|memory|shared), SQLite being the
+default; "shared" keeps jobs in the shared state backend (see shared_state.py),
+for replicas on several hosts. Every job records the worker running it: any
+worker can answer for or cancel it, and the jobs of a worker that went away
+are marked as failed by the others.
+"""
+import abc
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger("e2b-crewai-mcp")
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+def new_job(task: str, sandbox_id: str = None, worker_id: str = None) -> dict:
+    """Build a fresh job record"""
+    return {
+        "job_id": uuid.uuid4().hex,
+        "task": task,
+        "sandbox_id": sandbox_id,
+        "worker_id": worker_id,
+        "status": QUEUED,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "result": None,
+        "error": None,
+    }
+
+
+class JobStore(abc.ABC):
+    """Storage interface for job records (plain dicts, see `new_job`)"""
+
+    @abc.abstractmethod
+    def create(self, job: dict):
+        """Store a new job record"""
+
+    @abc.abstractmethod
+    def get(self, job_id: str):
+        """Return the job record, or None if unknown"""
+
+    @abc.abstractmethod
+    def update(self, job_id: str, **fields):
+        """Set fields of a job record, no-op if unknown"""
+
+    @abc.abstractmethod
+    def list(self, status: str = None, limit: int = 50) -> list:
+        """Most recent jobs first"""
+
+    @abc.abstractmethod
+    def prune(self, older_than: float) -> int:
+        """Delete finished jobs created before `older_than` (epoch seconds)"""
+
+
+class InMemoryJobStore(JobStore):
+    """Process-local store, jobs are lost on restart"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job: dict):
+        with self._lock:
+            self._jobs[job["job_id"]] = dict(job)
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def list(self, status: str = None, limit: int = 50) -> list:
+        with self._lock:
+            jobs = [dict(j) for j in self._jobs.values() if status is None or j["status"] == status]
+        jobs.sort(key=lambda j: j["created_at"], reverse=True)
+        return jobs[:limit]
+
+    def prune(self, older_than: float) -> int:
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["status"] in FINISHED_STATUSES and job["created_at"] < older_than
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
+
+
+class SQLiteJobStore(JobStore):
+    """Local SQLite store, survives restarts"""
+
+    COLUMNS = ("job_id", "task", "sandbox_id", "worker_id", "status", "created_at",
+               "started_at", "finished_at", "result", "error")
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv("JOBS_DB_PATH", "jobs.db")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                task TEXT NOT NULL,
+                sandbox_id TEXT,
+                worker_id TEXT,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                result TEXT,
+                error TEXT
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at)")
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "worker_id" not in columns:
+            # Databases created before jobs recorded their worker
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN worker_id TEXT")
+
+    def _row_to_job(self, row) -> dict:
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def create(self, job: dict):
+        values = [job[c] if c != "result" else json.dumps(job[c]) if job[c] is not None else None
+                  for c in self.COLUMNS]
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                values
+            )
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def update(self, job_id: str, **fields):
+        if not fields:
+            return
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"])
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE job_id = ?",
+                list(fields.values()) + [job_id]
+            )
+
+    def list(self, status: str = None, limit: int = 50) -> list:
+        query = "SELECT * FROM jobs"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def prune(self, older_than: float) -> int:
+        placeholders = ", ".join("?" * len(FINISHED_STATUSES))
+        with self._lock:
+            cursor = self._conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({placeholders}) AND created_at < ?",
+                list(FINISHED_STATUSES) + [older_than]
+            )
+        return cursor.rowcount
+
+
+class SharedStateJobStore(JobStore):
+    """Jobs kept in the shared state backend (Redis for replicas on several hosts)"""
+
+    NAMESPACE = "jobs"
+
+    def __init__(self, state=None):
+        if state is None:
+            from shared_state import create_shared_state
+            state = create_shared_state()
+        if state is None:
+            raise ValueError("JOB_STORE=shared requires a SHARED_STATE backend")
+        self.state = state
+
+    def create(self, job: dict):
+        self.state.put(self.NAMESPACE, job["job_id"], job)
+
+    def get(self, job_id: str):
+        return self.state.get(self.NAMESPACE, job_id)
+
+    def update(self, job_id: str, **fields):
+        job = self.state.get(self.NAMESPACE, job_id)
+        if job is not None:
+            job.update(fields)
+            self.state.put(self.NAMESPACE, job_id, job)
+
+    def list(self, status: str = None, limit: int = 50) -> list:
+        jobs = [j for j in self.state.items(self.NAMESPACE).values() if status is None or j["status"] == status]
+        jobs.sort(key=lambda j: j["created_at"], reverse=True)
+        return jobs[:limit]
+
+    def prune(self, older_than: float) -> int:
+        expired = [
+            job["job_id"] for job in self.state.items(self.NAMESPACE).values()
+            if job["status"] in FINISHED_STATUSES and job["created_at"] < older_than
+        ]
+        for job_id in expired:
+            self.state.delete(self.NAMESPACE, job_id)
+        return len(expired)
+
+
+def create_job_store(kind: str = None) -> JobStore:
+    """Build the store selected by JOB_STORE (sqlite by default)"""
+    kind = (kind or os.getenv("JOB_STORE", "sqlite")).lower()
+    if kind == "memory":
+        return InMemoryJobStore()
+    if kind == "sqlite":
+        return SQLiteJobStore()
+    if kind == "shared":
+        return SharedStateJobStore()
+    raise ValueError(f"Unknown job store: {kind}")
+
+
+class JobManager:
+    """
+    Runs jobs in the background and records their lifecycle in a JobStore
+
+    Args:
+        runner: Async callable(task, sandbox_id, session_id, **options) -> result dict (execute_crewai_task)
+        store: Job storage backend
+        retention: Seconds finished jobs are kept (JOBS_RETENTION)
+        worker: Id of this worker, recorded on the jobs it runs
+        is_alive: Callable(worker id) -> bool telling whether another worker still runs;
+            without it, every other worker is considered gone (single worker)
+        watch_interval: Seconds between two checks for jobs cancelled through other workers (JOBS_WATCH_INTERVAL),
+            leftover jobs of workers that went away are also recovered periodically when `worker` is set
+    """
+
+    def __init__(self, runner, store: JobStore = None, retention: float = None, worker: str = None,
+                 is_alive=None, watch_interval: float = None):
+        self.runner = runner
+        self.store = store or create_job_store()
+        self.retention = float(retention if retention is not None else os.getenv("JOBS_RETENTION", "86400"))
+        self.worker = worker
+        self.is_alive = is_alive
+        self.watch_interval = float(watch_interval if watch_interval is not None
+                                    else os.getenv("JOBS_WATCH_INTERVAL", "2"))
+        self._tasks = {}
+        self._watcher = None
+
+    def recover(self):
+        """Mark jobs left unfinished by a worker that is gone (previous process, crashed worker) as failed"""
+        for status in (QUEUED, RUNNING):
+            for job in self.store.list(status=status, limit=10000):
+                if job["job_id"] in self._tasks:
+                    continue
+                # Without worker ids (single worker), every job this process is not running is left over
+                owner = job.get("worker_id")
+                if self.worker is not None and owner == self.worker:
+                    continue
+                if owner and owner != self.worker and self.is_alive is not None and self.is_alive(owner):
+                    continue
+                self.store.update(
+                    job["job_id"],
+                    status=FAILED,
+                    error="Interrupted by server restart",
+                    finished_at=time.time()
+                )
+
+    def start(self):
+        """Watch for cancellations requested through other workers (call from the event loop)"""
+        if self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch())
+
+    def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+
+    async def _watch(self):
+        recovered_at = time.monotonic()
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                for job_id, task in list(self._tasks.items()):
+                    job = await asyncio.to_thread(self.store.get, job_id)
+                    if job is not None and job["status"] == CANCELLED:
+                        logger.info(f"Job {job_id} cancelled through another worker")
+                        task.cancel()
+                # Without worker ids the jobs of other live workers cannot be told apart:
+                # recovery then only happens at startup (single worker)
+                if self.worker is not None and time.monotonic() - recovered_at > self.watch_interval * 15:
+                    recovered_at = time.monotonic()
+                    await asyncio.to_thread(self.recover)
+            except Exception as e:
+                logger.warning(f"Job watch failed: {str(e)}")
+
+    def submit(self, task: str, sandbox_id: str = None, session_id: str = None, **options) -> dict:
+        """Record a job and start it in the background, returns the job record (options go to the runner)"""
+        self.store.prune(time.time() - self.retention)
+
+        job = new_job(task, sandbox_id, self.worker)
+        self.store.create(job)
+        self._tasks[job["job_id"]] = asyncio.create_task(
+            self._run(job["job_id"], task, sandbox_id, session_id, options)
+        )
+        logger.info(f"Job {job['job_id']} submitted")
+        return job
+
+    async def _run(self, job_id: str, task: str, sandbox_id: str, session_id: str, options: dict):
+        try:
+            self.store.update(job_id, status=RUNNING, started_at=time.time())
+            result = await self.runner(task, sandbox_id, session_id, **options)
+            status = SUCCEEDED if result.get("success") else FAILED
+            self.store.update(
+                job_id,
+                status=status,
+                result=result,
+                error=result.get("error"),
+                finished_at=time.time()
+            )
+            logger.info(f"Job {job_id} {status}")
+        except asyncio.CancelledError:
+            self.store.update(job_id, status=CANCELLED, finished_at=time.time())
+            logger.info(f"Job {job_id} cancelled")
+        except Exception as e:
+            self.store.update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+            logger.error(f"Job {job_id} failed: {str(e)}")
+        finally:
+            self._tasks.pop(job_id, None)
+
+    def get(self, job_id: str):
+        return self.store.get(job_id)
+
+    def list(self, status: str = None, limit: int = 50) -> list:
+        return self.store.list(status=status, limit=limit)
+
+    def cancel(self, job_id: str):
+        """
+        Cancel a queued or running job
+
+        A job running on another worker is marked as cancelled here and stopped by
+        that worker's watcher.
+
+        Returns:
+            Updated job record, or None if the job is unknown
+        """
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        if job["status"] in FINISHED_STATUSES:
+            return job
+
+        task = self._tasks.pop(job_id, None)
+        if task is not None:
+            task.cancel()
+        self.store.update(job_id, status=CANCELLED, finished_at=time.time())
+        logger.info(f"Job {job_id} cancellation requested")
+        return self.store.get(job_id)
@@ -0,0 +1,439 @@
+"""
+Kernels
+Session-affine Python kernels for execute_python
+
+A session (conversation id, or one id per task run) owns a sandbox leased from
+the python pool for as long as it is active, so variables, imports and loaded
+data survive across execute_python calls. Sessions are evicted after an idle
+TTL, when the manager is full, or when a new kernel is needed while the pool is
+exhausted, and the kernel is replaced when its memory goes over the configured cap.
+Memory is sampled every few executions or seconds with a shell command reading
+the kernel processes' /proc status, leaving the interpreter history alone.
+
+With a sandbox directory (see shared_state.py), sessions are published with
+their sandbox: another worker receiving a request for the session connects to
+the sandbox and takes the kernel over, state included, and the previous owner
+lets go of it without resetting it. A session is flagged busy while its owner
+runs code in it, and is only taken over once idle (or once its owner is gone).
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("e2b-crewai-mcp")
+
+# Session of the task running in the current context, None for stateless execution
+current_session = contextvars.ContextVar("current_session", default=None)
+
+
+class KernelBusyError(Exception):
+    """Raised when a session's kernel stays busy on another worker"""
+
+
+# Resident memory of the kernel processes, one "VmRSS: <n> kB" line each
+MEMORY_PROBE = "sh -c 'for pid in $(pgrep -f ipykernel); do grep VmRSS /proc/$pid/status; done'"
+
+
+class KernelSession:
+    """A sandbox leased for one session"""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.entry = None
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+        self.executions = 0
+        self.memory_mb = None
+        # Executions and time since the memory was last sampled
+        self.unchecked_runs = 0
+        self.memory_checked_at = time.monotonic()
+        self.closed = False
+        # Bumped whenever the interpreter state may have changed
+        self.generation = 0
+
+
+class KernelManager:
+    """
+    Maps session ids to stateful kernels
+
+    Args:
+        pool: SandboxPool kernels are leased from
+        idle_ttl: Seconds of inactivity before a session is evicted (KERNEL_IDLE_TTL)
+        max_sessions: Concurrent sessions, the least recently used idle one is evicted beyond (KERNEL_MAX_SESSIONS)
+        memory_limit_mb: Kernel memory cap, 0 to disable (KERNEL_MEMORY_LIMIT_MB)
+        memory_check_every: Executions between two memory samples (KERNEL_MEMORY_CHECK_EVERY)
+        memory_check_interval: Seconds after which the next execution samples memory
+            regardless of the count (KERNEL_MEMORY_CHECK_INTERVAL)
+        reap_interval: Seconds between idle eviction passes
+        directory: Optional SandboxDirectory sharing session ownership with other workers
+        connect: Callable(sandbox_id) -> sandbox, used to take over another worker's kernel
+        takeover_timeout: Seconds to wait for another worker's kernel to finish running code
+            before taking it over (KERNEL_TAKEOVER_TIMEOUT)
+    """
+
+    def __init__(self, pool, idle_ttl: float = None, max_sessions: int = None,
+                 memory_limit_mb: int = None, reap_interval: float = 30.0, directory=None, connect=None,
+                 takeover_timeout: float = None, memory_check_every: int = None,
+                 memory_check_interval: float = None):
+        self.pool = pool
+        self.directory = directory
+        self.connect = connect
+        self.takeover_timeout = float(takeover_timeout if takeover_timeout is not None
+                                      else os.getenv("KERNEL_TAKEOVER_TIMEOUT", "60"))
+        self.idle_ttl = float(idle_ttl if idle_ttl is not None else os.getenv("KERNEL_IDLE_TTL", "900"))
+        self.max_sessions = int(max_sessions if max_sessions is not None else os.getenv("KERNEL_MAX_SESSIONS", "8"))
+        self.memory_limit_mb = int(memory_limit_mb if memory_limit_mb is not None
+                                   else os.getenv("KERNEL_MEMORY_LIMIT_MB", "2048"))
+        self.memory_check_every = int(memory_check_every if memory_check_every is not None
+                                      else os.getenv("KERNEL_MEMORY_CHECK_EVERY", "5"))
+        self.memory_check_interval = float(memory_check_interval if memory_check_interval is not None
+                                           else os.getenv("KERNEL_MEMORY_CHECK_INTERVAL", "30"))
+        self.reap_interval = reap_interval
+
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._stop = threading.Event()
+        self._reaper = threading.Thread(target=self._reap_loop, name="kernel-reaper", daemon=True)
+        self._reaper.start()
+
+    def run(self, session_id: str, code: str, check_memory: bool = True, **run_kwargs):
+        """
+        Execute code in the session's kernel, creating it on first use
+
+        Args:
+            check_memory: Count the run towards the next memory sample (skipped for helper snippets)
+
+        Returns:
+            (execution, note) where note explains a forced kernel reset, or None
+        """
+        while True:
+            session = self._get_or_create(session_id)
+            with session.lock:
+                if session.closed:
+                    # Evicted between lookup and lock, start over with a new session
+                    continue
+                if not self._owns(session_id):
+                    # Taken over by another worker since the last call: take it back
+                    self._let_go(session)
+                    continue
+                if session.entry is None:
+                    # Replaced after a failure or memory reset, lease a fresh kernel
+                    session.entry = self._acquire(session_id)
+                    self._claim(session)
+                session.last_used = time.monotonic()
+                session.generation += 1
+                # Keeps other workers from taking the kernel over mid-run
+                self._mark_busy(session_id, (run_kwargs.get("timeout") or 300) + 30)
+                try:
+                    execution = session.entry.sandbox.run_code(code, **run_kwargs)
+                except Exception:
+                    self.pool.release(session.entry, discard=True)
+                    session.entry = None
+                    raise
+                finally:
+                    self._mark_busy(session_id, None)
+                session.executions += 1
+                note = self._enforce_memory(session) if check_memory else None
+                session.last_used = time.monotonic()
+                return execution, note
+
+    def reset(self, session_id: str) -> bool:
+        """Clear the session's interpreter state, keeping its sandbox"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            if self.directory is None or self._remote(session_id) is None:
+                return False
+            session = self._get_or_create(session_id)
+        with session.lock:
+            if session.entry is not None:
+                session.entry.sandbox.run_code("%reset -f")
+            session.memory_mb = None
+            session.generation += 1
+        logger.info(f"Kernel session {session_id} reset")
+        return True
+
+    def abort(self, session_id: str) -> bool:
+        """
+        Kill the session's kernel mid-execution (the running code fails, its state is lost)
+
+        Safe to call while another thread runs code in the session: that run discards the
+        dead kernel and the next one leases a fresh sandbox.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+        entry = session.entry if session is not None else None
+        if entry is None:
+            return False
+        try:
+            entry.sandbox.kill()
+        except Exception as e:
+            logger.warning(f"Failed to kill kernel of session {session_id}: {str(e)}")
+        logger.info(f"Kernel session {session_id} aborted")
+        return True
+
+    def release(self, session_id: str) -> bool:
+        """End a session and give its sandbox back to the pool"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.ready.wait()
+        with session.lock:
+            session.closed = True
+            if session.entry is not None:
+                if self._owns(session_id):
+                    self.pool.release(session.entry)
+                    self._drop(session_id)
+                else:
+                    # Another worker runs this kernel now, keep its state
+                    self.pool.detach(session.entry)
+                session.entry = None
+        logger.info(f"Kernel session {session_id} released after {session.executions} executions")
+        return True
+
+    def state_token(self, session_id: str):
+        """
+        Opaque token identifying the session's current interpreter state
+
+        Two equal tokens mean nothing ran in, reset or replaced the kernel in between.
+        None if the session does not exist.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None or session.entry is None:
+            return None
+        return f"{id(session)}:{session.created_at}:{session.entry.sandbox_id}:{session.generation}"
+
+    def list(self) -> list:
+        now = time.monotonic()
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return [
+            {
+                "session_id": s.session_id,
+                "sandbox_id": s.entry.sandbox_id if s.entry else None,
+                "executions": s.executions,
+                "memory_mb": s.memory_mb,
+                "idle_seconds": round(now - s.last_used, 1),
+            }
+            for s in sessions
+        ]
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            session_ids = list(self._sessions)
+        for session_id in session_ids:
+            self.release(session_id)
+
+    # Internals
+
+    def _get_or_create(self, session_id: str) -> KernelSession:
+        victims = []
+        with self._lock:
+            session = self._sessions.get(session_id)
+            creator = session is None
+            if creator:
+                session = KernelSession(session_id)
+                self._sessions[session_id] = session
+                victims = self._lru_victims()
+
+        for victim in victims:
+            logger.info(f"Evicting kernel session {victim} (max {self.max_sessions} sessions)")
+            self.release(victim)
+
+        if not creator:
+            session.ready.wait()
+            return session
+
+        try:
+            session.entry = self._take_over(session_id) or self._acquire(session_id)
+            self._claim(session)
+        except Exception:
+            session.closed = True
+            with self._lock:
+                self._sessions.pop(session_id, None)
+            raise
+        finally:
+            session.ready.set()
+        logger.info(f"Kernel session {session_id} started on sandbox {session.entry.sandbox_id}")
+        return session
+
+    def _acquire(self, session_id: str):
+        """
+        Lease a kernel sandbox, evicting idle sessions instead of waiting on an exhausted pool
+
+        Idle conversations hold their sandbox until their TTL: without eviction, once they
+        use up the pool every new session waits for the whole acquire timeout and fails.
+        """
+        while self.pool.exhausted():
+            with self._lock:
+                victims = [s for s in self._lru_idle(exclude=session_id) if self._sessions[s].entry is not None]
+            if not victims:
+                break
+            logger.info(f"Evicting kernel session {victims[0]} (sandbox pool '{self.pool.name}' exhausted)")
+            # Its sandbox is recycled into the pool, where acquire picks it up
+            self.release(victims[0])
+        return self.pool.acquire()
+
+    # Ownership across workers (no-ops without a directory)
+
+    def _remote(self, session_id: str):
+        """Directory record of a session owned by another worker, None otherwise"""
+        try:
+            record = self.directory.session(session_id)
+        except Exception as e:
+            logger.warning(f"Session directory lookup failed: {str(e)}")
+            return None
+        if record is None or record["worker_id"] == self.directory.worker:
+            return None
+        return record
+
+    def _take_over(self, session_id: str):
+        """Pool entry for the sandbox of a session another worker owns, None to start fresh"""
+        if self.directory is None or self.connect is None:
+            return None
+        record = self._wait_idle(session_id, self._remote(session_id))
+        if record is None:
+            return None
+        try:
+            sandbox = self.connect(record["sandbox_id"])
+        except Exception as e:
+            logger.warning(
+                f"Could not take over session {session_id} from worker {record['worker_id']} "
+                f"(sandbox {record['sandbox_id']}): {str(e)}, starting a new kernel"
+            )
+            return None
+        logger.info(f"Kernel session {session_id} handed off from worker {record['worker_id']}")
+        return self.pool.adopt(sandbox)
+
+    def _wait_idle(self, session_id: str, record: dict):
+        """
+        Wait until the owner of a remote session is done running code in it
+
+        Returns:
+            The session's latest record, None if its owner released it meanwhile
+
+        Raises:
+            KernelBusyError: If the owner is alive and still busy after `takeover_timeout`
+        """
+        deadline = time.monotonic() + self.takeover_timeout
+        while record is not None and self.directory.is_busy(record) and self.directory.is_alive(record["worker_id"]):
+            if time.monotonic() >= deadline:
+                raise KernelBusyError(
+                    f"Session {session_id} is still running code on worker {record['worker_id']} "
+                    f"after {self.takeover_timeout:g}s, retry once it finishes"
+                )
+            time.sleep(0.5)
+            record = self._remote(session_id)
+        return record
+
+    def _owns(self, session_id: str) -> bool:
+        if self.directory is None:
+            return True
+        try:
+            return self.directory.owns_session(session_id)
+        except Exception as e:
+            logger.warning(f"Session directory lookup failed: {str(e)}")
+            return True
+
+    def _claim(self, session: KernelSession):
+        if self.directory is None:
+            return
+        try:
+            self.directory.claim_session(session.session_id, session.entry.sandbox_id)
+        except Exception as e:
+            logger.warning(f"Failed to publish session {session.session_id}: {str(e)}")
+
+    def _mark_busy(self, session_id: str, ttl: float = None):
+        if self.directory is None:
+            return
+        try:
+            self.directory.mark_busy(session_id, ttl)
+        except Exception as e:
+            logger.warning(f"Failed to publish the state of session {session_id}: {str(e)}")
+
+    def _drop(self, session_id: str):
+        if self.directory is None:
+            return
+        try:
+            self.directory.drop_session(session_id)
+        except Exception as e:
+            logger.warning(f"Failed to unpublish session {session_id}: {str(e)}")
+
+    def _let_go(self, session: KernelSession):
+        """Forget a session another worker took over, leaving its sandbox running (session lock held)"""
+        session.closed = True
+        with self._lock:
+            if self._sessions.get(session.session_id) is session:
+                del self._sessions[session.session_id]
+        if session.entry is not None:
+            self.pool.detach(session.entry)
+            session.entry = None
+        logger.info(f"Kernel session {session.session_id} handed off to another worker")
+
+    def _lru_victims(self) -> list:
+        """Idle sessions to evict so the manager stays within max_sessions (lock held)"""
+        excess = len(self._sessions) - self.max_sessions
+        if excess <= 0:
+            return []
+        return self._lru_idle()[:excess]
+
+    def _lru_idle(self, exclude: str = None) -> list:
+        """Ids of the idle sessions, least recently used first (lock held)"""
+        idle = [
+            s for s in self._sessions.values()
+            if s.session_id != exclude and s.ready.is_set() and not s.lock.locked()
+        ]
+        idle.sort(key=lambda s: s.last_used)
+        return [s.session_id for s in idle]
+
+    def _enforce_memory(self, session: KernelSession):
+        """Replace the kernel if it went over the memory cap, when a sample is due (session lock held)"""
+        if not self.memory_limit_mb:
+            return None
+        session.unchecked_runs += 1
+        if (session.unchecked_runs < self.memory_check_every
+                and time.monotonic() - session.memory_checked_at < self.memory_check_interval):
+            return None
+        session.unchecked_runs = 0
+        session.memory_checked_at = time.monotonic()
+        try:
+            # A shell command rather than run_code: the kernel's `_`, Out and execution count stay as they were
+            probe = session.entry.sandbox.commands.run(MEMORY_PROBE, timeout=10)
+            rss_kb = [int(line.split()[1]) for line in probe.stdout.splitlines() if line.startswith("VmRSS:")]
+            session.memory_mb = sum(rss_kb) // 1024 if rss_kb else None
+        except Exception as e:
+            logger.warning(f"Memory probe failed for session {session.session_id}: {str(e)}")
+            return None
+
+        if session.memory_mb is None or session.memory_mb <= self.memory_limit_mb:
+            return None
+
+        logger.warning(
+            f"Kernel session {session.session_id} uses {session.memory_mb} MB "
+            f"(limit {self.memory_limit_mb} MB), replacing kernel"
+        )
+        self.pool.release(session.entry, discard=True)
+        session.entry = None
+        return (
+            f"Session memory limit exceeded ({session.memory_mb} MB > {self.memory_limit_mb} MB): "
+            "the interpreter was reset, reload any data you still need"
+        )
+
+    def _reap_loop(self):
+        while not self._stop.wait(self.reap_interval):
+            now = time.monotonic()
+            with self._lock:
+                expired = [
+                    s.session_id for s in self._sessions.values()
+                    if s.ready.is_set() and not s.lock.locked() and now - s.last_used > self.idle_ttl
+                ]
+            for session_id in expired:
+                logger.info(f"Kernel session {session_id} idle for over {self.idle_ttl:g}s")
+                self.release(session_id)
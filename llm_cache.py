@@ -0,0 +1,157 @@
+"""
+LLM Cache
+Disk-backed cache of LLM completions keyed by a canonical hash of the request
+
+The key covers everything that shapes the answer (model, messages, tools,
+temperature, stop words), so a hit is only served for an identical request:
+retries and popular canned tasks replay the same agent steps without calling
+the provider again. Entries expire after a TTL and the least recently used
+ones are evicted beyond the size bound.
+
+Opt-in with LLM_CACHE_ENABLED=true. The cache only deals with plain callables
+and JSON values, so it can be exercised with a fake LLM.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("e2b-crewai-mcp")
+
+
+def _canonical_messages(messages) -> list:
+    if isinstance(messages, str):
+        return [{"role": "user", "content": messages}]
+    return [dict(message) for message in messages]
+
+
+def completion_key(model: str, messages, tools: list = None, temperature: float = None, **params) -> str:
+    """Stable hash of a completion request"""
+    payload = json.dumps({
+        "model": model,
+        "messages": _canonical_messages(messages),
+        "tools": tools or [],
+        "temperature": temperature,
+        "params": {k: v for k, v in params.items() if v is not None},
+    }, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class CompletionCache:
+    """
+    SQLite completion store with TTL and LRU eviction
+
+    Args:
+        path: Database file (LLM_CACHE_PATH)
+        ttl: Seconds a completion stays valid (LLM_CACHE_TTL)
+        max_entries: Completions kept, least recently used evicted beyond (LLM_CACHE_MAX_ENTRIES)
+    """
+
+    def __init__(self, path: str = None, ttl: float = None, max_entries: int = None):
+        self.path = path or os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+        self.ttl = float(ttl if ttl is not None else os.getenv("LLM_CACHE_TTL", "86400"))
+        self.max_entries = int(max_entries if max_entries is not None else os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS completions_accessed_at ON completions (accessed_at)")
+
+    def get(self, key: str):
+        """Cached response for a key, None on a miss or an expired entry"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] + self.ttl <= now:
+                if row is not None:
+                    self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                    self._stats["evictions"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key))
+            self._stats["hits"] += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, response, model: str = None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, model, response, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, model, json.dumps(response), now, now)
+            )
+            self._stats["stores"] += 1
+            self._evict()
+
+    def get_or_call(self, key: str, call, model: str = None):
+        """
+        Return the cached response for a key or compute and store it
+
+        Args:
+            call: Callable() -> JSON-serializable response (the real LLM call)
+        """
+        response = self.get(key)
+        if response is not None:
+            return response
+        response = call()
+        if response is not None:
+            self.put(key, response, model)
+        return response
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": entries,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM completions")
+
+    def _evict(self):
+        """Drop expired entries, then the least recently used beyond max_entries (lock held)"""
+        cursor = self._conn.execute("DELETE FROM completions WHERE created_at <= ?", (time.time() - self.ttl,))
+        evicted = cursor.rowcount
+        excess = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0] - self.max_entries
+        if excess > 0:
+            cursor = self._conn.execute(
+                "DELETE FROM completions WHERE key IN "
+                "(SELECT key FROM completions ORDER BY accessed_at ASC LIMIT ?)",
+                (excess,)
+            )
+            evicted += cursor.rowcount
+        self._stats["evictions"] += evicted
+
+
+_completion_cache = None
+_completion_cache_lock = threading.Lock()
+
+
+def get_completion_cache():
+    """Process-wide completion cache, None unless LLM_CACHE_ENABLED=true"""
+    global _completion_cache
+    if os.getenv("LLM_CACHE_ENABLED", "false").lower() not in ("1", "true", "yes"):
+        return None
+    with _completion_cache_lock:
+        if _completion_cache is None:
+            _completion_cache = CompletionCache()
+        return _completion_cache
@@ -3,19 +3,41 @@ MCP Server for VPS - Simple Version
 Exposes E2B + CrewAI tools to OpenWebUI via MCP protocol
 
 Simple approach using E2B Code Interpreter + CrewAI directly
+
+CrewAI and the E2B SDK are slow to import: they are loaded on first use or by
+warm_up(), so importing this module stays cheap.
 """
 import asyncio
+import contextvars
 import json
 import logging
+import threading
+import time
+import uuid
 from typing import Any
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
-from e2b_code_interpreter import Sandbox
-from crewai.tools import tool
-from crewai import Agent, Task, Crew, LLM
 import os
 from dotenv import load_dotenv
+import cancellation
+import crawler_service
+import metrics
+import relevance
+import tracing
+from artifacts import get_artifact_store
+from cancellation import CancelScope, TaskCancelled, current_scope, get_request_registry, request_timeout
+from coalescing import get_task_coalescer, task_key
+from crawl_cache import get_crawl_cache
+from crawler_service import CrawlerDaemonError
+from events import EventStream, current_emitter, describe, emit, truncate
+from execution_engine import EngineBusyError, get_execution_engine
+from kernels import KernelManager, current_session
+from memoize import capture, get_execution_memo
+from sandbox_pool import SandboxPool
+from sandbox_templates import TemplateSpec, create_provisioned_sandbox
+from scheduler import current_tenant, get_task_scheduler, resolve_priority
+from shared_state import get_sandbox_directory
 
 load_dotenv()
 
@@ -23,66 +45,441 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("e2b-crewai-mcp")
 
-@tool("Python Interpreter")
-def execute_python(code: str) -> str:
+# Dependencies of crawler sandboxes, built once into a template (see sandbox_templates.py)
+CRAWLER_TEMPLATE = TemplateSpec(
+    name="crawler",
+    packages=["crawl4ai", "aiohttp", "nest_asyncio", "beautifulsoup4", "requests"],
+    commands=["crawl4ai-setup", "playwright install chromium"],
+    # Pages are filtered where they are crawled (crawler daemon and crawl scripts)
+    files={"/home/user/relevance.py": os.path.join(os.path.dirname(os.path.abspath(__file__)), "relevance.py")},
+)
+
+TEMPLATE_SPECS = {
+    CRAWLER_TEMPLATE.name: CRAWLER_TEMPLATE,
+}
+
+# Crawl4AI run options, also part of the crawl cache key
+CRAWL_RUN_CONFIG = {
+    "word_count_threshold": 10,
+    "page_timeout": 30000,
+    "wait_until": "domcontentloaded"
+}
+
+# Prefix of the JSON line the crawl script prints with its result
+CRAWL_RESULT_MARKER = "__CRAWL_RESULT__"
+
+# Batch crawling limits
+CRAWL_BATCH_MAX_URLS = int(os.getenv("CRAWL_BATCH_MAX_URLS", "30"))
+CRAWL_BATCH_CONCURRENCY = int(os.getenv("CRAWL_BATCH_CONCURRENCY", "5"))
+CRAWL_URL_TIMEOUT = float(os.getenv("CRAWL_URL_TIMEOUT", "45"))
+# Longest single-page crawl script run, when the sandbox has no crawler daemon
+CRAWL_SCRIPT_TIMEOUT = float(os.getenv("CRAWL_SCRIPT_TIMEOUT", "60"))
+# Longest execute_python run (all tool timeouts are also cut to the task's remaining deadline)
+PYTHON_RUN_TIMEOUT = float(os.getenv("PYTHON_RUN_TIMEOUT", "300"))
+# Characters of page content handed back to the agent for a whole batch
+CRAWL_BATCH_MAX_CHARS = int(os.getenv("CRAWL_BATCH_MAX_CHARS", "24000"))
+# Page content kept from a single crawl when there is no artifact store to hold whole pages
+CRAWL_MAX_CONTENT = int(os.getenv("CRAWL_MAX_CONTENT", "8000"))
+
+# Crawled pages are reduced to their passages most relevant to the task (see relevance.py)
+RELEVANCE_ENABLED = os.getenv("RELEVANCE_ENABLED", "true").lower() in ("1", "true", "yes")
+RELEVANCE_TOKEN_BUDGET = int(os.getenv("RELEVANCE_TOKEN_BUDGET", "1500"))
+RELEVANCE_CHUNK_CHARS = int(os.getenv("RELEVANCE_CHUNK_CHARS", "1000"))
+
+# Description of the task being executed, the default relevance query of crawls
+current_task = contextvars.ContextVar("current_task", default=None)
+
+# Session of a task run without session_id, whose kernel is thrown away afterwards
+TASK_SESSION_PREFIX = "task-"
+
+# Warm sandbox pools, one per tool ("python", "crawler")
+_sandbox_pools = {}
+_sandbox_pools_lock = threading.Lock()
+
+# Stateful execute_python kernels, keyed by session
+_kernel_manager = None
+
+# Shared agent/LLM configuration, crews are built per request
+_crew_factory = None
+_crew_factory_lock = threading.Lock()
+
+
+def _create_sandbox(template: str = None):
+    """Create a sandbox that outlives its idle time in the pool"""
+    from e2b_code_interpreter import Sandbox
+
+    timeout = int(os.getenv("SANDBOX_TIMEOUT", "600"))
+    with tracing.span("e2b.create", template=template or "default"), \
+            metrics.SANDBOX_CREATE_SECONDS.labels(template or "default").time():
+        if template:
+            return Sandbox.create(template=template, timeout=timeout)
+        return Sandbox.create(timeout=timeout)
+
+
+def _connect_sandbox(sandbox_id: str):
+    """Attach to a running sandbox created by another worker"""
+    from e2b_code_interpreter import Sandbox
+
+    with tracing.span("e2b.connect", sandbox_id=sandbox_id):
+        return Sandbox.connect(sandbox_id)
+
+
+def _create_crawler_sandbox():
     """
-    Execute Python code and return the results.
+    Create a crawler-ready sandbox from the prebuilt template, or install once into a fresh one,
+    and start its crawler daemon so the browser is warm before the first lease
+    """
+    sandbox = create_provisioned_sandbox(CRAWLER_TEMPLATE, _create_sandbox)
+    if os.getenv("CRAWLER_DAEMON_ENABLED", "true").lower() in ("1", "true", "yes"):
+        try:
+            crawler_service.start_daemon(sandbox)
+        except Exception as e:
+            # The one-shot crawl scripts still work without the daemon
+            logger.warning(f"Crawler daemon unavailable in sandbox {sandbox.sandbox_id}: {str(e)}")
+            crawler_service.forget(sandbox.sandbox_id)
+    return sandbox
+
+
+def _crawler_health_check(sandbox) -> bool:
+    """Probe (and restart if needed) the crawler daemon, or just check the sandbox without one"""
+    if crawler_service.has_daemon(sandbox):
+        return crawler_service.ensure_daemon(sandbox)
+    return sandbox.is_running()
+
+
+def _reset_interpreter(sandbox):
+    """Clear interpreter state so the next lease starts from a clean namespace"""
+    sandbox.run_code("%reset -f")
+
+
+def get_sandbox_pool(name: str = "python") -> SandboxPool:
     """
+    Get (and lazily start) the sandbox pool used by a tool
+
+    Args:
+        name: "python" for execute_python, "crawler" for crawl_website
+
+    Returns:
+        Started SandboxPool
+    """
+    with _sandbox_pools_lock:
+        pool = _sandbox_pools.get(name)
+        if pool is None:
+            if name == "crawler":
+                # Daemon endpoints die with their sandbox, whether reaped, recycled or discarded
+                pool = SandboxPool(_create_crawler_sandbox, name=name, health_check=_crawler_health_check,
+                                   on_discard=crawler_service.forget)
+            else:
+                pool = SandboxPool(_create_sandbox, name=name, reset=_reset_interpreter)
+            _sandbox_pools[name] = pool.start()
+        return pool
+
+
+def get_kernel_manager() -> KernelManager:
+    """Session kernel manager, leasing its sandboxes from the python pool"""
+    global _kernel_manager
+    pool = get_sandbox_pool("python")
+    with _sandbox_pools_lock:
+        if _kernel_manager is None:
+            _kernel_manager = KernelManager(pool, directory=get_sandbox_directory(), connect=_connect_sandbox)
+        return _kernel_manager
+
+
+def _pool_stats() -> list:
+    with _sandbox_pools_lock:
+        pools = list(_sandbox_pools.values())
+    return [pool.stats() for pool in pools]
+
+
+metrics.watch_pools(_pool_stats)
+
+
+def worker_status() -> dict:
+    """This worker's sandboxes and sessions, published in its shared state heartbeat"""
+    pools = _pool_stats()
+    return {
+        "sandbox_ids": [sandbox_id for stats in pools for sandbox_id in stats["sandbox_ids"]],
+        "pools": {stats["name"]: {"idle": stats["idle"], "leased": stats["leased"]} for stats in pools},
+        "sessions": len(_kernel_manager.list()) if _kernel_manager is not None else 0,
+    }
+
+
+def start_sandbox_pools():
+    """Start pre-warming every tool pool"""
+    for name in ("python", "crawler"):
+        get_sandbox_pool(name)
+
+
+def shutdown_sandbox_pools():
+    """Kill all pooled sandboxes"""
+    global _kernel_manager
+    with _sandbox_pools_lock:
+        kernel_manager, _kernel_manager = _kernel_manager, None
+    if kernel_manager is not None:
+        kernel_manager.close()
+    with _sandbox_pools_lock:
+        pools = list(_sandbox_pools.values())
+        _sandbox_pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def _output_callbacks(tool_name: str) -> dict:
+    """run_code callbacks forwarding partial output as events (none when nobody listens)"""
+    emitter = current_emitter.get()
+    if emitter is None:
+        return {}
+
+    def forward(stream):
+        def callback(message):
+            text = getattr(message, "line", message)
+            emitter.emit("tool_output", tool=tool_name, stream=stream, text=truncate(text))
+        return callback
+
+    return {"on_stdout": forward("stdout"), "on_stderr": forward("stderr")}
+
+
+def _run_options(tool_name: str, timeout: float = None) -> dict:
+    """run_code keyword arguments: output callbacks, the trace context (TRACEPARENT) and the timeout"""
+    options = _output_callbacks(tool_name)
+    if timeout is not None:
+        # Never past the task's deadline
+        options["timeout"] = cancellation.budget(timeout)
+    envs = tracing.trace_envs()
+    if envs:
+        options["envs"] = envs
+    return options
+
+
+def _execute_python(code: str, session_id: str = None):
+    """Run code in the session's kernel or a leased sandbox, returns (execution, note)"""
+    if session_id is not None:
+        # Stateful: runs in the session's kernel
+        kernels = get_kernel_manager()
+        # A cancelled task's own kernel is killed mid-run; a conversation's is kept, its state matters
+        abort = (lambda: kernels.abort(session_id)) if session_id.startswith(TASK_SESSION_PREFIX) else None
+        with tracing.span("e2b.run_code", tool="execute_python", session=session_id), \
+                metrics.RUN_CODE_SECONDS.labels("execute_python").time(), \
+                cancellation.on_cancel(abort):
+            return kernels.run(session_id, code, **_run_options("execute_python", PYTHON_RUN_TIMEOUT))
+    with get_sandbox_pool("python").lease() as sandbox:
+        # Killed if the task is cancelled meanwhile, the lease then discards it
+        with tracing.span("e2b.run_code", tool="execute_python", sandbox_id=sandbox.sandbox_id), \
+                metrics.RUN_CODE_SECONDS.labels("execute_python").time(), \
+                cancellation.on_cancel(sandbox.kill):
+            return sandbox.run_code(code, **_run_options("execute_python", PYTHON_RUN_TIMEOUT)), None
+
+
+def _run_python(code: str) -> str:
+    session_id = current_session.get()
+    memo = get_execution_memo()
     try:
-        with Sandbox.create() as sandbox:
-            execution = sandbox.run_code(code)
-            if execution.error:
-                return f"Error: {execution.error}"
-            return execution.text if execution.text else "Code executed successfully"
+        if memo is not None:
+            probe = state = None
+            if session_id is not None:
+                kernels = get_kernel_manager()
+                probe = lambda helper: kernels.run(session_id, helper, check_memory=False)[0]
+                state = lambda: kernels.state_token(session_id)
+            result, note = memo.run(code, lambda c: _execute_python(c, session_id), session_id, probe, state)
+        else:
+            execution, note = _execute_python(code, session_id)
+            result = capture(execution)
     except Exception as e:
+        metrics.TOOL_ERRORS.labels("execute_python").inc()
         return f"Execution error: {str(e)}"
 
+    if result["error"]:
+        metrics.TOOL_ERRORS.labels("execute_python").inc()
+        output = f"Error: {result['error']}"
+    else:
+        output = result["text"] if result["text"] else "Code executed successfully"
+        store = get_artifact_store()
+        if store is not None:
+            output = store.offload(output, "python output")
+    return f"{output}\n\n[{note}]" if note else output
+
+
+def execute_python(code: str) -> str:
+    """
+    Execute Python code and return the results.
+    Variables, imports and loaded data persist between calls within the same task,
+    so there is no need to reload data or redo previous steps.
+    """
+    cancellation.check()
+    emit("tool_start", tool="execute_python", input=truncate(code))
+    metrics.TOOL_CALLS.labels("execute_python").inc()
+    with tracing.span("tool.execute_python", code_chars=len(code)):
+        output = _run_python(code)
+    emit("tool_end", tool="execute_python", output=truncate(output))
+    return output
+
 
-@tool("Web Crawler")
-def crawl_website(url: str) -> str:
+def crawl_website(url: str, query: str = "") -> str:
     """
     Advanced web crawler that extracts clean markdown content from websites using modern Crawl4AI.
+    Long pages are reduced to the passages most relevant to the task.
     
     Args:
         url: The website URL to crawl
+        query: Optional words describing what to look for on the page (defaults to the task)
     
     Returns:
         Clean markdown content from the website
     """
+    cancellation.check()
+    emit("tool_start", tool="crawl_website", input=url)
+    metrics.TOOL_CALLS.labels("crawl_website").inc()
+    cache = get_crawl_cache()
+    extract = _extract_options(query)
+    crawled = {}
+
+    def crawl(target: str) -> dict:
+        crawled.update(_crawl(target, extract))
+        return crawled
+
+    with tracing.span("tool.crawl_website", url=url) as tool_span:
+        if cache is not None:
+            content = cache.get_or_crawl(url, crawl, CRAWL_RUN_CONFIG)
+        else:
+            content = crawl(url)["content"]
+        # Excerpts come from the sandbox on a fresh crawl, are computed here on a cache hit
+        relevant = crawled.get("relevant") if crawled else _select_excerpts(content, extract)
+        tool_span.set(cached=not crawled, filtered=bool(relevant))
+        output = _page_output(url, content, relevant)
+    emit("tool_end", tool="crawl_website", output=truncate(output))
+    return output
+
+
+def _extract_options(query: str = None):
+    """Relevance filtering options sent with a crawl, None when disabled or without a query"""
+    query = query or current_task.get()
+    if not RELEVANCE_ENABLED or not query:
+        return None
+    return {"query": query, "token_budget": RELEVANCE_TOKEN_BUDGET, "chunk_chars": RELEVANCE_CHUNK_CHARS}
+
+
+def _select_excerpts(content: str, extract: dict, token_budget: int = None):
+    """Host-side relevance filtering, for pages served from the crawl cache and batch crawls"""
+    if not extract or not content:
+        return None
+    return relevance.select(content, extract["query"], token_budget or extract["token_budget"], extract["chunk_chars"])
+
+
+def _page_output(url: str, content: str, relevant: str = None) -> str:
+    """Page text handed to the agent: its relevant excerpts or the page, whole pages kept as artifacts"""
+    store = get_artifact_store()
+    if relevant:
+        if store is None:
+            return relevant
+        handle = store.put(content, "markdown", url)
+        return (f"{relevant}\n\n[Full page ({len(content):,} chars) in artifact {handle}, "
+                "read other parts with the Artifact Reader]")
+    if store is not None:
+        # Whole page in the store, outline and preview in the context
+        return store.offload(content, "markdown", url)
+    return content
+
+
+def _crawl_content_limit() -> int:
+    """Characters of page content fetched per crawl: whole pages when the artifact store holds them"""
+    store = get_artifact_store()
+    return store.max_content if store is not None else CRAWL_MAX_CONTENT
+
+
+def _parse_crawl_output(execution) -> dict:
+    """Extract the structured result line printed by the crawl script"""
+    stdout = "".join(execution.logs.stdout)
+    for line in reversed(stdout.splitlines()):
+        if line.startswith(CRAWL_RESULT_MARKER):
+            return json.loads(line[len(CRAWL_RESULT_MARKER):])
+    return {"success": False, "content": None}
+
+
+def _crawl(url: str, extract: dict = None) -> dict:
+    """
+    Crawl a page in a pooled crawler sandbox, through its warm daemon when available
+
+    Args:
+        url: Page to crawl
+        extract: Relevance filtering options (see _extract_options), applied in the sandbox
+
+    Returns:
+        {"success", "content", "relevant", "etag", "last_modified"}
+    """
     try:
-        with Sandbox.create() as sandbox:
-            crawl_code = f"""
-import subprocess
-import sys
+        with get_sandbox_pool("crawler").lease() as sandbox:
+            if crawler_service.has_daemon(sandbox):
+                try:
+                    with tracing.span("e2b.crawl_daemon", url=url, sandbox_id=sandbox.sandbox_id), \
+                            metrics.CRAWL_SECONDS.labels("daemon").time():
+                        result = crawler_service.crawl(
+                            sandbox, url, CRAWL_RUN_CONFIG, cancellation.budget(CRAWL_URL_TIMEOUT),
+                            _crawl_content_limit(), extract
+                        )
+                    if not result.get("success"):
+                        metrics.TOOL_ERRORS.labels("crawl_website").inc()
+                    if not result.get("content"):
+                        result["content"] = f"Failed to crawl {url}: {result.get('error')}"
+                    return result
+                except CrawlerDaemonError as e:
+                    logger.warning(f"{str(e)}, falling back to crawl script")
+            with metrics.CRAWL_SECONDS.labels("script").time():
+                result = _crawl_with_script(sandbox, url, extract)
+            if not result.get("success"):
+                metrics.TOOL_ERRORS.labels("crawl_website").inc()
+            return result
+
+    except Exception as e:
+        metrics.TOOL_ERRORS.labels("crawl_website").inc()
+        return {"success": False, "content": f"Web crawling error: {str(e)}"}
+
+
+def _crawl_with_script(sandbox, url: str, extract: dict = None) -> dict:
+    """One-shot crawl script, used when the sandbox has no crawler daemon"""
+    max_content = _crawl_content_limit()
+    # Within the task's deadline, like every tool timeout
+    timeout = cancellation.budget(CRAWL_SCRIPT_TIMEOUT)
+    crawl_code = f"""
 import json
+import os
+import sys
 
-# Install and setup crawl4ai
-try:
-    from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
-    print("✅ Crawl4AI already available")
-except ImportError:
-    print("📦 Installing Crawl4AI...")
-    subprocess.check_call([sys.executable, '-m', 'pip', 'install', '-U', 'crawl4ai'])
-    print("🔧 Setting up Crawl4AI (this may take a few minutes)...")
-    subprocess.check_call(['crawl4ai-setup'])
-    print("🎭 Installing Playwright browsers...")
-    subprocess.check_call(['playwright', 'install'])
-    from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
-    print("✅ Crawl4AI setup complete")
+# Crawl4AI and Playwright are baked into the crawler template / provisioned once per pooled sandbox
+from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
 
 import asyncio
 
+# Validators and outcome reported back to the server-side crawl cache
+crawl_meta = {{"success": False, "etag": None, "last_modified": None, "relevant": None}}
+
+# Task-aware filtering with relevance.py (uploaded with the crawler template files)
+extract = json.loads({json.dumps(json.dumps(extract))})
+
+def select_excerpts(content):
+    if not extract:
+        return None
+    try:
+        sys.path.insert(0, "/home/user")
+        from relevance import select
+        return select(content, extract["query"], extract["token_budget"], extract["chunk_chars"])
+    except Exception as e:
+        print(f"Relevance filtering skipped: {{e}}")
+        return None
+
 async def crawl_site():
-    url = "{url}"
+    url = {json.dumps(url)}
     
     print("=== MODERN CRAWL4AI STARTING ===")
     print(f"Target URL: {{url}}")
+    print(f"Trace: {{os.environ.get('TRACEPARENT', '-')}}")
     
     # Test basic connectivity first
     try:
         import requests
         response = requests.get(url, timeout=10)
         print(f"✅ Basic connectivity: {{response.status_code}} ({{len(response.text)}} chars)")
+        crawl_meta["etag"] = response.headers.get("ETag")
+        crawl_meta["last_modified"] = response.headers.get("Last-Modified")
     except Exception as e:
         print(f"❌ Basic connectivity failed: {{e}}")
     
@@ -95,9 +492,7 @@ async def crawl_site():
     
     run_config = CrawlerRunConfig(
         cache_mode=CacheMode.BYPASS,
-        word_count_threshold=10,
-        page_timeout=30000,
-        wait_until="domcontentloaded"
+        **{json.dumps(CRAWL_RUN_CONFIG)}
     )
     
     print(f"✅ Modern configs created - Browser: {{browser_config.headless}}, Cache: {{run_config.cache_mode}}")
@@ -142,18 +537,23 @@ async def crawl_site():
                 print(f"Content length: {{len(content) if content else 0}}")
                 
                 if content and len(content.strip()) > 50:
+                    # Before truncation, so that sections past the cut can be picked
+                    crawl_meta["relevant"] = select_excerpts(content)
+
                     # Smart truncation for readability
-                    if len(content) > 8000:
-                        truncate_at = content.find('\\n\\n', 7000)
-                        if truncate_at > 0:
+                    if len(content) > {max_content}:
+                        truncate_at = content.find('\\n\\n', {max_content * 7 // 8})
+                        if 0 < truncate_at <= {max_content}:
                             content = content[:truncate_at] + "\\n\\n[Content truncated...]"
                         else:
-                            content = content[:8000] + "\\n[Content truncated...]"
+                            content = content[:{max_content}] + "\\n[Content truncated...]"
                     
                     print("\\n=== EXTRACTED CONTENT ===")
                     print(f"URL: {{url}}")
                     print(f"Words: {{len(content.split())}}")
-                    print("\\n" + content)
+                    # The content itself travels once, on the result line
+                    print("\\n" + content[:2000])
+                    crawl_meta["success"] = True
                     return content
                 else:
                     print("❌ No meaningful content extracted")
@@ -186,6 +586,7 @@ async def crawl_site():
                                 fallback_content = "\\n".join(f"• {{headline}}" for headline in headlines[:15])
                                 print(f"Extracted {{len(headlines)}} headlines via fallback")
                                 print(fallback_content)
+                                crawl_meta["success"] = True
                                 return f"Headlines extracted from {{url}}:\\n\\n{{fallback_content}}"
                             else:
                                 print("No headlines found with fallback selectors")
@@ -213,6 +614,7 @@ async def crawl_site():
                     
                     if fallback_content:
                         print(f"Fallback extracted {{len(fallback_content)}} characters")
+                        crawl_meta["success"] = True
                         return fallback_content
                 
                 return f"Failed to crawl {{url}}: {{result.error_message}}"
@@ -222,128 +624,633 @@ async def crawl_site():
         return f"Crawling error: {{str(e)}}"
 
 # Execute with proper async handling
+result = None
 try:
     import nest_asyncio
     nest_asyncio.apply()
-    result = asyncio.run(crawl_site())
+    result = asyncio.run(asyncio.wait_for(crawl_site(), {timeout}))
     print("=== FINAL RESULT ===")
     print(result if result else "No content returned")
+except asyncio.TimeoutError:
+    print("Crawl timed out after {timeout:g}s")
 except Exception as e:
     print(f"Async execution error: {{e}}")
     try:
         import concurrent.futures
         with concurrent.futures.ThreadPoolExecutor() as executor:
             future = executor.submit(asyncio.run, crawl_site())
-            result = future.result(timeout=60)
+            result = future.result(timeout={timeout})
             print("=== FINAL RESULT (via ThreadPool) ===") 
             print(result if result else "No content returned")
     except Exception as final_error:
         print(f"All execution methods failed: {{final_error}}")
+
+print({json.dumps(CRAWL_RESULT_MARKER)} + json.dumps({{**crawl_meta, "content": result}}))
 """
-            
-            execution = sandbox.run_code(crawl_code)
-            
-            if execution.error:
-                return f"Crawling error: {execution.error}"
-            
-            return execution.text if execution.text else "No content extracted"
-            
+
+    # Killed if the task is cancelled meanwhile, the lease then discards it
+    with tracing.span("e2b.run_code", tool="crawl_website", sandbox_id=sandbox.sandbox_id), \
+            metrics.RUN_CODE_SECONDS.labels("crawl_website").time(), \
+            cancellation.on_cancel(sandbox.kill):
+        execution = sandbox.run_code(crawl_code, **_run_options("crawl_website", timeout + 15))
+
+    if execution.error:
+        return {"success": False, "content": f"Crawling error: {execution.error}"}
+
+    result = _parse_crawl_output(execution)
+    if not result.get("content"):
+        result["content"] = "No content extracted"
+    return result
+
+
+# Crawls many URLs through one browser; `params` is prepended by `crawl_many`
+BATCH_CRAWL_SCRIPT = """
+import asyncio
+import json
+import time
+
+from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
+
+
+def extract_content(result):
+    markdown = getattr(result, "markdown", None)
+    if markdown:
+        return getattr(markdown, "raw_markdown", None) or str(markdown)
+    return getattr(result, "cleaned_html", None)
+
+
+async def crawl_one(crawler, semaphore, url, run_config):
+    async with semaphore:
+        started = time.time()
+        try:
+            result = await asyncio.wait_for(crawler.arun(url=url, config=run_config), timeout=params["timeout"])
+        except asyncio.TimeoutError:
+            return {"url": url, "success": False, "error": f"Timed out after {params['timeout']}s"}
+        except Exception as e:
+            return {"url": url, "success": False, "error": str(e)}
+
+        headers = {k.lower(): v for k, v in (getattr(result, "response_headers", None) or {}).items()}
+        content = extract_content(result) if result.success else None
+        return {
+            "url": url,
+            "success": bool(content and content.strip()),
+            "content": content,
+            "error": None if content else (getattr(result, "error_message", None) or "No content extracted"),
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "elapsed": round(time.time() - started, 2),
+        }
+
+
+async def crawl_all():
+    browser_config = BrowserConfig(
+        headless=True,
+        verbose=False,
+        user_agent="Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+    )
+    run_config = CrawlerRunConfig(cache_mode=CacheMode.BYPASS, **params["run_config"])
+    semaphore = asyncio.Semaphore(params["concurrency"])
+
+    async with AsyncWebCrawler(config=browser_config) as crawler:
+        tasks = [crawl_one(crawler, semaphore, url, run_config) for url in params["urls"]]
+        # One result line per URL, in completion order
+        for next_done in asyncio.as_completed(tasks):
+            print(params["marker"] + json.dumps(await next_done), flush=True)
+
+
+import nest_asyncio
+nest_asyncio.apply()
+asyncio.run(crawl_all())
+"""
+
+
+def crawl_many(urls: list, concurrency: int = None, timeout: float = None) -> list:
+    """
+    Crawl several URLs concurrently through one browser in one sandbox
+
+    Args:
+        urls: Pages to crawl (deduplicated, at most CRAWL_BATCH_MAX_URLS)
+        concurrency: Pages crawled at once (CRAWL_BATCH_CONCURRENCY)
+        timeout: Per-URL timeout in seconds (CRAWL_URL_TIMEOUT)
+
+    Returns:
+        One result dict per URL ({"url", "success", "content", "error", "cached"}),
+        in completion order. Failed or timed out pages are reported, not raised.
+    """
+    urls = list(dict.fromkeys(u.strip() for u in urls if u and u.strip()))[:CRAWL_BATCH_MAX_URLS]
+    concurrency = max(1, min(concurrency or CRAWL_BATCH_CONCURRENCY, len(urls) or 1))
+    timeout = cancellation.budget(timeout or CRAWL_URL_TIMEOUT)
+
+    results = []
+    pending = []
+    cache = get_crawl_cache()
+    for url in urls:
+        content = cache.get(url, CRAWL_RUN_CONFIG) if cache is not None else None
+        if content is not None:
+            results.append({"url": url, "success": True, "content": content, "error": None, "cached": True})
+            emit("tool_output", tool="crawl_websites", stream="result", text=f"{url} (cached)")
+        else:
+            pending.append(url)
+
+    if not pending:
+        return results
+
+    params = {
+        "urls": pending,
+        "concurrency": concurrency,
+        "timeout": timeout,
+        "run_config": CRAWL_RUN_CONFIG,
+        "marker": CRAWL_RESULT_MARKER,
+    }
+    script = f"params = {json.dumps(params)}\n" + BATCH_CRAWL_SCRIPT
+    # Worst case: every wave of `concurrency` pages hits the per-URL timeout
+    waves = -(-len(pending) // concurrency)
+
+    def on_result(result):
+        status = "ok" if result.get("success") else "failed"
+        emit("tool_output", tool="crawl_websites", stream="result", text=f"{result['url']} ({status})")
+
+    try:
+        with get_sandbox_pool("crawler").lease() as sandbox:
+            crawled = None
+            failure = "No result (crawl interrupted)"
+            if crawler_service.has_daemon(sandbox):
+                try:
+                    with tracing.span("e2b.crawl_daemon", urls=len(pending), sandbox_id=sandbox.sandbox_id), \
+                            metrics.CRAWL_SECONDS.labels("daemon_batch").time():
+                        crawled = crawler_service.crawl_many(
+                            sandbox, pending, CRAWL_RUN_CONFIG, concurrency, timeout, on_result
+                        )
+                except CrawlerDaemonError as e:
+                    logger.warning(f"{str(e)}, falling back to batch crawl script")
+
+            if crawled is None:
+                with tracing.span("e2b.run_code", tool="crawl_websites", sandbox_id=sandbox.sandbox_id), \
+                        metrics.CRAWL_SECONDS.labels("script_batch").time(), \
+                        metrics.RUN_CODE_SECONDS.labels("crawl_websites").time(), \
+                        cancellation.on_cancel(sandbox.kill):
+                    execution = sandbox.run_code(script, **_run_options("crawl_websites", waves * timeout + 60))
+                stdout = "".join(execution.logs.stdout)
+                crawled = [
+                    json.loads(line[len(CRAWL_RESULT_MARKER):])
+                    for line in stdout.splitlines() if line.startswith(CRAWL_RESULT_MARKER)
+                ]
+                if execution.error:
+                    failure = f"Crawling error: {execution.error}"
     except Exception as e:
-        return f"Web crawling error: {str(e)}"
+        crawled = []
+        failure = f"Web crawling error: {str(e)}"
 
+    for result in crawled:
+        result["cached"] = False
+        if cache is not None and result.get("success"):
+            cache.put(result["url"], result["content"], CRAWL_RUN_CONFIG,
+                      result.get("etag"), result.get("last_modified"))
+        results.append(result)
 
-def create_crew(task_description: str):
+    # Partial results: report pages the script never got to
+    done = {result["url"] for result in crawled}
+    for url in pending:
+        if url not in done:
+            results.append({"url": url, "success": False, "content": None, "error": failure, "cached": False})
+
+    return results
+
+
+def _format_batch(results: list, extract: dict = None) -> str:
     """
-    Create a CrewAI crew with E2B tools
+    Render batch results for the agent, sharing the character budget across pages
+
+    Pages over their share are reduced to their passages relevant to the task when
+    there is a query, cut otherwise; whole pages are kept in the artifact store, with
+    their handle given to the agent.
+    """
+    succeeded = [r for r in results if r.get("success")]
+    per_page = max(1000, CRAWL_BATCH_MAX_CHARS // max(1, len(succeeded)))
+    store = get_artifact_store()
+
+    sections = [f"Crawled {len(succeeded)}/{len(results)} pages (in completion order)"]
+    for result in results:
+        if result.get("success"):
+            content = result["content"]
+            if len(content) > per_page:
+                relevant = _select_excerpts(content, extract, per_page // relevance.CHARS_PER_TOKEN)
+                excerpt = relevant or content[:per_page]
+                if store is not None:
+                    handle = store.put(content, "markdown", result["url"])
+                    content = (excerpt + f"\n[Content truncated: full page ({len(content):,} chars) "
+                               f"in artifact {handle}, read it with the Artifact Reader]")
+                else:
+                    content = excerpt + "\n[Content truncated...]"
+            sections.append(f"## {result['url']}\n\n{content}")
+        else:
+            sections.append(f"## {result['url']} (failed)\n\nError: {result.get('error')}")
+    return "\n\n".join(sections)
+
+
+def crawl_websites(urls: list, query: str = "") -> str:
+    """
+    Crawl several websites at once (much faster than one crawl_website call per page).
+    Long pages are reduced to the passages most relevant to the task.
+
+    Args:
+        urls: List of website URLs to crawl
+        query: Optional words describing what to look for on the pages (defaults to the task)
+
+    Returns:
+        Markdown content of each page, in the order the crawls completed
+    """
+    if isinstance(urls, str):
+        urls = [u for u in urls.replace(",", "\n").split()]
+    cancellation.check()
+    emit("tool_start", tool="crawl_websites", input=truncate(", ".join(urls)))
+    metrics.TOOL_CALLS.labels("crawl_websites").inc()
+    with tracing.span("tool.crawl_websites", urls=len(urls)):
+        results = crawl_many(urls)
+    if urls and not any(result.get("success") for result in results):
+        metrics.TOOL_ERRORS.labels("crawl_websites").inc()
+    output = _format_batch(results, _extract_options(query))
+    emit("tool_end", tool="crawl_websites", output=truncate(output))
+    return output
+
+
+def read_artifact(handle: str, offset: int = 0, length: int = 4000, query: str = "") -> str:
+    """
+    Read part of a large output (crawled page, long Python output) stored as an artifact.
+
+    Args:
+        handle: Artifact handle, e.g. "art_0123456789abcdef"
+        offset: Character offset to start reading at (see the artifact outline)
+        length: Number of characters to read (at most 4000)
+        query: Optional words to search for; returns the matching lines and their offsets instead
+
+    Returns:
+        The requested slice of the artifact
     """
-    # Define the agent
-    python_executor = Agent(
-        role='Python Executor and Advanced Web Researcher',
-        goal='Execute Python code, intelligently crawl websites with advanced techniques, and solve complex data analysis tasks',
-        backstory='''You are an expert Python programmer and web researcher with access to state-of-the-art crawling tools. 
+    emit("tool_start", tool="read_artifact", input=f"{handle} offset={offset} length={length} query={query}")
+    metrics.TOOL_CALLS.labels("read_artifact").inc()
+    store = get_artifact_store()
+    with tracing.span("tool.read_artifact", handle=handle):
+        if store is None:
+            output = "Error: the artifact store is disabled"
+        else:
+            output = store.read(handle, offset, length, query or None)
+    if output.startswith("Error:"):
+        metrics.TOOL_ERRORS.labels("read_artifact").inc()
+    emit("tool_end", tool="read_artifact", output=truncate(output))
+    return output
+
+
+def _on_agent_step(step):
+    """Crew step callback forwarding agent thoughts and tool calls as events"""
+    emit(
+        "agent_step",
+        thought=truncate(getattr(step, "thought", None)),
+        tool=getattr(step, "tool", None),
+        tool_input=truncate(getattr(step, "tool_input", None)),
+        output=truncate(getattr(step, "output", None) or getattr(step, "result", None))
+    )
+    # Stop the crew between steps once its task is cancelled
+    cancellation.check()
+
+
+AGENT_CONFIG = {
+    "role": 'Python Executor and Advanced Web Researcher',
+    "goal": 'Execute Python code, intelligently crawl websites with advanced techniques, and solve complex data analysis tasks',
+    "backstory": '''You are an expert Python programmer and web researcher with access to state-of-the-art crawling tools. 
         
 You can:
 - Execute Python code safely in isolated sandboxes
 - Crawl any website with advanced techniques (CSS selectors, wait conditions, JavaScript handling)
+- Crawl many pages at once with the batch crawler when researching several sources
+- Read large pages and outputs stored as artifacts slice by slice, only where the outline or a search points
 - Handle dynamic content, lazy loading, and complex web structures
 - Extract structured data from any type of website
 - Combine web data with Python analysis for insights
         
 You intelligently choose the right approach for each task and always provide clean, actionable results.''',
-        tools=[execute_python, crawl_website],
-        llm=LLM(
-            model="gpt-4o",
-            api_key=os.getenv("OPENAI_API_KEY")
-        ),
-        verbose=True
-    )
+}
 
-    # Define the task
-    execute_task = Task(
-        description=task_description,
-        agent=python_executor,
-        expected_output="Complete solution with execution results"
-    )
 
-    # Create the crew
-    crew = Crew(
-        agents=[python_executor],
-        tasks=[execute_task],
-        verbose=True
-    )
+def get_crew_factory():
+    """Crew factory with the agent's tools, imports CrewAI on first call"""
+    global _crew_factory
+    with _crew_factory_lock:
+        if _crew_factory is None:
+            from crewai.tools import tool
+            from crew_factory import CrewFactory
+
+            _crew_factory = CrewFactory(
+                AGENT_CONFIG,
+                tools=[
+                    tool("Python Interpreter")(execute_python),
+                    tool("Web Crawler")(crawl_website),
+                    tool("Batch Web Crawler")(crawl_websites),
+                    tool("Artifact Reader")(read_artifact),
+                ],
+                step_callback=_on_agent_step
+            )
+        return _crew_factory
+
+
+def warm_up():
+    """Load CrewAI and the E2B SDK and start pre-warming sandboxes (blocking)"""
+    import e2b_code_interpreter  # noqa: F401
+
+    get_crew_factory()
+    start_sandbox_pools()
+    logger.info("Warm-up complete")
+
+
+def create_crew(task_description: str):
+    """
+    Create a CrewAI crew with E2B tools
+    """
+    return get_crew_factory().create(task_description)
+
+
+def _run_crew(task: str):
+    """Blocking crew execution, runs in an execution engine worker"""
+    with tracing.span("crew.build"):
+        crew = create_crew(task)
+    with tracing.span("crew.kickoff"), metrics.CREW_KICKOFF_SECONDS.time():
+        return crew.kickoff()
+
 
-    return crew
+def _session_for_sandbox(sandbox_id: str):
+    """Session whose kernel runs in a sandbox, on this worker or another one"""
+    if _kernel_manager is not None:
+        for session in _kernel_manager.list():
+            if session["sandbox_id"] == sandbox_id:
+                return session["session_id"]
+    directory = get_sandbox_directory()
+    return directory.session_for_sandbox(sandbox_id) if directory is not None else None
 
 
-async def execute_crewai_task(task: str, sandbox_id: str = None) -> dict:
+async def execute_crewai_task(task: str, sandbox_id: str = None, session_id: str = None,
+                              timings: bool = False, coalesce: bool = True, priority: str = None,
+                              timeout: float = None) -> dict:
     """
     Execute a task using CrewAI with E2B Code Interpreter
-    
+
     Args:
         task: Task description for CrewAI
-        sandbox_id: Optional (not used in simple version)
-    
+        sandbox_id: Optional kernel sandbox of an existing session (see list_sessions): the
+            task continues that session, on whichever worker owns it
+        session_id: Optional conversation id, keeps execute_python state across tasks.
+            Without it, state is kept for the duration of this task only.
+        timings: Add the time spent per operation (LLM calls, tools, sandboxes) to the result
+        coalesce: Attach to an identical task already running (same text and options) instead
+            of starting another crew; its result is returned with "coalesced": true
+        priority: Scheduling class ("interactive", "research", "batch"), estimated from the
+            task when not given (see scheduler.py)
+        timeout: Deadline in seconds, queueing included (REQUEST_TIMEOUT by default). Tool
+            timeouts are cut to what is left of it, and the crew is stopped once it passes.
+
     Returns:
-        Execution result
+        Execution result, with "cancelled": true if the deadline passed
+
+    Raises:
+        EngineBusyError: If too many tasks are already running or queued
+        asyncio.CancelledError: If cancelled by the caller: the crew stops at its next step
+            and its running sandbox code is killed, unless other submissions share the run
     """
+    if session_id is None and sandbox_id:
+        session_id = _session_for_sandbox(sandbox_id)
+    timeout = timeout or request_timeout()
+    started_at = time.monotonic()
+
+    def execute():
+        return _execute_crewai_task(task, session_id, timings, priority, timeout, started_at)
+
+    coalescer = get_task_coalescer() if coalesce else None
+    if coalescer is None:
+        run = execute()
+    else:
+        # Never share a run (and its result) between tenants
+        key = task_key(task, session_id=session_id, timings=timings, tenant=current_tenant.get())
+        run = coalescer.run(key, execute)
+
     try:
-        logger.info(f"Executing CrewAI task: {task[:100]}...")
-        
-        # Create crew
-        crew = create_crew(task)
-        
-        # Execute task
-        result = crew.kickoff()
-        
+        result = await asyncio.wait_for(run, timeout)
+    except asyncio.TimeoutError:
+        # The run was cancelled with its deadline (or goes on for the submissions it is shared with)
+        logger.warning(f"Task deadline of {timeout:g}s exceeded")
+        return {"success": False, "error": f"Deadline of {timeout:g}s exceeded", "cancelled": True}
+
+    if coalescer is not None:
+        result, coalesced = result
+        if coalesced:
+            metrics.TASKS_COALESCED.inc()
+            result = {**result, "coalesced": True}
+    return result
+
+
+async def _run_scheduled(task: str, priority: str = None):
+    """Run the crew in the execution engine once the scheduler grants the tenant a slot"""
+    scheduler = get_task_scheduler()
+    if scheduler is None:
+        return await get_execution_engine().run(_run_crew, task)
+
+    priority = resolve_priority(priority, task)
+    tenant = current_tenant.get()
+    tracing.current_span.get().set(priority=priority, tenant=tenant)
+    queued_at = time.monotonic()
+    async with scheduler.slot(tenant, priority):
+        metrics.SCHEDULER_WAIT_SECONDS.labels(priority).observe(time.monotonic() - queued_at)
+        return await get_execution_engine().run(_run_crew, task)
+
+
+async def _execute_crewai_task(task: str, session_id: str = None, timings: bool = False,
+                               priority: str = None, timeout: float = None, started_at: float = None) -> dict:
+    """One crew run (see execute_crewai_task)"""
+    # Python state lives in a kernel keyed by session (a throwaway one per task by default)
+    session = session_id or f"{TASK_SESSION_PREFIX}{uuid.uuid4().hex}"
+    token = current_session.set(session)
+    task_token = current_task.set(task)
+    # Seen by the crew's worker thread and its tools, which stop once it is cancelled
+    scope = CancelScope(timeout, started_at)
+    scope_token = current_scope.set(scope)
+    try:
+        with tracing.collect() as spans, tracing.span("execute_crewai_task", session=session) as task_span:
+            logger.info(f"Executing CrewAI task: {task[:100]} (trace {task_span.trace_id})")
+
+            # Build and run the crew in the worker pool, off the event loop, when its turn comes
+            result = await _run_scheduled(task, priority)
+
         logger.info("Task completed successfully")
-        return {
+        response = {
             "success": True,
             "result": str(result)
         }
-        
+
+    except EngineBusyError:
+        raise
+    except asyncio.CancelledError:
+        # Nobody waits for the result any more: stop the crew and kill its running sandbox code
+        reason = "deadline" if scope.expired else "cancelled"
+        scope.cancel("Task deadline exceeded" if scope.expired else "Task cancelled")
+        metrics.TASKS_CANCELLED.labels(reason).inc()
+        raise
+    except TaskCancelled as e:
+        # The crew noticed the deadline by itself
+        logger.warning(f"Task stopped: {str(e)}")
+        metrics.TASKS_CANCELLED.labels("deadline").inc()
+        response = {
+            "success": False,
+            "error": str(e),
+            "cancelled": True
+        }
     except Exception as e:
         logger.error(f"Error executing task: {str(e)}")
-        return {
+        response = {
             "success": False,
             "error": str(e)
         }
+    finally:
+        current_session.reset(token)
+        current_task.reset(task_token)
+        current_scope.reset(scope_token)
+        if session_id is None and _kernel_manager is not None:
+            await asyncio.to_thread(_kernel_manager.release, session)
+
+    if timings:
+        response["timings"] = tracing.breakdown(spans)
+    return response
+
+
+async def reset_session(session_id: str) -> dict:
+    """
+    Clear the Python state of a session (variables, imports, loaded data)
+
+    Args:
+        session_id: Session to reset
+
+    Returns:
+        Reset result
+    """
+    if _kernel_manager is None or not await asyncio.to_thread(_kernel_manager.reset, session_id):
+        return {"success": False, "error": f"Session {session_id} not found"}
+    return {"success": True, "message": f"Session {session_id} reset"}
+
+
+async def list_sessions() -> dict:
+    """List active Python sessions, those of the other workers included"""
+    sessions = _kernel_manager.list() if _kernel_manager is not None else []
+    directory = get_sandbox_directory()
+    if directory is not None:
+        local = {session["session_id"] for session in sessions}
+        for session in sessions:
+            session["worker_id"] = directory.worker
+        records = await asyncio.to_thread(directory.state.items, "sessions")
+        sessions += [
+            {"session_id": session_id, "sandbox_id": record["sandbox_id"], "worker_id": record["worker_id"]}
+            for session_id, record in records.items() if session_id not in local
+        ]
+    return {"sessions": sessions, "count": len(sessions)}
+
+
+async def stream_crewai_task(task: str, sandbox_id: str = None, session_id: str = None, timings: bool = False,
+                             coalesce: bool = True, priority: str = None, timeout: float = None,
+                             request_id: str = None):
+    """
+    Execute a task while yielding its progress events
+
+    Args:
+        task: Task description for CrewAI
+        sandbox_id: Optional kernel sandbox of an existing session (see execute_crewai_task)
+        session_id: Optional conversation id (see execute_crewai_task)
+        timings: Add the per-operation timing breakdown to the final event
+        coalesce: Attach to an identical task already running (see execute_crewai_task); an
+            attached stream only gets the accepted and final events
+        priority: Scheduling class (see execute_crewai_task)
+        timeout: Deadline in seconds (see execute_crewai_task)
+        request_id: Id the task can be cancelled with (see cancellation.RequestRegistry),
+            reported in the accepted event
+
+    Yields:
+        Event dicts (see events.py), `None` as keep-alive during silence, and
+        finally a "final" event carrying the execution result. Closing the
+        generator (client gone) cancels the task.
+    """
+    stream = EventStream()
+
+    async def run():
+        current_emitter.set(stream)
+        try:
+            result = await execute_crewai_task(task, sandbox_id, session_id, timings, coalesce, priority, timeout)
+        except EngineBusyError as e:
+            result = {"success": False, "error": str(e), "retry_after": e.retry_after}
+        except asyncio.CancelledError:
+            result = {"success": False, "error": "Task cancelled", "cancelled": True}
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        stream.emit("final", **result)
+        stream.close()
+
+    runner = asyncio.create_task(run())
+    stream.emit("accepted", task=truncate(task, 200), request_id=request_id)
+
+    try:
+        with get_request_registry().track(request_id, runner, timeout or request_timeout()):
+            async for event in stream:
+                yield event
+            await runner
+    finally:
+        if not runner.done():
+            runner.cancel()
 
 
 async def list_active_sandboxes() -> dict:
-    """List active sandboxes (simple version - no caching)"""
-    return {
-        "active_sandboxes": [],
-        "count": 0,
-        "note": "Simple version uses ephemeral sandboxes"
-    }
+    """List sandboxes currently owned by the tool pools, of every worker"""
+    with _sandbox_pools_lock:
+        pools = list(_sandbox_pools.values())
+
+    stats = [pool.stats() for pool in pools]
+    sandbox_ids = [sandbox_id for pool_stats in stats for sandbox_id in pool_stats["sandbox_ids"]]
+    result = {"pools": stats}
+
+    directory = get_sandbox_directory()
+    if directory is not None:
+        workers = await asyncio.to_thread(directory.workers)
+        workers[directory.worker] = {"sandbox_ids": sandbox_ids}
+        result["workers"] = {worker: record.get("sandbox_ids", []) for worker, record in workers.items()}
+        sandbox_ids = [sandbox_id for ids in result["workers"].values() for sandbox_id in ids]
+
+    return {"active_sandboxes": sandbox_ids, "count": len(sandbox_ids), **result}
 
 
 async def cleanup_sandbox(sandbox_id: str) -> dict:
-    """Cleanup sandbox (simple version - auto cleanup)"""
-    return {
-        "success": True, 
-        "message": "Simple version uses auto-cleanup sandboxes"
-    }
+    """
+    Kill a pooled sandbox
+
+    Args:
+        sandbox_id: Sandbox ID to cleanup
+
+    Returns:
+        Cleanup result
+    """
+    with _sandbox_pools_lock:
+        pools = list(_sandbox_pools.values())
+
+    for pool in pools:
+        if pool.remove(sandbox_id):
+            logger.info(f"Removed sandbox {sandbox_id} from pool '{pool.name}'")
+            return {"success": True, "message": f"Sandbox {sandbox_id} removed from pool '{pool.name}'"}
+
+    # Owned by another worker: kill it there, its pool discards it on the next health check
+    directory = get_sandbox_directory()
+    owner = await asyncio.to_thread(directory.owner_of, sandbox_id) if directory is not None else None
+    if owner is not None:
+        try:
+            sandbox = await asyncio.to_thread(_connect_sandbox, sandbox_id)
+            await asyncio.to_thread(sandbox.kill)
+        except Exception as e:
+            return {"success": False, "error": f"Failed to kill sandbox {sandbox_id} of worker {owner}: {str(e)}"}
+        logger.info(f"Killed sandbox {sandbox_id} of worker {owner}")
+        return {"success": True, "message": f"Sandbox {sandbox_id} killed (owned by worker {owner})"}
+
+    return {"success": False, "error": f"Sandbox {sandbox_id} not found in pools"}
 
 
 # Create MCP server
@@ -391,15 +1298,50 @@ The agent intelligently selects the optimal approach for each task.""",
                     },
                     "sandbox_id": {
                         "type": "string",
-                        "description": "Optional: Not used in simple version"
+                        "description": "Optional: Kernel sandbox of an existing Python session, continues that session"
+                    },
+                    "session_id": {
+                        "type": "string",
+                        "description": "Optional: Conversation id, keeps Python state (variables, loaded data) across tasks"
+                    },
+                    "include_timings": {
+                        "type": "boolean",
+                        "description": "Optional: Return the time spent in LLM calls, tools and sandboxes"
+                    },
+                    "coalesce": {
+                        "type": "boolean",
+                        "description": "Optional: Share the run of an identical task already in progress (default true)"
+                    },
+                    "priority": {
+                        "type": "string",
+                        "enum": ["interactive", "research", "batch"],
+                        "description": "Optional: Scheduling class, estimated from the task by default"
+                    },
+                    "timeout": {
+                        "type": "number",
+                        "description": "Optional: Deadline in seconds, the task is stopped once it passes"
                     }
                 },
                 "required": ["task"]
             }
         ),
+        Tool(
+            name="reset_session",
+            description="Clear the Python state (variables, imports, loaded data) of a session",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "session_id": {
+                        "type": "string",
+                        "description": "Session id passed to execute_crewai_task"
+                    }
+                },
+                "required": ["session_id"]
+            }
+        ),
         Tool(
             name="list_sandboxes",
-            description="List active E2B sandboxes (simple version uses ephemeral sandboxes)",
+            description="List warm E2B sandboxes owned by the tool pools",
             inputSchema={
                 "type": "object",
                 "properties": {}
@@ -407,13 +1349,13 @@ The agent intelligently selects the optimal approach for each task.""",
         ),
         Tool(
             name="cleanup_sandbox",
-            description="Cleanup sandbox (simple version uses auto-cleanup)",
+            description="Kill a pooled sandbox (a fresh one is pre-warmed if needed)",
             inputSchema={
                 "type": "object",
                 "properties": {
                     "sandbox_id": {
                         "type": "string",
-                        "description": "Sandbox ID (not used in simple version)"
+                        "description": "Sandbox ID to cleanup"
                     }
                 },
                 "required": ["sandbox_id"]
@@ -422,6 +1364,48 @@ The agent intelligently selects the optimal approach for each task.""",
     ]
 
 
+def _progress_token():
+    """Progress token of the MCP request being handled, if the client asked for progress"""
+    try:
+        meta = app.request_context.meta
+    except LookupError:
+        return None
+    return getattr(meta, "progressToken", None) if meta else None
+
+
+async def _execute_with_progress(task: str, sandbox_id: str, session_id: str, progress_token,
+                                 timings: bool = False, coalesce: bool = True, priority: str = None,
+                                 timeout: float = None) -> dict:
+    """Run a task, relaying its events to the MCP client as progress notifications"""
+    session = app.request_context.session
+    result = None
+    progress = 0
+
+    events = stream_crewai_task(task, sandbox_id, session_id, timings, coalesce, priority, timeout)
+    try:
+        async for event in events:
+            if event is None:
+                continue
+            if event["type"] == "final":
+                result = {key: value for key, value in event.items() if key not in ("type", "timestamp")}
+                continue
+
+            progress += 1
+            try:
+                await session.send_progress_notification(progress_token, progress, message=describe(event))
+            except TypeError:
+                # Older MCP SDKs have no message field on progress notifications
+                await session.send_progress_notification(progress_token, progress)
+                await session.send_log_message(level="info", data=event)
+            except Exception as e:
+                logger.warning(f"Failed to send progress notification: {str(e)}")
+    finally:
+        # Cancelled by the client: closing the stream cancels the task now, not at garbage collection
+        await events.aclose()
+
+    return result
+
+
 @app.call_tool()
 async def call_tool(name: str, arguments: Any) -> list[TextContent]:
     """Handle tool calls"""
@@ -429,6 +1413,11 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
     if name == "execute_crewai_task":
         task = arguments.get("task")
         sandbox_id = arguments.get("sandbox_id")
+        session_id = arguments.get("session_id")
+        timings = bool(arguments.get("include_timings"))
+        coalesce = arguments.get("coalesce", True) is not False
+        priority = arguments.get("priority")
+        timeout = arguments.get("timeout")
 
         if not task:
             return [TextContent(
@@ -436,8 +1425,35 @@ async def call_tool(name: str, arguments: Any) -> list[TextContent]:
                 text=json.dumps({"error": "Task parameter is required"})
             )]
 
-        result = await execute_crewai_task(task, sandbox_id)
+        progress_token = _progress_token()
+        if progress_token is not None:
+            result = await _execute_with_progress(
+                task, sandbox_id, session_id, progress_token, timings, coalesce, priority, timeout
+            )
+        else:
+            # A cancellation notification from the client cancels this handler, and the task with it
+            try:
+                result = await execute_crewai_task(
+                    task, sandbox_id, session_id, timings, coalesce, priority, timeout
+                )
+            except EngineBusyError as e:
+                result = {"success": False, "error": str(e), "retry_after": e.retry_after}
+
+        return [TextContent(
+            type="text",
+            text=json.dumps(result, indent=2)
+        )]
+
+    elif name == "reset_session":
+        session_id = arguments.get("session_id")
+
+        if not session_id:
+            return [TextContent(
+                type="text",
+                text=json.dumps({"error": "session_id parameter is required"})
+            )]
 
+        result = await reset_session(session_id)
         return [TextContent(
             type="text",
             text=json.dumps(result, indent=2)
@@ -478,10 +1494,20 @@ async def main():
         raise Exception(f"Missing environment variables: {', '.join(missing)}")
 
     logger.info("Environment variables OK")
+
+    metrics.start_server()
+
+    # Heavy imports and sandbox pre-warming happen while the client connects
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
     logger.info("MCP Server ready to accept connections")
 
-    async with stdio_server() as (read_stream, write_stream):
-        await app.run(read_stream, write_stream, app.create_initialization_options())
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await app.run(read_stream, write_stream, app.create_initialization_options())
+    finally:
+        shutdown_sandbox_pools()
+        tracing.shutdown()
 
 
 if __name__ == "__main__":
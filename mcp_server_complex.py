@@ -17,12 +17,40 @@ from crewai import Agent, Task, Crew, LLM
 import os
 from dotenv import load_dotenv
 
+import tracing
+from sandbox_registry import SandboxRegistry
+from sandbox_templates import TemplateSpec, create_provisioned_sandbox
+
 load_dotenv()
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("e2b-crewai-mcp")
 
+# Image providing the MCP gateway the CrewAI template is built from. Without it no template is built
+# or used: sandboxes start from the "mcp-gateway" template and install their dependencies once.
+CREWAI_BASE_IMAGE = os.getenv("CREWAI_BASE_IMAGE")
+
+# Runtime of the in-sandbox CrewAI agent, built once per dependency set (see sandbox_templates.py).
+# The agent code is hot-uploaded to each new sandbox, editing it never triggers a reinstall.
+CREWAI_TEMPLATE = TemplateSpec(
+    name="crewai",
+    packages=[
+        "crewai>=0.28.0",
+        "e2b-code-interpreter>=0.0.10",
+        "requests>=2.31.0",
+        "python-dotenv>=1.0.0",
+    ],
+    install_timeout=180,  # 3 minutes (seconds!)
+    base_image=CREWAI_BASE_IMAGE,
+    require_base_image=True,
+    files={"/root/crewai_agent.py": os.path.join(os.path.dirname(os.path.abspath(__file__)), "crewai_agent.py")},
+)
+
+TEMPLATE_SPECS = {
+    CREWAI_TEMPLATE.name: CREWAI_TEMPLATE,
+}
+
 @tool("Python Interpreter")
 def execute_python(code: str) -> str:
     """
@@ -37,91 +65,64 @@ def execute_python(code: str) -> str:
     except Exception as e:
         return f"Execution error: {str(e)}"
 
-async def get_or_create_sandbox(sandbox_id: str = None) -> Sandbox:
-    """
-    Get existing sandbox or create new one with MCP + CrewAI
-
-    Args:
-        sandbox_id: Optional sandbox ID to reuse
-
-    Returns:
-        Sandbox instance
-    """
-    async with _sandbox_lock:
-        # Try to reuse existing sandbox
-        if sandbox_id and sandbox_id in _sandbox_cache:
-            try:
-                sbx = _sandbox_cache[sandbox_id]
-                # Test if still alive
-                sbx.commands.run("echo test", timeout=5000)
-                logger.info(f"Reusing existing sandbox: {sandbox_id}")
-                return sbx
-            except:
-                logger.warning(f"Sandbox {sandbox_id} not reachable, creating new one")
-                del _sandbox_cache[sandbox_id]
-
-        # Create new sandbox
-        logger.info("Creating new E2B sandbox with MCP Gateway...")
-
-        sbx = Sandbox.beta_create(
-            template="mcp-gateway",
-            mcp={
-                "browserbase": {
-                    "apiKey": os.getenv("BROWSERBASE_API_KEY", ""),
-                    "geminiApiKey": os.getenv("GEMINI_API_KEY", ""),
-                    "projectId": os.getenv("BROWSERBASE_PROJECT_ID", ""),
-                },
-                "exa": {
-                    "apiKey": os.getenv("EXA_API_KEY", ""),
-                },
-                "duckduckgo": {},  # No API key needed
-                "arxiv": {"storagePath": "/"},
+def _create_gateway_sandbox(template: str = None) -> Sandbox:
+    """Start an MCP Gateway sandbox, from the prebuilt CrewAI template when there is one"""
+    return Sandbox.beta_create(
+        template=template or "mcp-gateway",
+        mcp={
+            "browserbase": {
+                "apiKey": os.getenv("BROWSERBASE_API_KEY", ""),
+                "geminiApiKey": os.getenv("GEMINI_API_KEY", ""),
+                "projectId": os.getenv("BROWSERBASE_PROJECT_ID", ""),
             },
-            timeout=600,  # 10 minutes
-            envs={
-                "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY"),
-                "E2B_API_KEY": os.getenv("E2B_API_KEY")
-            }
-        )
+            "exa": {
+                "apiKey": os.getenv("EXA_API_KEY", ""),
+            },
+            "duckduckgo": {},  # No API key needed
+            "arxiv": {"storagePath": "/"},
+        },
+        timeout=600,  # 10 minutes
+        envs={
+            "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY"),
+            "E2B_API_KEY": os.getenv("E2B_API_KEY")
+        }
+    )
 
-        logger.info(f"Sandbox created: {sbx.sandbox_id}")
 
-        # Upload CrewAI agent code
-        logger.info("Setting up CrewAI in sandbox...")
-        with open("crewai_agent.py", "r") as f:
-            agent_code = f.read()
+def _create_sandbox() -> Sandbox:
+    """
+    Create a sandbox with MCP + CrewAI (blocking, run in a thread by the registry)
 
-        sbx.files.write("/root/crewai_agent.py", agent_code)
+    Starts from the template built for the current requirements hash; without
+    one, dependencies are installed once in place. The agent code is uploaded
+    either way.
 
-        # Create requirements
-        requirements = """crewai>=0.28.0
-e2b-code-interpreter>=0.0.10
-requests>=2.31.0
-python-dotenv>=1.0.0
-"""
-        sbx.files.write("/root/requirements.txt", requirements)
+    Returns:
+        Ready sandbox instance
+    """
+    logger.info("Creating new E2B sandbox with MCP Gateway...")
+    with tracing.span("e2b.create", template=CREWAI_TEMPLATE.name):
+        sbx = create_provisioned_sandbox(CREWAI_TEMPLATE, _create_gateway_sandbox)
+    logger.info(f"Sandbox ready: {sbx.sandbox_id}")
+    return sbx
 
-        # Environment variables are now set via E2B envs parameter above
 
-        # Install dependencies
-        logger.info("Installing dependencies...")
-        result = sbx.commands.run(
-            "pip install -q -r /root/requirements.txt",
-            timeout=180  # 3 minutes (seconds!)
-        )
+# Sandboxes kept for reuse across tasks, probed and kept alive in the background
+# (SANDBOX_REGISTRY_MAX, SANDBOX_REGISTRY_TTL, SANDBOX_KEEP_ALIVE, HEALTH_CHECK_INTERVAL)
+_registry = SandboxRegistry(_create_sandbox)
 
-        if result.exit_code != 0:
-            logger.error(f"Failed to install dependencies: {result.stderr}")
-            raise Exception(f"Dependency installation failed: {result.stderr}")
 
-        # Keep alive for 30 minutes
-        sbx.keep_alive(1800)
+async def get_or_create_sandbox(sandbox_id: str = None) -> Sandbox:
+    """
+    Get existing sandbox or create new one with MCP + CrewAI
 
-        # Cache the sandbox
-        _sandbox_cache[sbx.sandbox_id] = sbx
+    Args:
+        sandbox_id: Optional sandbox ID to reuse
 
-        logger.info(f"Sandbox ready: {sbx.sandbox_id}")
-        return sbx
+    Returns:
+        Sandbox instance
+    """
+    return await _registry.get_or_create(sandbox_id)
 
 
 async def execute_crewai_task(task: str, sandbox_id: str = None) -> dict:
@@ -136,11 +137,23 @@ async def execute_crewai_task(task: str, sandbox_id: str = None) -> dict:
         Execution result
     """
     try:
-        # Get or create sandbox
-        sbx = await get_or_create_sandbox(sandbox_id)
+        with tracing.span("execute_crewai_task", sandbox_id=sandbox_id):
+            # Hold the sandbox for the whole task: runs sharing it would overwrite task_runner.py
+            async with _registry.lease(sandbox_id) as sbx:
+                return await asyncio.to_thread(_run_task, sbx, task)
+
+    except Exception as e:
+        logger.error(f"Error executing task: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
 
-        # Create a temporary Python script to run the task
-        task_script = f'''
+def _run_task(sbx: Sandbox, task: str) -> dict:
+    """Run one CrewAI task in a leased sandbox (blocking)"""
+    # Create a temporary Python script to run the task
+    task_script = f'''
 from crewai_agent import create_crew
 import json
 
@@ -164,50 +177,49 @@ except Exception as e:
 print(json.dumps(output))
 '''
 
-        sbx.files.write("/root/task_runner.py", task_script)
+    sbx.files.write("/root/task_runner.py", task_script)
 
-        # Execute the task
-        logger.info(f"Executing CrewAI task in sandbox {sbx.sandbox_id}...")
+    # Execute the task
+    logger.info(f"Executing CrewAI task in sandbox {sbx.sandbox_id}...")
+    with tracing.span("e2b.commands.run", sandbox_id=sbx.sandbox_id):
         result = sbx.commands.run(
             "cd /root && python task_runner.py",
-            timeout=300  # 5 minutes for task execution
+            timeout=300,  # 5 minutes for task execution
+            envs=tracing.trace_envs()
         )
 
-        if result.exit_code != 0:
-            logger.error(f"Task execution failed: {result.stderr}")
-            return {
-                "success": False,
-                "error": f"Execution failed: {result.stderr}",
-                "sandbox_id": sbx.sandbox_id
-            }
-
-        # Parse the JSON output
-        try:
-            output = json.loads(result.stdout.strip())
-            logger.info(f"Task completed successfully in sandbox {sbx.sandbox_id}")
-            return output
-        except json.JSONDecodeError:
-            logger.error(f"Failed to parse output: {result.stdout}")
-            return {
-                "success": False,
-                "error": "Failed to parse task output",
-                "raw_output": result.stdout,
-                "sandbox_id": sbx.sandbox_id
-            }
+    if result.exit_code != 0:
+        logger.error(f"Task execution failed: {result.stderr}")
+        return {
+            "success": False,
+            "error": f"Execution failed: {result.stderr}",
+            "sandbox_id": sbx.sandbox_id
+        }
 
-    except Exception as e:
-        logger.error(f"Error executing task: {str(e)}")
+    # Parse the JSON output
+    try:
+        output = json.loads(result.stdout.strip())
+        logger.info(f"Task completed successfully in sandbox {sbx.sandbox_id}")
+        return output
+    except json.JSONDecodeError:
+        logger.error(f"Failed to parse output: {result.stdout}")
         return {
             "success": False,
-            "error": str(e)
+            "error": "Failed to parse task output",
+            "raw_output": result.stdout,
+            "sandbox_id": sbx.sandbox_id
         }
 
 
 async def list_active_sandboxes() -> dict:
-    """List all active sandboxes in cache"""
+    """List all sandboxes held by the registry"""
+    # Opportunistic eviction keeps the listing accurate
+    await _registry.evict()
+    sandboxes = await _registry.list()
     return {
-        "active_sandboxes": list(_sandbox_cache.keys()),
-        "count": len(_sandbox_cache)
+        "active_sandboxes": [s["sandbox_id"] for s in sandboxes],
+        "sandboxes": sandboxes,
+        "count": len(sandboxes)
     }
 
 
@@ -221,18 +233,12 @@ async def cleanup_sandbox(sandbox_id: str) -> dict:
     Returns:
         Cleanup result
     """
-    async with _sandbox_lock:
-        if sandbox_id in _sandbox_cache:
-            try:
-                sbx = _sandbox_cache[sandbox_id]
-                # E2B sandboxes auto-cleanup, just remove from cache
-                del _sandbox_cache[sandbox_id]
-                logger.info(f"Removed sandbox {sandbox_id} from cache")
-                return {"success": True, "message": f"Sandbox {sandbox_id} removed from cache"}
-            except Exception as e:
-                return {"success": False, "error": str(e)}
-        else:
-            return {"success": False, "error": f"Sandbox {sandbox_id} not found in cache"}
+    try:
+        if await _registry.remove(sandbox_id):
+            return {"success": True, "message": f"Sandbox {sandbox_id} killed and removed"}
+        return {"success": False, "error": f"Sandbox {sandbox_id} not found in cache"}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
 
 
 # Create MCP server
@@ -286,7 +292,7 @@ The agent will intelligently use the appropriate tools to complete the task.""",
         ),
         Tool(
             name="cleanup_sandbox",
-            description="Remove a sandbox from cache (it will be auto-cleaned by E2B)",
+            description="Kill a cached sandbox and remove it from the registry",
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -364,10 +370,20 @@ async def main():
         raise Exception(f"Missing environment variables: {', '.join(missing)}")
 
     logger.info("Environment variables OK")
+    if not CREWAI_BASE_IMAGE:
+        logger.error(
+            "CREWAI_BASE_IMAGE is not set: CrewAI templates are disabled, every sandbox installs its dependencies "
+            "on creation (set it to an image providing the MCP gateway to build one)"
+        )
+    _registry.start()
     logger.info("MCP Server ready to accept connections")
 
-    async with stdio_server() as (read_stream, write_stream):
-        await app.run(read_stream, write_stream, app.create_initialization_options())
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await app.run(read_stream, write_stream, app.create_initialization_options())
+    finally:
+        await _registry.close()
+        tracing.shutdown()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,521 @@
+"""
+Memoize
+Content-addressed memoization of execute_python results
+
+Results are keyed by the hash of the code plus the hashes of the data files it
+reads, and kept in an LRU. Code that depends on randomness, the clock or the
+network is detected from its AST and always executed.
+
+Stateless executions are memoized by content, and so are self-contained
+snippets run in a session: snippets that read no kernel names they do not
+define themselves, bind no names in the kernel and write no files, so that
+skipping them leaves the kernel as running them would. Their results are shared
+across tasks and sessions. For other snippets the kernel state shapes the
+result and executing them changes that state, so a result is only replayed when
+the same snippet is re-run right after itself on the same kernel (nothing else
+ran, no reset), reads the same file contents, and does not look like it
+mutates state (augmented assignments, del, append/update/...
+calls, inplace=True, rebinding a name it reads from the kernel like
+`x = x + 1`, attribute or item assignment).
+
+Opt-in with PYTHON_MEMO_ENABLED=true.
+"""
+import ast
+import builtins
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger("e2b-crewai-mcp")
+
+# Modules whose use makes a result non-reproducible
+NONDETERMINISTIC_MODULES = {
+    "random", "secrets", "uuid", "time", "datetime",
+    "requests", "urllib", "urllib3", "http", "httpx", "aiohttp", "socket", "ftplib", "smtplib",
+    "subprocess", "webbrowser", "yfinance",
+}
+
+# Attribute names reached through other modules (np.random.rand, df.sample, datetime.now, ...)
+NONDETERMINISTIC_ATTRIBUTES = {
+    "random", "rand", "randn", "randint", "choice", "shuffle", "sample", "permutation",
+    "urandom", "now", "today", "utcnow", "time", "perf_counter", "monotonic", "getpid",
+}
+
+# Method calls that change an object in place, so re-running a snippet is not a no-op
+MUTATING_METHODS = {
+    "append", "extend", "insert", "pop", "popleft", "popitem", "remove", "clear",
+    "update", "add", "discard", "setdefault", "appendleft", "rotate",
+}
+
+# Names a snippet can read without them coming from the kernel's state
+KNOWN_NAMES = set(dir(builtins)) | {"display", "get_ipython"}
+
+# Calls writing files (or whose effect cannot be told from the code): replaying the result would skip them
+WRITING_CALLS = {
+    "to_csv", "to_excel", "to_json", "to_parquet", "to_pickle", "to_feather", "to_hdf", "to_sql",
+    "savefig", "save", "savez", "dump", "write", "writelines", "write_text", "write_bytes",
+    "mkdir", "makedirs", "remove", "unlink", "rename", "rmdir", "rmtree", "touch",
+    "exec", "eval", "compile", "globals", "locals", "vars", "setattr", "delattr",
+}
+
+URL_PATTERN = re.compile(r"^(https?|ftp|wss?)://", re.IGNORECASE)
+DATA_FILE_PATTERN = re.compile(
+    r"^[\w./~-]+\.(csv|tsv|json|jsonl|parquet|feather|xlsx|xls|txt|xml|pkl|pickle|h5|hdf5|db|sqlite|npy|npz)$",
+    re.IGNORECASE
+)
+
+# Prints {path: sha256 or null} for the given paths, without leaving names in the kernel
+FILE_HASH_PROBE = (
+    "print(__import__('json').dumps({{p: (__import__('hashlib').sha256(open(p, 'rb').read()).hexdigest() "
+    "if __import__('os').path.isfile(p) else None) for p in {paths!r}}}))"
+)
+
+# Rich result formats kept alongside the text output
+RICH_FORMATS = ("text", "html", "markdown", "json", "png", "jpeg", "svg", "latex")
+
+
+def _parse(code: str):
+    try:
+        return ast.parse(code)
+    except SyntaxError:
+        # IPython magics and shell escapes, never memoized
+        return None
+
+
+class _NameUse(ast.NodeVisitor):
+    """
+    Module-level names a snippet reads and binds, visited in execution order
+
+    Function and lambda bodies are visited last, once every module-level name is bound.
+
+    Attributes:
+        free: Names read before the snippet binds them, i.e. from the kernel
+        bound: Names the snippet binds in the kernel
+        rebinds_free: A name read from the kernel is bound again (x = x + 1, df = df.drop(...))
+        stores_into_objects: Attribute or item assignment (obj.attr = ..., d[k] = ...)
+    """
+
+    def __init__(self):
+        self.free = set()
+        self.bound = set()
+        self.rebinds_free = False
+        self.stores_into_objects = False
+        # Names local to the functions, classes and comprehensions being visited
+        self._scopes = []
+        self._deferred = []
+
+    def analyze(self, tree):
+        for statement in tree.body:
+            self.visit(statement)
+        while self._deferred:
+            scopes, params, body = self._deferred.pop(0)
+            saved, self._scopes = self._scopes, scopes + [params]
+            for node in body:
+                self.visit(node)
+            self._scopes = saved
+        return self
+
+    def _load(self, name: str):
+        if name not in self.bound and name not in KNOWN_NAMES and not any(name in s for s in self._scopes):
+            self.free.add(name)
+
+    def _store(self, name: str):
+        if self._scopes:
+            self._scopes[-1].add(name)
+            return
+        if name in self.free:
+            self.rebinds_free = True
+        self.bound.add(name)
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self._load(node.id)
+        else:
+            self._store(node.id)
+
+    def visit_Attribute(self, node):
+        if not isinstance(node.ctx, ast.Load):
+            self.stores_into_objects = True
+        self.visit(node.value)
+
+    def visit_Subscript(self, node):
+        if not isinstance(node.ctx, ast.Load):
+            self.stores_into_objects = True
+        self.visit(node.value)
+        self.visit(node.slice)
+
+    # Values are evaluated before their targets are bound
+
+    def visit_Assign(self, node):
+        self.visit(node.value)
+        for target in node.targets:
+            self.visit(target)
+
+    def visit_AnnAssign(self, node):
+        if node.value is not None:
+            self.visit(node.value)
+        self.visit(node.annotation)
+        self.visit(node.target)
+
+    def visit_AugAssign(self, node):
+        self.visit(node.value)
+        if isinstance(node.target, ast.Name):
+            self._load(node.target.id)
+        self.visit(node.target)
+
+    def visit_NamedExpr(self, node):
+        self.visit(node.value)
+        self.visit(node.target)
+
+    def visit_For(self, node):
+        self.visit(node.iter)
+        self.visit(node.target)
+        for statement in node.body + node.orelse:
+            self.visit(statement)
+
+    visit_AsyncFor = visit_For
+
+    def visit_With(self, node):
+        for item in node.items:
+            self.visit(item.context_expr)
+            if item.optional_vars is not None:
+                self.visit(item.optional_vars)
+        for statement in node.body:
+            self.visit(statement)
+
+    visit_AsyncWith = visit_With
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self._store(alias.asname or alias.name.split(".")[0])
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            # A star import binds names we cannot list
+            self._store(alias.asname or alias.name)
+
+    def visit_ExceptHandler(self, node):
+        if node.type is not None:
+            self.visit(node.type)
+        if node.name:
+            self._store(node.name)
+        for statement in node.body:
+            self.visit(statement)
+
+    def _visit_function(self, node, body: list):
+        for default in node.args.defaults + [d for d in node.args.kw_defaults if d is not None]:
+            self.visit(default)
+        args = node.args.posonlyargs + node.args.args + node.args.kwonlyargs + [node.args.vararg, node.args.kwarg]
+        params = {arg.arg for arg in args if arg is not None}
+        self._deferred.append((list(self._scopes), params, body))
+
+    def visit_FunctionDef(self, node):
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        self._store(node.name)
+        self._visit_function(node, node.body)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        self._visit_function(node, [node.body])
+
+    def visit_ClassDef(self, node):
+        for child in node.decorator_list + node.bases + [k.value for k in node.keywords]:
+            self.visit(child)
+        self._scopes.append(set())
+        for statement in node.body:
+            self.visit(statement)
+        self._scopes.pop()
+        self._store(node.name)
+
+    def _visit_comprehension(self, node, results: list):
+        # The first iterable is evaluated in the enclosing scope, the rest in the comprehension's
+        self.visit(node.generators[0].iter)
+        self._scopes.append(set())
+        for i, generator in enumerate(node.generators):
+            if i:
+                self.visit(generator.iter)
+            self.visit(generator.target)
+            for condition in generator.ifs:
+                self.visit(condition)
+        for result in results:
+            self.visit(result)
+        self._scopes.pop()
+
+    def visit_ListComp(self, node):
+        self._visit_comprehension(node, [node.elt])
+
+    visit_SetComp = visit_GeneratorExp = visit_ListComp
+
+    def visit_DictComp(self, node):
+        self._visit_comprehension(node, [node.key, node.value])
+
+
+def bypass_reason(code: str):
+    """
+    Why a snippet must always be executed
+
+    Returns:
+        A short reason, or None if its result only depends on code and inputs
+    """
+    tree = _parse(code)
+    if tree is None:
+        return "not plain Python"
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name.split(".")[0] in NONDETERMINISTIC_MODULES:
+                    return f"imports {alias.name}"
+        elif isinstance(node, ast.ImportFrom):
+            if (node.module or "").split(".")[0] in NONDETERMINISTIC_MODULES:
+                return f"imports {node.module}"
+        elif isinstance(node, ast.Attribute) and node.attr in NONDETERMINISTIC_ATTRIBUTES:
+            return f"uses .{node.attr}"
+        elif isinstance(node, ast.Name) and node.id in ("input", "__import__"):
+            return f"uses {node.id}"
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str) and URL_PATTERN.match(node.value):
+            return "accesses the network"
+    return None
+
+
+def mutates_state(code: str) -> bool:
+    """Conservative check: True if re-running the snippet may not leave the kernel unchanged"""
+    tree = _parse(code)
+    if tree is None:
+        return True
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.AugAssign, ast.Delete, ast.Global, ast.Nonlocal)):
+            return True
+        if isinstance(node, ast.Call):
+            if isinstance(node.func, ast.Attribute) and node.func.attr in MUTATING_METHODS:
+                return True
+            for keyword in node.keywords:
+                if keyword.arg == "inplace" and not (isinstance(keyword.value, ast.Constant) and not keyword.value.value):
+                    return True
+    names = _NameUse().analyze(tree)
+    return names.rebinds_free or names.stores_into_objects
+
+
+def _writes_files(tree) -> bool:
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        name = node.func.attr if isinstance(node.func, ast.Attribute) else getattr(node.func, "id", None)
+        if name in WRITING_CALLS:
+            return True
+        if name == "open":
+            mode = node.args[1] if len(node.args) > 1 else next(
+                (k.value for k in node.keywords if k.arg == "mode"), None
+            )
+            if mode is not None and not (isinstance(mode, ast.Constant) and not set("wax+") & set(str(mode.value))):
+                return True
+    return False
+
+
+def self_contained(code: str) -> bool:
+    """
+    True if running the snippet leaves the kernel as it was and its result only depends on
+    its code and input files: it reads no kernel names, binds none and writes no files
+    """
+    tree = _parse(code)
+    if tree is None or mutates_state(code) or _writes_files(tree):
+        return False
+    names = _NameUse().analyze(tree)
+    return not names.free and not names.bound
+
+
+def input_files(code: str) -> list:
+    """Data file paths appearing as string literals in the code"""
+    tree = _parse(code)
+    if tree is None:
+        return []
+    paths = {
+        node.value for node in ast.walk(tree)
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and DATA_FILE_PATTERN.match(node.value)
+    }
+    return sorted(paths)
+
+
+def capture(execution) -> dict:
+    """JSON-friendly copy of an execution: text, stdout/stderr, error and rich results"""
+    logs = getattr(execution, "logs", None)
+    error = getattr(execution, "error", None)
+    return {
+        "text": getattr(execution, "text", None),
+        "stdout": "".join(getattr(logs, "stdout", None) or []),
+        "stderr": "".join(getattr(logs, "stderr", None) or []),
+        "error": str(error) if error else None,
+        "results": [
+            {fmt: getattr(result, fmt) for fmt in RICH_FORMATS if getattr(result, fmt, None)}
+            for result in getattr(execution, "results", None) or []
+        ],
+    }
+
+
+def _sha256(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+class ExecutionMemo:
+    """
+    LRU of captured execute_python results
+
+    Args:
+        max_entries: Results kept, least recently used evicted beyond (PYTHON_MEMO_MAX_ENTRIES)
+    """
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = int(max_entries if max_entries is not None else os.getenv("PYTHON_MEMO_MAX_ENTRIES", "256"))
+        self._lock = threading.Lock()
+        self._results = OrderedDict()
+        # session_id -> (code hash, files digest, result key, kernel state) of its last execution
+        self._last = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "bypassed": 0}
+
+    def run(self, code: str, execute, session_id: str = None, probe=None, state=None):
+        """
+        Return the memoized result of a snippet, or execute and record it
+
+        Args:
+            code: Python code
+            execute: Callable(code) -> (execution, note), the real execution
+            session_id: Session the code runs in, None for stateless execution
+            probe: Callable(code) -> execution running helper code in the same kernel,
+                used to hash input files (session mode)
+            state: Callable() -> token of the session's kernel state (session mode),
+                results are never replayed without it
+
+        Returns:
+            (captured result, note)
+        """
+        reason = bypass_reason(code)
+        files = input_files(code) if reason is None else []
+        if reason is None and files and (session_id is None or probe is None):
+            reason = "reads files outside a session"
+        # Same result in any kernel, and replaying it skips nothing: shared across tasks and sessions
+        by_content = reason is None and (session_id is None or self_contained(code))
+        if reason is None and not by_content and state is None:
+            reason = "session state unknown"
+        if reason is None and not by_content and mutates_state(code):
+            reason = "mutates session state"
+
+        if reason is not None:
+            logger.debug(f"execute_python result not memoized: {reason}")
+            self._count("bypassed")
+            if session_id is not None:
+                self._set_last(session_id, None)
+            execution, note = execute(code)
+            return capture(execution), note
+
+        code_hash = _sha256(code)
+        if by_content:
+            digest = self._files_digest(files, probe)
+            key = _sha256(code_hash, digest) if digest is not None else None
+            cached = self._get(key) if key is not None else None
+            if cached is not None:
+                self._count("hits")
+                return cached, None
+            self._count("misses")
+            execution, note = execute(code)
+            result = capture(execution)
+            if key is not None and not note:
+                self._put(key, result)
+            return result, note
+
+        last = self._get_last(session_id)
+        if last is not None and last[0] == code_hash and last[3] == state():
+            digest = self._files_digest(files, probe)
+            cached = self._get(last[2]) if digest is not None and digest == last[1] else None
+            if cached is not None:
+                self._count("hits")
+                # Hashing the inputs ran a helper in the kernel, keep the record current
+                self._set_last(session_id, (code_hash, digest, last[2], state()))
+                return cached, None
+        self._count("misses")
+
+        execution, note = execute(code)
+        result = capture(execution)
+        digest = self._files_digest(files, probe)
+        if note or digest is None:
+            # Kernel was replaced or inputs could not be read: nothing reliable to replay
+            self._set_last(session_id, None)
+            return result, note
+        key = _sha256(session_id, code_hash, digest)
+        self._put(key, result)
+        self._set_last(session_id, (code_hash, digest, key, state()))
+        return result, note
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._results),
+            }
+
+    # Internals
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _get(self, key: str):
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+            return result
+
+    def _put(self, key: str, result: dict):
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    def _get_last(self, session_id: str):
+        with self._lock:
+            return self._last.get(session_id)
+
+    def _set_last(self, session_id: str, record):
+        with self._lock:
+            if record is None:
+                self._last.pop(session_id, None)
+                return
+            self._last[session_id] = record
+            self._last.move_to_end(session_id)
+            while len(self._last) > self.max_entries:
+                self._last.popitem(last=False)
+
+    def _files_digest(self, files: list, probe):
+        """Digest of the input files' contents, "" without files, None if they cannot be hashed"""
+        if not files:
+            return ""
+        try:
+            execution = probe(FILE_HASH_PROBE.format(paths=files))
+            hashes = json.loads("".join(execution.logs.stdout).strip().splitlines()[-1])
+        except Exception as e:
+            logger.warning(f"Input file hashing failed: {str(e)}")
+            return None
+        return _sha256(json.dumps(hashes, sort_keys=True))
+
+
+_execution_memo = None
+_execution_memo_lock = threading.Lock()
+
+
+def get_execution_memo():
+    """Process-wide execute_python memo, None unless PYTHON_MEMO_ENABLED=true"""
+    global _execution_memo
+    if os.getenv("PYTHON_MEMO_ENABLED", "false").lower() not in ("1", "true", "yes"):
+        return None
+    with _execution_memo_lock:
+        if _execution_memo is None:
+            _execution_memo = ExecutionMemo()
+        return _execution_memo
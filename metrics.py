@@ -0,0 +1,304 @@
+"""
+Metrics
+Prometheus instrumentation shared by the API server and the MCP server
+
+Latencies and call counts are recorded where they happen; engine load, pool
+sizes and cache hit counts are sampled from their stats() when scraped.
+
+Exposed on /metrics by api_server.py, and on METRICS_PORT by the MCP server.
+Disabled with ENABLE_METRICS=false, and a no-op when prometheus_client is not
+installed.
+
+With several API workers, a scrape reaches any one of them: the workers then use
+prometheus_client's multiprocess mode (PROMETHEUS_MULTIPROC_DIR, set up by
+`prepare_multiprocess`). Counters and histograms are summed over the workers
+from their files, and each worker publishes its sampled gauges every
+METRICS_REFRESH_INTERVAL seconds (summed over live workers) instead of sampling
+them at scrape time.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import nullcontext
+
+logger = logging.getLogger("e2b-crewai-mcp")
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest,
+        multiprocess, start_http_server
+    )
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+except ImportError:
+    REGISTRY = None
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+ENABLED = REGISTRY is not None and os.getenv("ENABLE_METRICS", "true").lower() in ("1", "true", "yes")
+
+# Read by prometheus_client when it is imported: set before the workers start
+MULTIPROCESS = ENABLED and bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+
+class _NoopMetric:
+    """Stand-in accepting the metric API when metrics are disabled"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def time(self):
+        return nullcontext()
+
+
+def _histogram(name: str, documentation: str, labels: tuple = (), buckets: tuple = None):
+    if not ENABLED:
+        return _NoopMetric()
+    return Histogram(name, documentation, labels, buckets=buckets or Histogram.DEFAULT_BUCKETS)
+
+
+def _counter(name: str, documentation: str, labels: tuple = ()):
+    if not ENABLED:
+        return _NoopMetric()
+    return Counter(name, documentation, labels)
+
+
+SANDBOX_CREATE_SECONDS = _histogram(
+    "e2b_sandbox_create_seconds", "Time to create a ready sandbox", ("template",),
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+)
+RUN_CODE_SECONDS = _histogram(
+    "e2b_run_code_seconds", "Time spent in sandbox run_code", ("tool",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+CRAWL_SECONDS = _histogram(
+    "crawl_seconds", "Time to crawl a page or a batch", ("method",),
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 45, 60, 120, 300)
+)
+CREW_KICKOFF_SECONDS = _histogram(
+    "crew_kickoff_seconds", "Duration of crew.kickoff",
+    buckets=(1, 5, 10, 20, 30, 60, 120, 180, 300, 600)
+)
+TOOL_CALLS = _counter("tool_calls_total", "Agent tool invocations", ("tool",))
+TOOL_ERRORS = _counter("tool_errors_total", "Agent tool invocations that returned an error", ("tool",))
+SCHEDULER_WAIT_SECONDS = _histogram(
+    "scheduler_wait_seconds", "Time a crew run waited for a scheduler slot", ("priority",),
+    buckets=(0.01, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600)
+)
+TASKS_COALESCED = _counter("crew_tasks_coalesced_total", "Task submissions attached to an identical run in flight")
+TASKS_CANCELLED = _counter(
+    "crew_tasks_cancelled_total", "Crew runs stopped before completion", ("reason",)
+)
+
+# Pool stats source, registered by the module owning the pools
+_pool_stats = None
+
+
+# Sampled gauges: (name, documentation, label)
+_GAUGES = (
+    ("crew_tasks_in_flight", "Tasks running in the execution engine", None),
+    ("crew_tasks_queued", "Tasks admitted and waiting for a worker", None),
+    ("scheduler_queue_depth", "Crew runs waiting for a slot", "priority"),
+    ("e2b_sandboxes_active", "Sandboxes alive in each pool", "pool"),
+    ("e2b_sandboxes_leased", "Sandboxes currently leased in each pool", "pool"),
+)
+
+
+def _sample() -> dict:
+    """
+    Current values read from the components' stats()
+
+    Returns:
+        {"gauges": {name: {label value or None: value}}, "cache_hits": {cache: n}, "cache_misses": {cache: n}}
+    """
+    from crawl_cache import get_crawl_cache
+    from execution_engine import get_execution_engine
+    from llm_cache import get_completion_cache
+    from memoize import get_execution_memo
+    from scheduler import get_task_scheduler
+
+    engine = get_execution_engine().stats()
+    gauges = {
+        "crew_tasks_in_flight": {None: engine["running"]},
+        "crew_tasks_queued": {None: engine["queued"]},
+    }
+
+    scheduler = get_task_scheduler()
+    if scheduler is not None:
+        gauges["scheduler_queue_depth"] = scheduler.queue_depths()
+
+    if _pool_stats is not None:
+        pools = _pool_stats()
+        gauges["e2b_sandboxes_active"] = {stats["name"]: stats["idle"] + stats["leased"] for stats in pools}
+        gauges["e2b_sandboxes_leased"] = {stats["name"]: stats["leased"] for stats in pools}
+
+    hits, misses = {}, {}
+    for name, cache in (("crawl", get_crawl_cache()), ("llm", get_completion_cache()),
+                        ("python", get_execution_memo())):
+        if cache is None:
+            continue
+        stats = cache.stats()
+        hits[name] = stats.get("hits", stats.get("memory_hits", 0) + stats.get("disk_hits", 0)
+                               + stats.get("revalidated", 0))
+        misses[name] = stats["misses"]
+    return {"gauges": gauges, "cache_hits": hits, "cache_misses": misses}
+
+
+class _StatsCollector:
+    """Gauges and cache counters read from the components' stats() at scrape time (single process)"""
+
+    def describe(self):
+        # Registering must not instantiate the components
+        return []
+
+    def collect(self):
+        sample = _sample()
+        for name, documentation, label in _GAUGES:
+            values = sample["gauges"].get(name)
+            if values is None:
+                continue
+            family = GaugeMetricFamily(name, documentation, labels=[label] if label else None)
+            for label_value, value in values.items():
+                family.add_metric([label_value] if label else [], value)
+            yield family
+
+        hits = CounterMetricFamily("cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache misses", labels=["cache"])
+        for name, value in sample["cache_hits"].items():
+            hits.add_metric([name], value)
+        for name, value in sample["cache_misses"].items():
+            misses.add_metric([name], value)
+        yield hits
+        yield misses
+
+
+class _StatsPublisher:
+    """
+    Multiprocess counterpart of _StatsCollector: samples this worker's stats on a timer
+
+    Gauges are summed over live workers, cache counters are incremented by what
+    the caches counted since the last sample.
+    """
+
+    def __init__(self, interval: float = None):
+        self.interval = float(interval if interval is not None else os.getenv("METRICS_REFRESH_INTERVAL", "5"))
+        self._gauges = {
+            name: Gauge(name, documentation, [label] if label else [], multiprocess_mode="livesum")
+            for name, documentation, label in _GAUGES
+        }
+        self._counters = {
+            "cache_hits": Counter("cache_hits", "Cache hits", ["cache"]),
+            "cache_misses": Counter("cache_misses", "Cache misses", ["cache"]),
+        }
+        self._last = {"cache_hits": {}, "cache_misses": {}}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="metrics-publisher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def publish(self):
+        sample = _sample()
+        for name, values in sample["gauges"].items():
+            gauge = self._gauges[name]
+            for label_value, value in values.items():
+                (gauge.labels(label_value) if label_value is not None else gauge).set(value)
+        for name, counter in self._counters.items():
+            last = self._last[name]
+            for cache, value in sample[name].items():
+                if value > last.get(cache, 0):
+                    counter.labels(cache).inc(value - last.get(cache, 0))
+                last[cache] = value
+
+    def _loop(self):
+        while True:
+            try:
+                self.publish()
+            except Exception as e:
+                logger.warning(f"Metrics publication failed: {str(e)}")
+            if self._stop.wait(self.interval):
+                return
+
+
+_publisher = None
+
+if ENABLED and not MULTIPROCESS:
+    REGISTRY.register(_StatsCollector())
+
+
+def prepare_multiprocess(path: str = None) -> str:
+    """
+    Set up the directory where the workers write their metrics, before starting them
+
+    Stale files of a previous run are removed. Uses PROMETHEUS_MULTIPROC_DIR if set.
+
+    Returns:
+        The directory, None when metrics are disabled
+    """
+    if not ENABLED:
+        return None
+    path = path or os.getenv("PROMETHEUS_MULTIPROC_DIR") or os.path.join(tempfile.gettempdir(), "prometheus-multiproc")
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    return path
+
+
+def start_worker():
+    """Start publishing this worker's sampled gauges (multiprocess mode only)"""
+    global _publisher
+    if MULTIPROCESS and _publisher is None:
+        _publisher = _StatsPublisher()
+        _publisher.start()
+
+
+def stop_worker():
+    """Drop this worker's live gauges from the aggregate on exit (multiprocess mode only)"""
+    if not MULTIPROCESS:
+        return
+    if _publisher is not None:
+        _publisher.stop()
+    multiprocess.mark_process_dead(os.getpid())
+
+
+def watch_pools(stats):
+    """
+    Register the source of the sandbox pool gauges
+
+    Args:
+        stats: Callable() -> list of SandboxPool.stats() dicts
+    """
+    global _pool_stats
+    _pool_stats = stats
+
+
+def render():
+    """Metrics in the Prometheus text format, None when disabled"""
+    if not ENABLED:
+        return None
+    if MULTIPROCESS:
+        # Every worker's metrics, whichever worker answers the scrape
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def start_server(port: int = None):
+    """Serve /metrics on its own port (MCP process), METRICS_PORT when not given"""
+    port = port or int(os.getenv("METRICS_PORT", "0"))
+    if not ENABLED or not port:
+        return
+    start_http_server(port)
+    logger.info(f"Metrics available on port {port}")
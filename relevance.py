@@ -0,0 +1,190 @@
+"""
+Relevance
+Task-aware extraction of crawled pages: BM25 ranking of page chunks
+
+The page is cut into chunks along its headings and paragraphs, each chunk is
+scored against the query (the task, or what the agent asked for) with BM25,
+and the best chunks are kept, in page order, within a token budget.
+
+Standard library only: it is uploaded to crawler sandboxes next to the crawler
+daemon (filtering happens where the page is crawled) and imported by the MCP
+server for pages served from the crawl cache.
+"""
+import math
+import re
+from collections import Counter
+
+# Rough size of a token for budget estimates (English/French prose)
+CHARS_PER_TOKEN = 4
+
+HEADING_PATTERN = re.compile(r"^#{1,6}\s+\S")
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have how i in is it its me my of on or our so than that the their them
+then there these they this to was we what when where which who why will with you your
+au aux avec ce ces dans de des du elle en et il ils je la le les leur mais me mon ne nous on ou par pas pour qu que
+qui sa se ses son sur ta te tes ton tu un une vos votre vous est sont
+""".split())
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def tokenize(text: str) -> list:
+    return [
+        word for word in WORD_PATTERN.findall(text.lower())
+        if len(word) > 1 and word not in STOPWORDS
+    ]
+
+
+class Chunk:
+    """A run of consecutive page blocks under one heading"""
+
+    def __init__(self, index: int, heading: str):
+        self.index = index
+        self.heading = heading
+        self.blocks = []
+
+    @property
+    def text(self) -> str:
+        return "\n\n".join(self.blocks)
+
+    def render(self) -> str:
+        """Chunk text, preceded by its section heading if the chunk does not start with it"""
+        if self.heading and (not self.blocks or self.blocks[0] != self.heading):
+            return f"{self.heading}\n\n{self.text}"
+        return self.text
+
+
+def chunk_markdown(text: str, max_chars: int = 1000) -> list:
+    """
+    Split a page into chunks of at most ~max_chars, starting a new chunk at every heading
+
+    Returns:
+        Chunks in page order
+    """
+    chunks = []
+    heading = None
+    current = None
+    size = 0
+    for block in re.split(r"\n\s*\n", text):
+        block = block.strip()
+        if not block:
+            continue
+        is_heading = bool(HEADING_PATTERN.match(block.splitlines()[0]))
+        if is_heading:
+            heading = block.splitlines()[0]
+        if current is None or is_heading or size + len(block) > max_chars:
+            current = Chunk(len(chunks), heading)
+            chunks.append(current)
+            size = 0
+        # Oversized blocks (long tables, code) are split on lines
+        while len(block) > max_chars:
+            cut = block.rfind("\n", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            current.blocks.append(block[:cut])
+            current = Chunk(len(chunks), heading)
+            chunks.append(current)
+            block = block[cut:].lstrip("\n")
+        current.blocks.append(block)
+        size += len(block)
+    return [chunk for chunk in chunks if chunk.blocks]
+
+
+class BM25:
+    """
+    Okapi BM25 over tokenized documents
+
+    Args:
+        documents: One token list per document
+        k1: Term frequency saturation
+        b: Length normalization
+    """
+
+    def __init__(self, documents: list, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.frequencies = [Counter(document) for document in documents]
+        self.lengths = [len(document) for document in documents]
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if documents else 0.0
+        document_frequency = Counter(term for frequencies in self.frequencies for term in frequencies)
+        count = len(documents)
+        self.idf = {
+            term: math.log((count - df + 0.5) / (df + 0.5) + 1)
+            for term, df in document_frequency.items()
+        }
+
+    def scores(self, query: list) -> list:
+        terms = set(query)
+        results = []
+        for frequencies, length in zip(self.frequencies, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (self.average_length or 1))
+            score = 0.0
+            for term in terms:
+                tf = frequencies.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            results.append(score)
+        return results
+
+
+def select(text: str, query: str, token_budget: int = 1500, chunk_chars: int = 1000):
+    """
+    Most relevant excerpts of a page for a query
+
+    Args:
+        text: Page markdown
+        query: Task or question the page is read for
+        token_budget: Approximate tokens of page content to keep
+        chunk_chars: Target chunk size
+
+    Returns:
+        Selected chunks in page order with a header line, or None when the page
+        already fits the budget or nothing in it matches the query
+    """
+    if not text or not query or estimate_tokens(text) <= token_budget:
+        return None
+    query_tokens = tokenize(query)
+    chunks = chunk_markdown(text, chunk_chars)
+    if not query_tokens or len(chunks) < 2:
+        return None
+
+    # Headings count twice: they summarize what the section is about
+    documents = [tokenize(chunk.text) + tokenize(chunk.heading or "") for chunk in chunks]
+    scores = BM25(documents).scores(query_tokens)
+    ranked = sorted((i for i in range(len(chunks)) if scores[i] > 0), key=lambda i: -scores[i])
+    if not ranked:
+        return None
+
+    selected = []
+    used = 0
+    for i in ranked:
+        cost = estimate_tokens(chunks[i].render())
+        if used + cost > token_budget:
+            if selected:
+                continue
+            # The best chunk alone is over budget: keep its beginning
+            selected.append(i)
+            used = token_budget
+            break
+        selected.append(i)
+        used += cost
+
+    parts = []
+    previous = None
+    for i in sorted(selected):
+        rendered = chunks[i].render()
+        if estimate_tokens(rendered) > token_budget:
+            rendered = rendered[:token_budget * CHARS_PER_TOKEN] + "\n[...]"
+        if previous is not None and i != previous + 1:
+            parts.append("[...]")
+        parts.append(rendered)
+        previous = i
+
+    header = (
+        f"[Most relevant excerpts: {len(selected)} of {len(chunks)} sections, "
+        f"~{min(used, token_budget)} of ~{estimate_tokens(text)} tokens]"
+    )
+    return header + "\n\n" + "\n\n".join(parts)
@@ -0,0 +1,428 @@
+"""
+Sandbox Pool
+Keeps warm E2B sandboxes ready so tools lease one instead of paying the cold start
+
+The pool only depends on a `factory` callable returning a sandbox-like object
+(`kill()`, optionally `is_running()` / `set_timeout()`), so it can be driven by a
+local fake Sandbox as well as by `e2b_code_interpreter.Sandbox.create`.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import tracing
+
+logger = logging.getLogger("e2b-crewai-mcp")
+
+
+class SandboxPoolError(Exception):
+    """Raised when no sandbox can be leased from the pool"""
+
+
+class PooledSandbox:
+    """Bookkeeping wrapper around a pooled sandbox"""
+
+    def __init__(self, sandbox):
+        self.sandbox = sandbox
+        self.sandbox_id = getattr(sandbox, "sandbox_id", None) or hex(id(sandbox))
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+
+
+def _default_health_check(sandbox) -> bool:
+    """Consider a sandbox healthy if the SDK reports it running"""
+    is_running = getattr(sandbox, "is_running", None)
+    if is_running is None:
+        return True
+    return bool(is_running())
+
+
+def _kill_quietly(entry: PooledSandbox):
+    try:
+        entry.sandbox.kill()
+    except Exception as e:
+        logger.warning(f"Failed to kill sandbox {entry.sandbox_id}: {str(e)}")
+
+
+class SandboxPool:
+    """
+    Thread-safe pool of warm sandboxes
+
+    Args:
+        factory: Callable creating a new sandbox
+        name: Pool name used in logs and stats
+        min_size: Sandboxes kept warm in the background
+        max_size: Upper bound on sandboxes owned by the pool (idle + leased)
+        idle_timeout: Seconds an idle sandbox above `min_size` is kept before being killed
+        acquire_timeout: Seconds `acquire` waits for a free sandbox
+        max_uses: Leases served by one sandbox before it is recycled
+        lifetime: Sandbox timeout (seconds) refreshed on release, 0 to disable
+        maintenance_interval: Seconds between pre-warm / reap passes
+        health_check: Callable(sandbox) -> bool run on checkout
+        reset: Optional callable(sandbox) run in the background after each lease
+        on_discard: Optional callable(sandbox_id) run once the pool killed a sandbox
+    """
+
+    def __init__(
+        self,
+        factory,
+        name: str = "default",
+        min_size: int = None,
+        max_size: int = None,
+        idle_timeout: float = None,
+        acquire_timeout: float = None,
+        max_uses: int = None,
+        lifetime: int = None,
+        maintenance_interval: float = 5.0,
+        health_check=_default_health_check,
+        reset=None,
+        on_discard=None,
+    ):
+        self.factory = factory
+        self.name = name
+        self.min_size = int(min_size if min_size is not None else os.getenv("SANDBOX_POOL_MIN_SIZE", "1"))
+        self.max_size = int(max_size if max_size is not None else os.getenv(
+            "SANDBOX_POOL_MAX_SIZE", os.getenv("MAX_CONCURRENT_SANDBOXES", "4")))
+        self.idle_timeout = float(idle_timeout if idle_timeout is not None else os.getenv("SANDBOX_POOL_IDLE_TIMEOUT", "300"))
+        self.acquire_timeout = float(acquire_timeout if acquire_timeout is not None else os.getenv(
+            "SANDBOX_POOL_ACQUIRE_TIMEOUT", os.getenv("SANDBOX_CREATION_TIMEOUT", "120")))
+        self.max_uses = int(max_uses if max_uses is not None else os.getenv("SANDBOX_POOL_MAX_USES", "50"))
+        self.lifetime = int(lifetime if lifetime is not None else os.getenv("SANDBOX_TIMEOUT", "600"))
+        self.maintenance_interval = maintenance_interval
+        self.health_check = health_check
+        self.reset = reset
+        self.on_discard = on_discard
+
+        self.min_size = min(self.min_size, self.max_size)
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._leased = {}
+        self._creating = 0
+        self._recycling = 0
+        self._closed = False
+        self._stop = threading.Event()
+        self._maintainer = None
+        self._recycler = ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"pool-{name}-recycle")
+
+        self._stats = {"created": 0, "killed": 0, "leases": 0, "unhealthy": 0, "wait_time": 0.0}
+
+    # Lifecycle
+
+    def start(self):
+        """Start background pre-warming and idle reaping"""
+        with self._cond:
+            if self._maintainer is not None or self._closed:
+                return self
+            self._maintainer = threading.Thread(
+                target=self._maintain_loop, name=f"pool-{self.name}-maintainer", daemon=True
+            )
+            self._maintainer.start()
+        logger.info(f"Sandbox pool '{self.name}' started (min={self.min_size}, max={self.max_size})")
+        return self
+
+    def close(self):
+        """Stop background work and kill every sandbox owned by the pool"""
+        with self._cond:
+            self._closed = True
+            entries = list(self._idle) + list(self._leased.values())
+            self._idle.clear()
+            self._leased.clear()
+            self._cond.notify_all()
+        self._stop.set()
+        self._recycler.shutdown(wait=False)
+        for entry in entries:
+            self._kill(entry)
+        logger.info(f"Sandbox pool '{self.name}' closed ({len(entries)} sandboxes killed)")
+
+    # Leasing
+
+    def acquire(self, timeout: float = None) -> PooledSandbox:
+        """
+        Check a sandbox out of the pool, creating one if below `max_size`
+
+        Args:
+            timeout: Seconds to wait for a free sandbox (defaults to `acquire_timeout`)
+
+        Returns:
+            PooledSandbox entry, to be given back with `release`
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            entry = None
+            create = False
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise SandboxPoolError(f"Sandbox pool '{self.name}' is closed")
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._owned() < self.max_size:
+                        self._creating += 1
+                        create = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise SandboxPoolError(
+                            f"No sandbox available in pool '{self.name}' after {timeout:g}s"
+                        )
+                    self._cond.wait(remaining)
+
+            if create:
+                entry = self._create_entry()
+                if entry is None:
+                    raise SandboxPoolError(f"Sandbox creation failed in pool '{self.name}'")
+            elif not self._is_healthy(entry):
+                with self._cond:
+                    self._stats["unhealthy"] += 1
+                logger.warning(f"Pooled sandbox {entry.sandbox_id} failed health check, discarding")
+                self._discard(entry)
+                continue
+
+            with self._cond:
+                if self._closed:
+                    self._discard(entry)
+                    raise SandboxPoolError(f"Sandbox pool '{self.name}' is closed")
+                entry.uses += 1
+                self._leased[entry.sandbox_id] = entry
+                self._stats["leases"] += 1
+                self._stats["wait_time"] += time.monotonic() - started
+            return entry
+
+    def release(self, entry: PooledSandbox, discard: bool = False):
+        """
+        Give a sandbox back to the pool
+
+        Args:
+            entry: Entry returned by `acquire`
+            discard: Kill the sandbox instead of reusing it (e.g. after an SDK error)
+        """
+        with self._cond:
+            if self._leased.pop(entry.sandbox_id, None) is None:
+                return
+            recycle = not (discard or self._closed or entry.uses >= self.max_uses)
+            if recycle:
+                self._recycling += 1
+
+        if not recycle:
+            self._discard(entry)
+            return
+
+        try:
+            self._recycler.submit(self._recycle, entry)
+        except RuntimeError:
+            with self._cond:
+                self._recycling -= 1
+            self._discard(entry)
+
+    @contextmanager
+    def lease(self, timeout: float = None):
+        """
+        Context manager leasing a sandbox for the duration of the block
+
+        The sandbox is discarded if the block raises, since the failure may come
+        from the sandbox itself.
+        """
+        with tracing.span("sandbox_pool.acquire", pool=self.name) as acquire_span:
+            entry = self.acquire(timeout)
+            acquire_span.set(sandbox_id=entry.sandbox_id)
+        try:
+            yield entry.sandbox
+        except BaseException:
+            self.release(entry, discard=True)
+            raise
+        else:
+            self.release(entry)
+
+    def exhausted(self) -> bool:
+        """True if `acquire` would have to wait: nothing idle or being recycled, and `max_size` reached"""
+        with self._cond:
+            return not self._idle and not self._recycling and self._owned() >= self.max_size
+
+    def adopt(self, sandbox) -> PooledSandbox:
+        """
+        Lease a sandbox the pool did not create (taken over from another worker)
+
+        Counted against `max_size` from now on and recycled like any other on release.
+        """
+        entry = PooledSandbox(sandbox)
+        with self._cond:
+            if self._closed:
+                raise SandboxPoolError(f"Sandbox pool '{self.name}' is closed")
+            entry.uses += 1
+            self._leased[entry.sandbox_id] = entry
+            self._stats["leases"] += 1
+        logger.info(f"Pool '{self.name}' adopted sandbox {entry.sandbox_id}")
+        return entry
+
+    def detach(self, entry: PooledSandbox):
+        """Forget a leased sandbox without resetting or killing it (now owned by another worker)"""
+        with self._cond:
+            if self._leased.pop(entry.sandbox_id, None) is None:
+                return
+            self._cond.notify_all()
+        logger.info(f"Pool '{self.name}' detached sandbox {entry.sandbox_id}")
+
+    def remove(self, sandbox_id: str) -> bool:
+        """Kill a pooled sandbox by id, returns False if the pool does not own it"""
+        with self._cond:
+            entry = next((e for e in self._idle if e.sandbox_id == sandbox_id), None)
+            if entry is not None:
+                self._idle.remove(entry)
+            else:
+                entry = self._leased.get(sandbox_id)
+                if entry is not None:
+                    # Killed once the current lease returns it
+                    entry.uses = self.max_uses
+                    return True
+        if entry is None:
+            return False
+        self._discard(entry)
+        return True
+
+    def stats(self) -> dict:
+        """Snapshot of pool state"""
+        with self._cond:
+            leases = self._stats["leases"]
+            return {
+                "name": self.name,
+                "idle": len(self._idle),
+                "leased": len(self._leased),
+                "creating": self._creating,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "sandbox_ids": [e.sandbox_id for e in self._idle] + list(self._leased.keys()),
+                "created": self._stats["created"],
+                "killed": self._stats["killed"],
+                "leases": leases,
+                "unhealthy": self._stats["unhealthy"],
+                "avg_wait_seconds": round(self._stats["wait_time"] / leases, 4) if leases else 0.0,
+            }
+
+    # Internals
+
+    def _owned(self) -> int:
+        return len(self._idle) + len(self._leased) + self._creating + self._recycling
+
+    def _create_entry(self):
+        """Create a sandbox, the caller must have reserved a `_creating` slot"""
+        try:
+            sandbox = self.factory()
+            entry = PooledSandbox(sandbox)
+            logger.info(f"Pool '{self.name}' created sandbox {entry.sandbox_id}")
+            with self._cond:
+                self._stats["created"] += 1
+            return entry
+        except Exception as e:
+            logger.error(f"Pool '{self.name}' failed to create sandbox: {str(e)}")
+            return None
+        finally:
+            with self._cond:
+                self._creating -= 1
+                self._cond.notify_all()
+
+    def _is_healthy(self, entry: PooledSandbox) -> bool:
+        if self.health_check is None:
+            return True
+        try:
+            return self.health_check(entry.sandbox)
+        except Exception as e:
+            logger.warning(f"Health check error on sandbox {entry.sandbox_id}: {str(e)}")
+            return False
+
+    def _kill(self, entry: PooledSandbox):
+        _kill_quietly(entry)
+        if self.on_discard is None:
+            return
+        try:
+            self.on_discard(entry.sandbox_id)
+        except Exception as e:
+            logger.warning(f"Discard hook failed for sandbox {entry.sandbox_id}: {str(e)}")
+
+    def _discard(self, entry: PooledSandbox):
+        self._kill(entry)
+        with self._cond:
+            self._stats["killed"] += 1
+            self._cond.notify_all()
+
+    def _recycle(self, entry: PooledSandbox):
+        """Reset and refresh a released sandbox off the caller's critical path"""
+        healthy = True
+        try:
+            if self.reset is not None:
+                self.reset(entry.sandbox)
+            set_timeout = getattr(entry.sandbox, "set_timeout", None)
+            if self.lifetime and set_timeout is not None:
+                set_timeout(self.lifetime)
+        except Exception as e:
+            logger.warning(f"Failed to recycle sandbox {entry.sandbox_id}: {str(e)}")
+            healthy = False
+
+        with self._cond:
+            self._recycling -= 1
+            if healthy and not self._closed:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+                self._cond.notify_all()
+                return
+        self._discard(entry)
+
+    def _maintain_loop(self):
+        while not self._stop.is_set():
+            try:
+                self._reap_idle()
+                self._prewarm()
+            except Exception as e:
+                logger.error(f"Sandbox pool '{self.name}' maintenance failed: {str(e)}")
+            self._stop.wait(self.maintenance_interval)
+
+    def _reap_idle(self):
+        """Kill sandboxes idle longer than `idle_timeout`, keeping `min_size` warm"""
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            keep = deque()
+            # Oldest entries sit at the left of the deque
+            while self._idle:
+                entry = self._idle.popleft()
+                surplus = len(self._idle) + len(keep) + 1 > self.min_size
+                if surplus and now - entry.last_used > self.idle_timeout:
+                    expired.append(entry)
+                else:
+                    keep.append(entry)
+            self._idle = keep
+        for entry in expired:
+            logger.info(f"Pool '{self.name}' reaping idle sandbox {entry.sandbox_id}")
+            self._discard(entry)
+
+    def _prewarm(self):
+        """Create sandboxes until `min_size` idle ones are available"""
+        while not self._stop.is_set():
+            with self._cond:
+                if self._closed:
+                    return
+                if len(self._idle) + self._creating >= self.min_size or self._owned() >= self.max_size:
+                    return
+                self._creating += 1
+            entry = self._create_entry()
+            if entry is None:
+                return
+            with self._cond:
+                if self._closed:
+                    closed = True
+                else:
+                    closed = False
+                    self._idle.append(entry)
+                    self._cond.notify_all()
+            if closed:
+                self._discard(entry)
+                return
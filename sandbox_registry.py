@@ -0,0 +1,335 @@
+"""
+Sandbox Registry
+Named, reusable sandboxes for mcp_server_complex.py
+
+- Per-sandbox locks: a task running in one sandbox never blocks another sandbox
+- Single-flight creation: concurrent requests for the same (missing) sandbox
+  share one creation instead of building several
+- LRU / idle-TTL eviction that actually kills the evicted sandboxes, sparing
+  sandboxes in use or being handed out (the registry may then stay over
+  capacity until the next monitor pass)
+- Blocking SDK calls run in threads so the event loop stays free
+- A background monitor probes sandboxes and refreshes their keep-alive on a
+  schedule, so checkout is a local state lookup instead of a round trip
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger("e2b-crewai-mcp")
+
+# Times `lease` looks a sandbox up again after losing it (removed or found dead) before giving up
+LEASE_ATTEMPTS = 3
+
+
+class SandboxRegistryError(Exception):
+    """Raised when no sandbox can be leased from the registry"""
+
+
+class RegistryEntry:
+    def __init__(self, sandbox):
+        self.sandbox = sandbox
+        self.sandbox_id = sandbox.sandbox_id
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+        self.lock = asyncio.Lock()
+        # Callers handed the sandbox that do not hold `lock` yet: never evicted meanwhile
+        self.pins = 0
+        self.healthy = True
+        self.checked_at = None
+        # Monotonic time at which E2B shuts the sandbox down unless refreshed
+        self.expires_at = None
+
+
+def _kill(sandbox):
+    try:
+        sandbox.kill()
+    except Exception as e:
+        logger.warning(f"Failed to kill sandbox {getattr(sandbox, 'sandbox_id', '?')}: {str(e)}")
+
+
+def _is_alive(sandbox) -> bool:
+    """Liveness probe run by the monitor"""
+    try:
+        sandbox.commands.run("echo test", timeout=5)
+        return True
+    except Exception:
+        return False
+
+
+def _keep_alive(sandbox, seconds: float):
+    """Push back the sandbox shutdown (set_timeout on current SDKs, keep_alive on older ones)"""
+    set_timeout = getattr(sandbox, "set_timeout", None)
+    if set_timeout is not None:
+        set_timeout(int(seconds))
+    else:
+        sandbox.keep_alive(int(seconds))
+
+
+class SandboxRegistry:
+    """
+    Async registry of long-lived sandboxes
+
+    Args:
+        create: Blocking callable() -> ready sandbox (run in a thread)
+        max_size: Sandboxes kept, least recently used idle ones are killed beyond (SANDBOX_REGISTRY_MAX)
+        ttl: Seconds a sandbox may stay idle before being killed (SANDBOX_REGISTRY_TTL)
+        probe: Blocking callable(sandbox) -> bool run by the monitor
+        keep_alive: Seconds of sandbox lifetime granted at creation and on each refresh (SANDBOX_KEEP_ALIVE)
+        health_interval: Seconds between monitor passes (HEALTH_CHECK_INTERVAL), capped
+            so a sandbox is always refreshed at least twice before it expires
+    """
+
+    def __init__(self, create, max_size: int = None, ttl: float = None, probe=_is_alive,
+                 keep_alive: float = None, health_interval: float = None):
+        self.create = create
+        self.max_size = int(max_size if max_size is not None else os.getenv(
+            "SANDBOX_REGISTRY_MAX", os.getenv("MAX_CONCURRENT_SANDBOXES", "4")))
+        self.ttl = float(ttl if ttl is not None else os.getenv("SANDBOX_REGISTRY_TTL", "1800"))
+        self.probe = probe
+        self.keep_alive = float(keep_alive if keep_alive is not None else os.getenv("SANDBOX_KEEP_ALIVE", "1800"))
+        health_interval = float(health_interval if health_interval is not None
+                                else os.getenv("HEALTH_CHECK_INTERVAL", "300"))
+        self.health_interval = min(health_interval, self.keep_alive / 3)
+        self._monitor = None
+
+        # Guards the dicts only, never held across I/O
+        self._lock = asyncio.Lock()
+        self._entries = OrderedDict()
+        self._creating = {}
+
+    async def get_or_create(self, sandbox_id: str = None):
+        """
+        Reuse a registered sandbox or create a new one
+
+        Args:
+            sandbox_id: Sandbox to reuse; unknown or dead ids get a replacement
+
+        Returns:
+            Sandbox instance
+        """
+        sandbox, entry = await self._checkout(sandbox_id)
+        if entry is not None:
+            entry.pins -= 1
+        return sandbox
+
+    @asynccontextmanager
+    async def lease(self, sandbox_id: str = None):
+        """
+        Get or create a sandbox and hold it exclusively for the block
+
+        Tasks sharing a sandbox id run one after another, tasks on different
+        sandboxes never wait for each other. Held sandboxes are never evicted.
+
+        Raises:
+            SandboxRegistryError: If the sandbox keeps being removed or found dead before it is held
+        """
+        for _ in range(LEASE_ATTEMPTS):
+            sandbox, entry = await self._checkout(sandbox_id)
+            pinned = entry is not None
+            try:
+                if entry is not None:
+                    async with entry.lock:
+                        entry.pins -= 1
+                        pinned = False
+                        # Removed or found dead while we waited for the lock, start over
+                        if await self._registered(entry.sandbox_id) is entry and entry.healthy:
+                            yield entry.sandbox
+                            await self._touch(entry)
+                            return
+            finally:
+                if pinned:
+                    entry.pins -= 1
+            if entry is not None and not entry.healthy:
+                await self.remove(entry.sandbox_id)
+            sandbox_id = sandbox.sandbox_id
+        raise SandboxRegistryError(f"Sandbox {sandbox_id} was lost {LEASE_ATTEMPTS} times before it could be leased")
+
+    async def remove(self, sandbox_id: str) -> bool:
+        """Unregister and kill a sandbox, waiting for its current user to finish"""
+        async with self._lock:
+            entry = self._entries.pop(sandbox_id, None)
+        if entry is None:
+            return False
+        async with entry.lock:
+            await asyncio.to_thread(_kill, entry.sandbox)
+        logger.info(f"Sandbox {sandbox_id} killed and removed from registry")
+        return True
+
+    async def check(self):
+        """
+        One monitor pass: probe every sandbox, refresh keep-alives due before
+        the next pass, then kill unhealthy and expired idle sandboxes
+        """
+        async with self._lock:
+            entries = list(self._entries.values())
+        await asyncio.gather(*(self._check_entry(entry) for entry in entries))
+        return await self.evict()
+
+    def start(self):
+        """Start the background monitor (needs a running event loop)"""
+        if self._monitor is None or self._monitor.done():
+            self._monitor = asyncio.get_running_loop().create_task(self._monitor_loop())
+
+    async def evict(self) -> list:
+        """
+        Kill unhealthy and TTL-expired idle sandboxes, then least recently used ones beyond max_size
+
+        Sandboxes held or being handed out are left alone, even over capacity.
+        """
+        now = time.monotonic()
+        async with self._lock:
+            idle = [e for e in self._entries.values() if not e.lock.locked() and not e.pins]
+            expired = [e for e in idle if not e.healthy or now - e.last_used > self.ttl]
+            excess = len(self._entries) - len(expired) - self.max_size
+            # _entries is kept in LRU order (oldest first)
+            lru = [e for e in idle if e not in expired][:max(0, excess)]
+            victims = expired + lru
+            for entry in victims:
+                del self._entries[entry.sandbox_id]
+
+        for entry in victims:
+            logger.info(f"Evicting sandbox {entry.sandbox_id}")
+            await asyncio.to_thread(_kill, entry.sandbox)
+        return [entry.sandbox_id for entry in victims]
+
+    async def list(self) -> list:
+        now = time.monotonic()
+        async with self._lock:
+            entries = list(self._entries.values())
+        return [
+            {
+                "sandbox_id": e.sandbox_id,
+                "busy": e.lock.locked(),
+                "healthy": e.healthy,
+                "idle_seconds": round(now - e.last_used, 1),
+                "expires_in": round(e.expires_at - now, 1) if e.expires_at else None,
+                "created_at": e.created_at,
+            }
+            for e in entries
+        ]
+
+    async def close(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+        async with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            await asyncio.to_thread(_kill, entry.sandbox)
+
+    async def _registered(self, sandbox_id: str):
+        async with self._lock:
+            return self._entries.get(sandbox_id)
+
+    async def _checkout(self, sandbox_id: str = None):
+        """
+        Reuse or create a sandbox, pinning its entry against eviction
+
+        Returns:
+            (sandbox, entry) where the caller must decrement `entry.pins`; entry is None
+            if the sandbox was unregistered before it could be pinned
+        """
+        self.start()
+        if sandbox_id:
+            entry = await self._pin(sandbox_id)
+            if entry is not None:
+                # Health is kept current by the monitor, no round trip here
+                if entry.healthy:
+                    await self._touch(entry)
+                    logger.info(f"Reusing existing sandbox: {sandbox_id}")
+                    return entry.sandbox, entry
+                entry.pins -= 1
+                logger.warning(f"Sandbox {sandbox_id} marked unhealthy, creating new one")
+                await self.remove(sandbox_id)
+
+        # Requests for the same missing id share one creation, anonymous requests get their own
+        key = sandbox_id or f"new-{uuid.uuid4().hex}"
+        async with self._lock:
+            future = self._creating.get(key)
+            creator = future is None
+            if creator:
+                future = asyncio.get_running_loop().create_future()
+                self._creating[key] = future
+
+        if not creator:
+            sandbox = await asyncio.shield(future)
+            return sandbox, await self._pin(sandbox.sandbox_id)
+
+        try:
+            sandbox = await asyncio.to_thread(self._create)
+            entry = RegistryEntry(sandbox)
+            entry.expires_at = time.monotonic() + self.keep_alive
+            entry.pins = 1
+            async with self._lock:
+                self._entries[entry.sandbox_id] = entry
+            future.set_result(sandbox)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            async with self._lock:
+                self._creating.pop(key, None)
+
+        # Makes room by killing other idle sandboxes, the new one is pinned
+        await self.evict()
+        return sandbox, entry
+
+    async def _pin(self, sandbox_id: str):
+        """Registered entry with one more pin, None if unregistered"""
+        async with self._lock:
+            entry = self._entries.get(sandbox_id)
+            if entry is not None:
+                entry.pins += 1
+            return entry
+
+    async def _touch(self, entry: RegistryEntry):
+        async with self._lock:
+            entry.last_used = time.monotonic()
+            if entry.sandbox_id in self._entries:
+                self._entries.move_to_end(entry.sandbox_id)
+
+    def _create(self):
+        """Create a sandbox and grant it its first keep-alive window (blocking)"""
+        sandbox = self.create()
+        try:
+            _keep_alive(sandbox, self.keep_alive)
+        except Exception as e:
+            logger.warning(f"Failed to set keep-alive on sandbox {sandbox.sandbox_id}: {str(e)}")
+        return sandbox
+
+    async def _check_entry(self, entry: RegistryEntry):
+        """Probe one sandbox and refresh its keep-alive if it would expire before the next pass"""
+        alive = await asyncio.to_thread(self.probe, entry.sandbox) if self.probe else True
+        entry.checked_at = time.monotonic()
+        if not alive:
+            if entry.healthy:
+                logger.warning(f"Sandbox {entry.sandbox_id} failed its health check")
+            entry.healthy = False
+            return
+
+        if entry.expires_at is None or entry.expires_at - time.monotonic() <= 2 * self.health_interval:
+            try:
+                await asyncio.to_thread(_keep_alive, entry.sandbox, self.keep_alive)
+                entry.expires_at = time.monotonic() + self.keep_alive
+            except Exception as e:
+                logger.warning(f"Keep-alive refresh failed for sandbox {entry.sandbox_id}: {str(e)}")
+                entry.healthy = False
+
+    async def _monitor_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Sandbox monitor pass failed: {str(e)}")
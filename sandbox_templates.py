@@ -0,0 +1,270 @@
+"""
+Sandbox Templates
+Builds dependency-ready E2B templates once and provisions sandboxes that lack them
+
+A `TemplateSpec` describes what a sandbox needs (pip packages + setup commands).
+Its content hash keys both the prebuilt template (recorded in a local registry
+file) and a marker file written inside provisioned sandboxes, so a sandbox is
+only ever set up once for a given dependency set. Code files that change more
+often than dependencies (agent code) stay out of the hash and are uploaded to
+each new sandbox instead, so editing them never triggers a rebuild.
+
+Build a template with:
+    python sandbox_templates.py build crawler
+    python sandbox_templates.py build crewai
+"""
+import hashlib
+import json
+import logging
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+
+import tracing
+
+logger = logging.getLogger("e2b-crewai-mcp")
+
+BASE_IMAGE = os.getenv("E2B_BASE_IMAGE", "e2bdev/code-interpreter:latest")
+REGISTRY_PATH = os.getenv("SANDBOX_TEMPLATE_REGISTRY", "sandbox_templates.json")
+MARKER_DIR = "/home/user/.provisioned"
+
+_registry_lock = threading.Lock()
+
+
+class TemplateSpec:
+    """
+    Dependency set of a sandbox template
+
+    Args:
+        name: Short template name ("crawler")
+        packages: pip requirement strings
+        commands: Shell commands run after the pip install
+        install_timeout: Seconds allowed for in-sandbox provisioning
+        base_image: Image the template is built from (defaults to E2B_BASE_IMAGE)
+        files: {sandbox path: local path} uploaded to every new sandbox, not part of the hash
+        require_base_image: The default base image lacks what the sandboxes need (e.g. the MCP
+            gateway): without an explicit `base_image`, no template is built nor used for the spec
+    """
+
+    def __init__(self, name: str, packages: list, commands: list = None, install_timeout: int = 600,
+                 base_image: str = None, files: dict = None, require_base_image: bool = False):
+        self.name = name
+        self.packages = list(packages)
+        self.commands = list(commands or [])
+        self.install_timeout = install_timeout
+        self.base_image = base_image or BASE_IMAGE
+        self.files = dict(files or {})
+        self.buildable = bool(base_image) or not require_base_image
+
+    @property
+    def content_hash(self) -> str:
+        """Stable hash of everything that ends up installed in the sandbox"""
+        payload = json.dumps({
+            "base_image": self.base_image,
+            "packages": sorted(self.packages),
+            "commands": self.commands,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @property
+    def files_hash(self) -> str:
+        """Hash of the hot-uploaded files, logged to tell which code version a sandbox runs"""
+        digest = hashlib.sha256()
+        for remote_path, local_path in sorted(self.files.items()):
+            digest.update(remote_path.encode())
+            with open(local_path, "rb") as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    @property
+    def alias(self) -> str:
+        """Template alias embedding the hash, so a new dependency set never reuses an old build"""
+        return f"{self.name}-{self.content_hash[:12]}"
+
+    @property
+    def marker_path(self) -> str:
+        return f"{MARKER_DIR}/{self.content_hash}"
+
+    def setup_commands(self) -> list:
+        """Shell commands installing the dependency set and writing the marker"""
+        pip = "pip install -q " + " ".join(shlex.quote(p) for p in self.packages)
+        return [pip] + self.commands + [f"mkdir -p {MARKER_DIR} && touch {self.marker_path}"]
+
+    def dockerfile(self) -> str:
+        """e2b.Dockerfile baking the dependency set into a template"""
+        lines = [f"FROM {self.base_image}"]
+        lines += [f"RUN {command}" for command in self.setup_commands()]
+        return "\n".join(lines) + "\n"
+
+
+def _load_registry() -> dict:
+    try:
+        with open(REGISTRY_PATH, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable template registry {REGISTRY_PATH}: {str(e)}")
+        return {}
+
+
+def register_template(spec: TemplateSpec, template_id: str):
+    """Record a built template for the spec's content hash"""
+    with _registry_lock:
+        registry = _load_registry()
+        registry[spec.content_hash] = {"name": spec.name, "template": template_id}
+        tmp_path = f"{REGISTRY_PATH}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(registry, f, indent=2)
+        os.replace(tmp_path, REGISTRY_PATH)
+
+
+def resolve_template(spec: TemplateSpec):
+    """
+    Find a prebuilt template for the spec
+
+    `<NAME>_TEMPLATE` (e.g. CRAWLER_TEMPLATE) overrides the registry lookup.
+
+    Returns:
+        Template id/alias, or None if the spec has never been built or cannot be
+    """
+    override = os.getenv(f"{spec.name.upper()}_TEMPLATE")
+    if override:
+        return override
+    if not spec.buildable:
+        return None
+    with _registry_lock:
+        entry = _load_registry().get(spec.content_hash)
+    return entry["template"] if entry else None
+
+
+def is_provisioned(sandbox, spec: TemplateSpec) -> bool:
+    """Check the in-sandbox marker for the spec's content hash"""
+    try:
+        result = sandbox.commands.run(f"test -f {spec.marker_path}", timeout=30)
+        return result.exit_code == 0
+    except Exception:
+        # The SDK raises on non-zero exit codes
+        return False
+
+
+def provision_sandbox(sandbox, spec: TemplateSpec):
+    """
+    Install the spec's dependencies in a running sandbox, unless already done
+
+    Args:
+        sandbox: Sandbox created from the base image or a (possibly stale) template
+        spec: Dependency set to install
+    """
+    if is_provisioned(sandbox, spec):
+        return
+
+    sandbox_id = getattr(sandbox, "sandbox_id", "?")
+    logger.info(f"Provisioning '{spec.name}' dependencies in sandbox {sandbox_id} (no template for {spec.alias})")
+    with tracing.span("e2b.provision", template=spec.name, sandbox_id=sandbox_id):
+        for command in spec.setup_commands():
+            result = sandbox.commands.run(command, timeout=spec.install_timeout)
+            if result.exit_code != 0:
+                raise Exception(f"Provisioning step failed ({command}): {result.stderr}")
+    logger.info(f"Sandbox {sandbox_id} provisioned for '{spec.name}'")
+
+
+def upload_files(sandbox, spec: TemplateSpec):
+    """Hot-upload the spec's code files, no reinstall involved"""
+    if not spec.files:
+        return
+    for remote_path, local_path in spec.files.items():
+        with open(local_path, "r") as f:
+            sandbox.files.write(remote_path, f.read())
+    logger.info(
+        f"Uploaded {len(spec.files)} '{spec.name}' file(s) to sandbox {getattr(sandbox, 'sandbox_id', '?')} "
+        f"(files {spec.files_hash[:12]})"
+    )
+
+
+def create_provisioned_sandbox(spec: TemplateSpec, create):
+    """
+    Create a sandbox ready for the spec
+
+    Args:
+        spec: Dependency set the sandbox needs
+        create: Callable(template=None) creating a sandbox
+
+    Returns:
+        Sandbox started from the prebuilt template when available, provisioned in place otherwise,
+        with the spec's code files uploaded
+    """
+    template = resolve_template(spec)
+    sandbox = create(template=template)
+    try:
+        provision_sandbox(sandbox, spec)
+        upload_files(sandbox, spec)
+    except Exception:
+        try:
+            sandbox.kill()
+        except Exception:
+            pass
+        raise
+    return sandbox
+
+
+def build_template(spec: TemplateSpec) -> str:
+    """
+    Build the spec into an E2B template with the e2b CLI and register it
+
+    Returns:
+        Template alias usable as `Sandbox.create(template=...)`
+
+    Raises:
+        ValueError: If the spec requires a base image and has none
+    """
+    if not spec.buildable:
+        raise ValueError(
+            f"Template '{spec.name}' needs an explicit base image, the default {BASE_IMAGE} lacks its runtime"
+        )
+    existing = resolve_template(spec)
+    if existing:
+        logger.info(f"Template for '{spec.name}' already built: {existing}")
+        return existing
+
+    with tempfile.TemporaryDirectory() as build_dir:
+        with open(os.path.join(build_dir, "e2b.Dockerfile"), "w") as f:
+            f.write(spec.dockerfile())
+
+        logger.info(f"Building template {spec.alias}...")
+        subprocess.run(
+            ["e2b", "template", "build", "--name", spec.alias,
+             "--dockerfile", "e2b.Dockerfile", "--cmd", "/root/.jupyter/start-up.sh"],
+            cwd=build_dir,
+            check=True
+        )
+
+    register_template(spec, spec.alias)
+    logger.info(f"Template {spec.alias} registered in {REGISTRY_PATH}")
+    return spec.alias
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    if len(sys.argv) != 3 or sys.argv[1] != "build":
+        print("Usage: python sandbox_templates.py build <template-name>")
+        sys.exit(1)
+
+    if sys.argv[2] == "crewai":
+        from mcp_server_complex import TEMPLATE_SPECS
+    else:
+        from mcp_server import TEMPLATE_SPECS
+
+    if sys.argv[2] not in TEMPLATE_SPECS:
+        print(f"Unknown template: {sys.argv[2]} (available: crewai, {', '.join(TEMPLATE_SPECS)})")
+        sys.exit(1)
+
+    spec = TEMPLATE_SPECS[sys.argv[2]]
+    if not spec.buildable:
+        print(f"Cannot build '{spec.name}': set {spec.name.upper()}_BASE_IMAGE to an image providing its runtime")
+        sys.exit(1)
+    print(build_template(spec))
@@ -0,0 +1,311 @@
+"""
+Scheduler
+Fair-share, priority-aware admission of crew runs
+
+Crew runs wait here for one of `max_running` slots instead of queueing first
+come first served in the execution engine, so one tenant firing off twenty
+research tasks does not hold up everyone else:
+
+- Priority classes, served in order: "interactive" (quick tasks, estimated to
+  need no browsing), "research" (tasks mentioning URLs, crawling, searching),
+  "batch" (background jobs). A run waiting longer than the aging delay is
+  served whatever its class, so lower classes never starve.
+- Within a class, tenants share the slots by weighted fair queuing (start-time
+  fair queuing on the estimated cost of each run): a tenant's tenth task goes
+  after other tenants' first ones.
+- Each tenant can only have so many runs waiting; beyond that, or when the
+  whole queue is full, submissions are rejected (HTTP 429).
+
+Tenants are identified by a request header (OpenWebUI user id by default) or
+the API key, see `tenant_from_headers`.
+"""
+import asyncio
+import contextvars
+import hashlib
+import heapq
+import itertools
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from execution_engine import EngineBusyError
+
+logger = logging.getLogger("e2b-crewai-mcp")
+
+INTERACTIVE = "interactive"
+RESEARCH = "research"
+BATCH = "batch"
+
+# Highest priority first
+PRIORITIES = (INTERACTIVE, RESEARCH, BATCH)
+
+# Estimated relative cost of a run, the fair queuing charge
+PRIORITY_COSTS = {INTERACTIVE: 1.0, RESEARCH: 4.0, BATCH: 4.0}
+
+DEFAULT_TENANT = "anonymous"
+
+# Tasks likely to browse the web (crawl_website / crawl_websites) take minutes, not seconds
+RESEARCH_PATTERN = re.compile(
+    r"https?://|www\.|\b(crawl|scrape|browse|website|web ?page|search|research|look up|latest|news|articles?"
+    r"|recherche|site web|actualit[ée]s?)\b",
+    re.IGNORECASE
+)
+
+# Tenant of the request being handled, set by the HTTP server
+current_tenant = contextvars.ContextVar("current_tenant", default=None)
+
+
+def classify(task: str) -> str:
+    """Priority class estimated from the task text"""
+    if RESEARCH_PATTERN.search(task or "") or len(task or "") > 2000:
+        return RESEARCH
+    return INTERACTIVE
+
+
+def resolve_priority(priority: str, task: str) -> str:
+    """Requested priority class if valid, estimated from the task otherwise"""
+    if priority in PRIORITIES:
+        return priority
+    if priority:
+        logger.warning(f"Unknown priority {priority!r}, estimating it from the task")
+    return classify(task)
+
+
+def tenant_from_headers(headers) -> str:
+    """
+    Tenant of an HTTP request
+
+    The SCHEDULER_TENANT_HEADER header (OpenWebUI's forwarded user id by default),
+    then X-Tenant-Id, then a hash of the API key (Authorization / X-API-Key).
+    """
+    for name in (os.getenv("SCHEDULER_TENANT_HEADER", "X-OpenWebUI-User-Id"), "X-Tenant-Id"):
+        value = headers.get(name)
+        if value:
+            return value.strip()[:128]
+    key = headers.get("authorization") or headers.get("x-api-key")
+    if key:
+        return "key-" + hashlib.sha256(key.encode()).hexdigest()[:12]
+    return DEFAULT_TENANT
+
+
+class _Ticket:
+    """A run waiting for a slot"""
+
+    def __init__(self, tenant: str, priority: str, finish: float, start: float):
+        self.tenant = tenant
+        self.priority = priority
+        self.finish = finish
+        self.start = start
+        self.enqueued_at = time.monotonic()
+        self.future = asyncio.get_running_loop().create_future()
+        self.cancelled = False
+
+    @property
+    def abandoned(self) -> bool:
+        # The waiter was cancelled, its except clause may not have run yet
+        return self.cancelled or self.future.cancelled()
+
+
+class TaskScheduler:
+    """
+    Slots for crew runs, handed out by priority class and weighted fair queuing
+
+    Args:
+        max_running: Runs executing at once (SCHEDULER_MAX_RUNNING, the engine's workers by default)
+        max_queued: Runs allowed to wait (SCHEDULER_MAX_QUEUED, the engine's queue by default)
+        tenant_max_queued: Runs one tenant may have waiting (SCHEDULER_TENANT_MAX_QUEUED)
+        weights: Tenant -> share weight, 1 for unlisted tenants (SCHEDULER_TENANT_WEIGHTS="alice=2,bob=0.5")
+        aging: Seconds after which a waiting run is served regardless of its class (SCHEDULER_AGING_SECONDS)
+    """
+
+    def __init__(self, max_running: int = None, max_queued: int = None, tenant_max_queued: int = None,
+                 weights: dict = None, aging: float = None):
+        self.max_running = int(max_running if max_running is not None
+                               else os.getenv("SCHEDULER_MAX_RUNNING", os.getenv("CREW_MAX_WORKERS", "4")))
+        self.max_queued = int(max_queued if max_queued is not None
+                              else os.getenv("SCHEDULER_MAX_QUEUED", os.getenv("CREW_MAX_QUEUE", "16")))
+        self.tenant_max_queued = int(tenant_max_queued if tenant_max_queued is not None
+                                     else os.getenv("SCHEDULER_TENANT_MAX_QUEUED", "8"))
+        if weights is None:
+            weights = {
+                name.strip(): float(weight)
+                for name, weight in (
+                    item.split("=", 1) for item in os.getenv("SCHEDULER_TENANT_WEIGHTS", "").split(",") if "=" in item
+                )
+            }
+        self.weights = weights
+        self.aging = float(aging if aging is not None else os.getenv("SCHEDULER_AGING_SECONDS", "120"))
+
+        self._lock = threading.Lock()
+        self._queues = {priority: [] for priority in PRIORITIES}
+        self._sequence = itertools.count()
+        # Start-time fair queuing state, per class: virtual time and last finish tag of each tenant
+        self._virtual_time = {priority: 0.0 for priority in PRIORITIES}
+        self._last_finish = {priority: {} for priority in PRIORITIES}
+        self._queued = 0
+        self._running = 0
+        self._tenant_queued = {}
+        self._tenant_running = {}
+        self._waits = {priority: deque(maxlen=1000) for priority in PRIORITIES}
+        self._stats = {"dispatched": 0, "rejected": 0, "aged": 0}
+
+    def has_capacity(self, tenant: str = None) -> bool:
+        """True if a run submitted now by this tenant would be admitted"""
+        tenant = tenant or DEFAULT_TENANT
+        with self._lock:
+            if self._running < self.max_running and self._queued == 0:
+                return True
+            return self._queued < self.max_queued and self._tenant_queued.get(tenant, 0) < self.tenant_max_queued
+
+    @asynccontextmanager
+    async def slot(self, tenant: str = None, priority: str = INTERACTIVE):
+        """
+        Hold a run slot for the duration of the block, waiting for it in the tenant's queue
+
+        Raises:
+            EngineBusyError: If the queue, or the tenant's share of it, is full
+        """
+        tenant = tenant or DEFAULT_TENANT
+        ticket = self._enqueue(tenant, priority)
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            with self._lock:
+                dispatched = ticket.future.done() and not ticket.future.cancelled()
+                if not dispatched:
+                    ticket.cancelled = True
+                    self._queued -= 1
+                    self._tenant_queued[tenant] -= 1
+            if dispatched:
+                self._release(tenant)
+            raise
+        try:
+            yield
+        finally:
+            self._release(tenant)
+
+    def stats(self) -> dict:
+        """Queue depths and wait times, per priority class and tenant"""
+        with self._lock:
+            by_priority = {}
+            for priority in PRIORITIES:
+                waits = sorted(self._waits[priority])
+                by_priority[priority] = {
+                    "queued": sum(1 for _, _, t in self._queues[priority] if not t.abandoned),
+                    "avg_wait_seconds": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                    "p95_wait_seconds": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else 0.0,
+                    "max_wait_seconds": round(waits[-1], 3) if waits else 0.0,
+                }
+            tenants = {
+                tenant: {"queued": self._tenant_queued.get(tenant, 0), "running": self._tenant_running.get(tenant, 0)}
+                for tenant in set(self._tenant_queued) | set(self._tenant_running)
+                if self._tenant_queued.get(tenant) or self._tenant_running.get(tenant)
+            }
+            return {
+                "running": self._running,
+                "queued": self._queued,
+                "max_running": self.max_running,
+                "max_queued": self.max_queued,
+                "tenant_max_queued": self.tenant_max_queued,
+                "priorities": by_priority,
+                "tenants": tenants,
+                **self._stats,
+            }
+
+    def queue_depths(self) -> dict:
+        with self._lock:
+            return {p: sum(1 for _, _, t in self._queues[p] if not t.abandoned) for p in PRIORITIES}
+
+    # Internals
+
+    def _enqueue(self, tenant: str, priority: str) -> _Ticket:
+        with self._lock:
+            if self._queued >= self.max_queued or self._tenant_queued.get(tenant, 0) >= self.tenant_max_queued:
+                self._stats["rejected"] += 1
+                raise EngineBusyError(
+                    f"Server busy: {self._running} tasks running, {self._queued} queued "
+                    f"({self._tenant_queued.get(tenant, 0)} for this user, limit {self.tenant_max_queued})"
+                )
+            last_finish = self._last_finish[priority]
+            start = max(self._virtual_time[priority], last_finish.get(tenant, 0.0))
+            finish = start + PRIORITY_COSTS[priority] / max(self.weights.get(tenant, 1.0), 0.01)
+            last_finish[tenant] = finish
+            ticket = _Ticket(tenant, priority, finish, start)
+            heapq.heappush(self._queues[priority], (finish, next(self._sequence), ticket))
+            self._queued += 1
+            self._tenant_queued[tenant] = self._tenant_queued.get(tenant, 0) + 1
+            self._dispatch()
+        return ticket
+
+    def _release(self, tenant: str):
+        with self._lock:
+            self._running -= 1
+            self._tenant_running[tenant] -= 1
+            self._dispatch()
+
+    def _dispatch(self):
+        """Hand free slots to the next runs (lock held)"""
+        while self._running < self.max_running:
+            ticket = self._next()
+            if ticket is None:
+                return
+            self._queued -= 1
+            self._tenant_queued[ticket.tenant] -= 1
+            self._running += 1
+            self._tenant_running[ticket.tenant] = self._tenant_running.get(ticket.tenant, 0) + 1
+            self._virtual_time[ticket.priority] = max(self._virtual_time[ticket.priority], ticket.start)
+            self._waits[ticket.priority].append(time.monotonic() - ticket.enqueued_at)
+            self._stats["dispatched"] += 1
+            ticket.future.set_result(None)
+
+    def _next(self):
+        """Highest priority run, or one that waited past the aging delay (lock held)"""
+        heads = []
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue and queue[0][2].abandoned:
+                heapq.heappop(queue)
+            if queue:
+                heads.append(priority)
+        if not heads:
+            return None
+
+        chosen = heads[0]
+        now = time.monotonic()
+        for priority in heads[1:]:
+            oldest = min(ticket.enqueued_at for _, _, ticket in self._queues[priority] if not ticket.abandoned)
+            if now - oldest > self.aging:
+                chosen = priority
+                self._stats["aged"] += 1
+                break
+        queue = self._queues[chosen]
+        if chosen != heads[0]:
+            # Serve the run that waited the longest, its fair queuing turn is overdue
+            entry = min((e for e in queue if not e[2].abandoned), key=lambda e: e[2].enqueued_at)
+            queue.remove(entry)
+            heapq.heapify(queue)
+            return entry[2]
+        return heapq.heappop(queue)[2]
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_task_scheduler():
+    """Process-wide scheduler, None when SCHEDULER_ENABLED=false"""
+    global _scheduler
+    if os.getenv("SCHEDULER_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = TaskScheduler()
+            logger.info(
+                f"Task scheduler started (running={_scheduler.max_running}, queued={_scheduler.max_queued}, "
+                f"per tenant={_scheduler.tenant_max_queued})"
+            )
+        return _scheduler
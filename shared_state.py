@@ -0,0 +1,348 @@
+"""
+Shared State
+Sandbox, session and worker metadata shared by API workers and replicas
+
+Each worker process owns its sandbox pools and kernel sessions and publishes
+them here. A request for a session owned by another worker takes its sandbox
+over with `Sandbox.connect` (the interpreter state lives in the sandbox, not in
+the worker), and sandbox listing or cleanup sees the sandboxes of every worker
+through their heartbeats.
+
+Backends (SHARED_STATE):
+    sqlite  -> a file on local disk, for the workers of one host (default)
+    redis   -> a Redis-compatible server at REDIS_URL, for replicas on several hosts
+    memory  -> process-local, single worker
+    none    -> disabled
+"""
+import abc
+import json
+import logging
+import os
+import secrets
+import socket
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("e2b-crewai-mcp")
+
+# Namespaces
+WORKERS = "workers"
+SESSIONS = "sessions"
+SANDBOXES = "sandboxes"
+
+
+_worker = None
+
+
+def worker_id() -> str:
+    """
+    Identifier of this worker process, unique across hosts and restarts
+
+    Containers reuse host names and process ids, hence the random suffix.
+    """
+    global _worker
+    prefix = f"{socket.gethostname()}-{os.getpid()}-"
+    if _worker is None or not _worker.startswith(prefix):
+        _worker = prefix + secrets.token_hex(3)
+    return _worker
+
+
+class SharedState(abc.ABC):
+    """Storage interface: JSON records by namespace and key, with an optional expiry"""
+
+    @abc.abstractmethod
+    def put(self, namespace: str, key: str, value: dict, ttl: float = None):
+        """Store a record, expiring after `ttl` seconds if given"""
+
+    @abc.abstractmethod
+    def get(self, namespace: str, key: str):
+        """Return the record, or None if unknown or expired"""
+
+    @abc.abstractmethod
+    def delete(self, namespace: str, key: str):
+        """Remove a record, no-op if unknown"""
+
+    @abc.abstractmethod
+    def items(self, namespace: str) -> dict:
+        """Every live record of a namespace, by key"""
+
+
+class InMemorySharedState(SharedState):
+    """Process-local state, for a single worker"""
+
+    def __init__(self):
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def put(self, namespace: str, key: str, value: dict, ttl: float = None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._records[(namespace, key)] = (dict(value), expires_at)
+
+    def get(self, namespace: str, key: str):
+        with self._lock:
+            record = self._records.get((namespace, key))
+        if record is None or (record[1] is not None and record[1] <= time.time()):
+            return None
+        return dict(record[0])
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._records.pop((namespace, key), None)
+
+    def items(self, namespace: str) -> dict:
+        now = time.time()
+        with self._lock:
+            return {
+                key: dict(value) for (ns, key), (value, expires_at) in self._records.items()
+                if ns == namespace and (expires_at is None or expires_at > now)
+            }
+
+
+class SQLiteSharedState(SharedState):
+    """SQLite file shared by the workers of one host"""
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv("SHARED_STATE_PATH", "shared_state.db")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS shared_state (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+
+    def put(self, namespace: str, key: str, value: dict, ttl: float = None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO shared_state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value), expires_at)
+            )
+
+    def get(self, namespace: str, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM shared_state WHERE namespace = ? AND key = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM shared_state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def items(self, namespace: str) -> dict:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM shared_state WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            rows = self._conn.execute(
+                "SELECT key, value FROM shared_state WHERE namespace = ?", (namespace,)
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+
+class RedisSharedState(SharedState):
+    """
+    Redis-compatible server shared by replicas on several hosts
+
+    Args:
+        url: Server URL (REDIS_URL)
+        prefix: Key prefix, to share a server between deployments (SHARED_STATE_PREFIX)
+    """
+
+    def __init__(self, url: str = None, prefix: str = None):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("SHARED_STATE=redis requires the redis package (pip install redis)")
+        self.url = url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        self.prefix = prefix or os.getenv("SHARED_STATE_PREFIX", "e2b-crewai")
+        self._client = redis.Redis.from_url(self.url, decode_responses=True)
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}:{namespace}:{key}"
+
+    def put(self, namespace: str, key: str, value: dict, ttl: float = None):
+        self._client.set(self._key(namespace, key), json.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    def get(self, namespace: str, key: str):
+        value = self._client.get(self._key(namespace, key))
+        return json.loads(value) if value is not None else None
+
+    def delete(self, namespace: str, key: str):
+        self._client.delete(self._key(namespace, key))
+
+    def items(self, namespace: str) -> dict:
+        keys = list(self._client.scan_iter(match=self._key(namespace, "*"), count=500))
+        if not keys:
+            return {}
+        start = len(self._key(namespace, ""))
+        return {
+            key[start:]: json.loads(value)
+            for key, value in zip(keys, self._client.mget(keys)) if value is not None
+        }
+
+
+def create_shared_state(kind: str = None):
+    """Build the backend selected by SHARED_STATE (sqlite by default), None when disabled"""
+    kind = (kind or os.getenv("SHARED_STATE", "sqlite")).lower()
+    if kind == "none":
+        return None
+    if kind == "memory":
+        return InMemorySharedState()
+    if kind == "sqlite":
+        return SQLiteSharedState()
+    if kind == "redis":
+        return RedisSharedState()
+    raise ValueError(f"Unknown shared state backend: {kind}")
+
+
+class SandboxDirectory:
+    """
+    Which worker owns which session and sandbox
+
+    Args:
+        state: SharedState backend
+        worker: This worker's id
+        heartbeat_interval: Seconds between two heartbeats (WORKER_HEARTBEAT_INTERVAL),
+            a worker missing three is considered gone
+    """
+
+    def __init__(self, state: SharedState, worker: str = None, heartbeat_interval: float = None):
+        self.state = state
+        self.worker = worker or worker_id()
+        self.heartbeat_interval = float(heartbeat_interval if heartbeat_interval is not None
+                                        else os.getenv("WORKER_HEARTBEAT_INTERVAL", "5"))
+        # Live workers seen at the last heartbeat, for status endpoints that must not wait on the state
+        self.worker_count = 1
+        self._describe = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Sessions
+
+    def claim_session(self, session_id: str, sandbox_id: str):
+        """Record this worker as the owner of a session and its kernel sandbox"""
+        record = {"worker_id": self.worker, "sandbox_id": sandbox_id, "claimed_at": time.time()}
+        self.state.put(SESSIONS, session_id, record)
+        self.state.put(SANDBOXES, sandbox_id, {"worker_id": self.worker, "session_id": session_id})
+
+    def session(self, session_id: str):
+        """{"worker_id", "sandbox_id", "claimed_at", "busy_until"} of a session, None if no worker has it"""
+        return self.state.get(SESSIONS, session_id)
+
+    def mark_busy(self, session_id: str, ttl: float = None):
+        """
+        Flag a session of this worker as running code for up to `ttl` seconds, or as idle (ttl None)
+
+        Other workers do not take a busy session over while its owner is alive.
+        """
+        record = self.state.get(SESSIONS, session_id)
+        if record is None or record["worker_id"] != self.worker:
+            return
+        record["busy_until"] = time.time() + ttl if ttl else None
+        self.state.put(SESSIONS, session_id, record)
+
+    @staticmethod
+    def is_busy(record: dict) -> bool:
+        return bool(record.get("busy_until")) and record["busy_until"] > time.time()
+
+    def owns_session(self, session_id: str) -> bool:
+        record = self.state.get(SESSIONS, session_id)
+        return record is None or record["worker_id"] == self.worker
+
+    def drop_session(self, session_id: str):
+        """Forget a session this worker ended (left alone if another worker took it over)"""
+        record = self.state.get(SESSIONS, session_id)
+        if record is None or record["worker_id"] != self.worker:
+            return
+        self.state.delete(SESSIONS, session_id)
+        self.state.delete(SANDBOXES, record["sandbox_id"])
+
+    def session_for_sandbox(self, sandbox_id: str):
+        """Session whose kernel runs in a sandbox, None if the sandbox is not a session kernel"""
+        record = self.state.get(SANDBOXES, sandbox_id)
+        return record["session_id"] if record else None
+
+    # Workers
+
+    def workers(self) -> dict:
+        """Heartbeat records of the live workers, by worker id"""
+        return self.state.items(WORKERS)
+
+    def owner_of(self, sandbox_id: str):
+        """Worker id owning a sandbox, according to the last heartbeats"""
+        for worker, record in self.workers().items():
+            if sandbox_id in record.get("sandbox_ids", []):
+                return worker
+        return None
+
+    def start_heartbeat(self, describe=None):
+        """
+        Publish this worker's state every heartbeat interval
+
+        Args:
+            describe: Callable returning extra heartbeat fields ("sandbox_ids", "sessions", ...)
+        """
+        self._describe = describe
+        if self._thread is not None:
+            return
+        self.beat()
+        self._thread = threading.Thread(target=self._heartbeat_loop, name="worker-heartbeat", daemon=True)
+        self._thread.start()
+        logger.info(f"Worker {self.worker} registered in shared state")
+
+    def beat(self):
+        record = {"worker_id": self.worker, "pid": os.getpid(), "host": socket.gethostname(), "updated_at": time.time()}
+        if self._describe is not None:
+            try:
+                record.update(self._describe())
+            except Exception as e:
+                logger.warning(f"Worker description failed: {str(e)}")
+        self.state.put(WORKERS, self.worker, record, ttl=self.heartbeat_interval * 3)
+        self.worker_count = max(1, len(self.workers()))
+
+    def stop(self):
+        """Stop the heartbeat and unregister this worker"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.heartbeat_interval + 5)
+        try:
+            self.state.delete(WORKERS, self.worker)
+        except Exception as e:
+            logger.warning(f"Failed to unregister worker {self.worker}: {str(e)}")
+
+    def is_alive(self, worker: str) -> bool:
+        return worker == self.worker or self.state.get(WORKERS, worker) is not None
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self.beat()
+            except Exception as e:
+                logger.warning(f"Worker heartbeat failed: {str(e)}")
+
+
+_directory = None
+_directory_lock = threading.Lock()
+
+
+def get_sandbox_directory():
+    """Process-wide sandbox directory, None when SHARED_STATE=none"""
+    global _directory
+    with _directory_lock:
+        if _directory is None or _directory.worker != worker_id():
+            # Rebuilt in a forked worker, whose process id changed
+            state = create_shared_state()
+            if state is None:
+                return None
+            _directory = SandboxDirectory(state)
+        return _directory
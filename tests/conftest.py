@@ -0,0 +1,9 @@
+"""
+Test setup: the modules live at the repository root, the E2B and LLM fakes in benchmarks/
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
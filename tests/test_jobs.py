@@ -0,0 +1,89 @@
+"""Job lifecycle and restart recovery"""
+import asyncio
+
+from jobs import CANCELLED, FAILED, RUNNING, SUCCEEDED, InMemoryJobStore, JobManager, new_job
+
+
+async def _succeed(task, sandbox_id=None, session_id=None, **options):
+    return {"success": True, "result": task}
+
+
+async def _hang(task, sandbox_id=None, session_id=None, **options):
+    await asyncio.sleep(3600)
+
+
+def test_recover_fails_jobs_left_running_without_worker_ids():
+    # Regression: without a shared state directory, worker ids are all None and
+    # leftover jobs used to be taken for this process's own
+    store = InMemoryJobStore()
+    job = new_job("task")
+    store.create(job)
+    store.update(job["job_id"], status=RUNNING)
+
+    JobManager(_succeed, store=store).recover()
+
+    recovered = store.get(job["job_id"])
+    assert recovered["status"] == FAILED
+    assert recovered["error"] == "Interrupted by server restart"
+
+
+def test_recover_keeps_jobs_of_live_workers():
+    store = InMemoryJobStore()
+    mine, theirs, dead = new_job("a", worker_id="me"), new_job("b", worker_id="alive"), new_job("c", worker_id="dead")
+    for job in (mine, theirs, dead):
+        store.create(job)
+        store.update(job["job_id"], status=RUNNING)
+
+    JobManager(_succeed, store=store, worker="me", is_alive=lambda worker: worker == "alive").recover()
+
+    assert store.get(mine["job_id"])["status"] == RUNNING
+    assert store.get(theirs["job_id"])["status"] == RUNNING
+    assert store.get(dead["job_id"])["status"] == FAILED
+
+
+def test_recover_keeps_jobs_this_process_runs():
+    async def scenario():
+        manager = JobManager(_hang, store=InMemoryJobStore())
+        job = manager.submit("task")
+        await asyncio.sleep(0)
+        manager.recover()
+        status = manager.get(job["job_id"])["status"]
+        manager.cancel(job["job_id"])
+        return status
+
+    assert asyncio.run(scenario()) == RUNNING
+
+
+def test_submit_and_cancel():
+    async def scenario():
+        manager = JobManager(_succeed, store=InMemoryJobStore())
+        done = manager.submit("done")
+        await asyncio.sleep(0.01)
+        hanging = JobManager(_hang, store=manager.store)
+        job = hanging.submit("hang")
+        await asyncio.sleep(0)
+        hanging.cancel(job["job_id"])
+        await asyncio.sleep(0.01)
+        return manager.get(done["job_id"]), manager.get(job["job_id"])
+
+    done, cancelled = asyncio.run(scenario())
+    assert done["status"] == SUCCEEDED and done["result"] == {"success": True, "result": "done"}
+    assert cancelled["status"] == CANCELLED
+
+
+def test_workers_without_ids_do_not_fail_each_others_jobs():
+    # Regression: with worker ids unavailable, the periodic recovery of one worker
+    # failed the live jobs of the others sharing the store
+    async def scenario():
+        store = InMemoryJobStore()
+        first = JobManager(_hang, store=store, watch_interval=0.01)
+        second = JobManager(_hang, store=store, watch_interval=0.01)
+        job = first.submit("task")
+        second.start()
+        await asyncio.sleep(0.3)
+        second.stop()
+        status = store.get(job["job_id"])["status"]
+        first.cancel(job["job_id"])
+        return status
+
+    assert asyncio.run(scenario()) == RUNNING
@@ -0,0 +1,128 @@
+"""Session kernels against a SandboxPool of fake sandboxes"""
+import pytest
+
+from fakes import FakeSandbox
+from kernels import KernelBusyError, KernelManager
+from sandbox_pool import SandboxPool, SandboxPoolError
+from shared_state import InMemorySharedState, SandboxDirectory
+
+
+@pytest.fixture
+def pool():
+    pool = SandboxPool(FakeSandbox.create, name="test", min_size=0, max_size=2, acquire_timeout=5, lifetime=0)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def kernels(pool):
+    manager = KernelManager(pool, max_sessions=8, memory_limit_mb=0, reap_interval=3600)
+    yield manager
+    manager.close()
+
+
+def test_session_keeps_its_kernel(kernels):
+    first, _ = kernels.run("chat", "x = 1")
+    sandbox_id = kernels.list()[0]["sandbox_id"]
+    kernels.run("chat", "x += 1")
+    assert kernels.list()[0]["sandbox_id"] == sandbox_id
+    assert kernels.list()[0]["executions"] == 2
+
+
+def test_exhausted_pool_evicts_least_recently_used_idle_session(kernels, pool):
+    # Regression: idle conversations used to hold the whole pool until their TTL,
+    # new sessions then blocked for the acquire timeout and failed
+    pool.acquire_timeout = 0.5
+    kernels.run("old", "x = 1")
+    kernels.run("recent", "y = 1")
+    assert pool.exhausted()
+
+    kernels.run("new", "z = 1")
+
+    sessions = {s["session_id"] for s in kernels.list()}
+    assert sessions == {"recent", "new"}
+
+
+def test_busy_sessions_are_not_evicted(kernels, pool):
+    pool.acquire_timeout = 0.5
+    kernels.run("a", "x = 1")
+    kernels.run("b", "x = 1")
+    with kernels._sessions["a"].lock, kernels._sessions["b"].lock:
+        with pytest.raises(SandboxPoolError):
+            kernels.run("c", "x = 1")
+    assert {s["session_id"] for s in kernels.list()} == {"a", "b"}
+
+
+def test_max_sessions_evicts_least_recently_used(pool):
+    manager = KernelManager(pool, max_sessions=1, memory_limit_mb=0, reap_interval=3600)
+    try:
+        manager.run("a", "x = 1")
+        manager.run("b", "x = 1")
+        assert [s["session_id"] for s in manager.list()] == ["b"]
+    finally:
+        manager.close()
+
+
+@pytest.fixture
+def workers():
+    """Two workers sharing a directory, each with its own pool and kernels"""
+    state = InMemorySharedState()
+    managers = []
+    for name in ("a", "b"):
+        pool = SandboxPool(FakeSandbox.create, name=name, min_size=0, max_size=2, acquire_timeout=5, lifetime=0)
+        managers.append(KernelManager(pool, memory_limit_mb=0, reap_interval=3600, takeover_timeout=0.2,
+                                      directory=SandboxDirectory(state, worker=name), connect=FakeSandbox.connect))
+    yield managers
+    for manager in managers:
+        manager.close()
+        manager.pool.close()
+
+
+def test_busy_session_is_not_taken_over(workers):
+    a, b = workers
+    a.directory.beat()
+    a.run("chat", "x = 1")
+    sandbox_id = a.list()[0]["sandbox_id"]
+
+    # As while `a` runs code in the session
+    a.directory.mark_busy("chat", 60)
+    with pytest.raises(KernelBusyError):
+        b.run("chat", "x += 1")
+
+    a.directory.mark_busy("chat", None)
+    b.run("chat", "x += 1")
+    assert b.list()[0]["sandbox_id"] == sandbox_id
+    assert b.directory.session("chat")["worker_id"] == "b"
+
+
+def test_busy_session_of_a_dead_worker_is_taken_over(workers):
+    a, b = workers
+    a.run("chat", "x = 1")
+    a.directory.mark_busy("chat", 60)
+    # `a` never sent a heartbeat: gone as far as `b` knows
+    b.run("chat", "x += 1")
+    assert b.directory.session("chat")["worker_id"] == "b"
+
+
+def test_memory_is_sampled_every_few_executions(pool):
+    manager = KernelManager(pool, memory_limit_mb=100, memory_check_every=3, memory_check_interval=3600,
+                            reap_interval=3600)
+    try:
+        notes = [manager.run("chat", "x = 1")[1] for _ in range(3)]
+        # Fakes report 256 MB: the third execution samples it and replaces the kernel
+        assert notes[:2] == [None, None]
+        assert "memory limit exceeded" in notes[2]
+    finally:
+        manager.close()
+
+
+def test_memory_probe_leaves_the_kernel_history_alone(pool):
+    manager = KernelManager(pool, memory_limit_mb=1024, memory_check_every=1, reap_interval=3600)
+    try:
+        manager.run("chat", "x = 1")
+        manager.run("chat", "x += 1")
+        session = manager.list()[0]
+        assert session["memory_mb"] == 256
+        assert FakeSandbox.connect(session["sandbox_id"]).runs == 2
+    finally:
+        manager.close()
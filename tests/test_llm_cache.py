@@ -0,0 +1,83 @@
+"""CompletionCache in front of a fake LLM"""
+import time
+
+import pytest
+
+from fakes import FakeLLM, LatencyModel
+from llm_cache import CompletionCache, completion_key
+
+MESSAGES = [{"role": "user", "content": "Summarize the dataset"}]
+
+
+@pytest.fixture
+def llm():
+    return FakeLLM(LatencyModel())
+
+
+def make_cache(tmp_path, **kwargs):
+    return CompletionCache(path=str(tmp_path / "llm_cache.db"), **kwargs)
+
+
+def ask(cache, llm, key):
+    return cache.get_or_call(key, lambda: llm.call(MESSAGES), model=llm.model)
+
+
+def test_second_identical_request_is_served_from_cache(tmp_path, llm):
+    cache = make_cache(tmp_path)
+    key = completion_key(llm.model, MESSAGES, temperature=0.2)
+
+    assert ask(cache, llm, key) == ask(cache, llm, key)
+    assert llm.calls == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_expired_completion_calls_the_llm_again(tmp_path, llm):
+    cache = make_cache(tmp_path, ttl=0.05)
+    key = completion_key(llm.model, MESSAGES)
+    ask(cache, llm, key)
+    time.sleep(0.1)
+
+    ask(cache, llm, key)
+    assert llm.calls == 2
+    assert cache.stats()["evictions"] == 1
+
+
+def test_least_recently_used_completion_is_evicted(tmp_path, llm):
+    cache = make_cache(tmp_path, max_entries=2)
+    keys = [completion_key(llm.model, f"question {i}") for i in range(3)]
+    ask(cache, llm, keys[0])
+    time.sleep(0.01)
+    ask(cache, llm, keys[1])
+    time.sleep(0.01)
+    # Touch the oldest so the second one becomes the least recently used
+    ask(cache, llm, keys[0])
+    time.sleep(0.01)
+    ask(cache, llm, keys[2])
+
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.stats()["entries"] == 2
+
+
+def test_failed_call_is_not_cached(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.get_or_call("key", lambda: None) is None
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.parametrize("changed", [
+    {"model": "other-model"},
+    {"messages": [{"role": "user", "content": "Summarize the dataset twice"}]},
+    {"temperature": 0.7},
+    {"tools": [{"name": "execute_python"}]},
+    {"stop": ["Observation:"]},
+])
+def test_completion_key_depends_on_everything_shaping_the_answer(changed):
+    request = {"model": "fake-llm", "messages": MESSAGES, "temperature": 0.2}
+    assert completion_key(**request) != completion_key(**{**request, **changed})
+
+
+def test_completion_key_ignores_unset_params_and_string_messages():
+    assert completion_key("fake-llm", MESSAGES, stop=None) == completion_key("fake-llm", MESSAGES)
+    assert completion_key("fake-llm", "Summarize the dataset") == completion_key("fake-llm", MESSAGES)
@@ -0,0 +1,140 @@
+"""execute_python memoization against an in-process fake kernel"""
+import ast
+import contextlib
+import io
+
+import pytest
+
+from fakes import _Execution
+from memoize import ExecutionMemo, bypass_reason, mutates_state, self_contained
+
+
+class FakeKernel:
+    """Runs snippets with exec in one namespace, like a Jupyter kernel"""
+
+    def __init__(self):
+        self.namespace = {}
+        self.generation = 0
+        self.runs = 0
+
+    def execute(self, code: str):
+        self.runs += 1
+        return self._run(code), None
+
+    def probe(self, code: str):
+        return self._run(code)
+
+    def state(self):
+        return self.generation
+
+    def _run(self, code: str):
+        self.generation += 1
+        tree = ast.parse(code)
+        last = tree.body.pop() if tree.body and isinstance(tree.body[-1], ast.Expr) else None
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            exec(compile(tree, "<snippet>", "exec"), self.namespace)
+            value = eval(compile(ast.Expression(last.value), "<snippet>", "eval"), self.namespace) if last else None
+        return _Execution(text=repr(value) if value is not None else None, stdout=[stdout.getvalue()])
+
+
+def run(memo, kernel, code, session_id="chat"):
+    result, _ = memo.run(code, kernel.execute, session_id, kernel.probe, kernel.state)
+    return result["text"]
+
+
+@pytest.mark.parametrize("code, reason", [
+    ("import random\nrandom.random()", "imports random"),
+    ("from datetime import datetime", "imports datetime"),
+    ("np.random.rand(3)", "uses .rand"),
+    ("pd.read_csv('https://example.com/data.csv')", "accesses the network"),
+    ("!pip install pandas", "not plain Python"),
+    ("sum(range(10))", None),
+])
+def test_bypass_detection(code, reason):
+    assert bypass_reason(code) == reason
+
+
+@pytest.mark.parametrize("code, mutates", [
+    ("x = x + 1\nx", True),
+    ("df = df.drop(columns=['a'])", True),
+    ("total = total * 2", True),
+    ("y = x\nx = 2", True),
+    ("obj.attr = 1", True),
+    ("d['k'] = 1", True),
+    ("items.append(1)", True),
+    ("df.dropna(inplace=True)", True),
+    ("n += 1", True),
+    ("x = 1\nprint(x)", False),
+    ("import pandas as pd\ndf = pd.read_csv('data.csv')\ndf.describe()", False),
+    ("def double(v):\n    out = v * 2\n    return out\ndouble(x)", False),
+    ("[i * 2 for i in values]", False),
+    ("df.dropna(inplace=False)", False),
+])
+def test_mutation_detection(code, mutates):
+    assert mutates_state(code) is mutates
+
+
+def test_rerun_rebinding_a_kernel_name_executes_every_time():
+    # Regression: "x = x + 1" re-runs were replayed, so x stayed at 1
+    memo, kernel = ExecutionMemo(), FakeKernel()
+    kernel.namespace["x"] = 0
+    assert [run(memo, kernel, "x = x + 1\nx") for _ in range(3)] == ["1", "2", "3"]
+    assert kernel.namespace["x"] == 3
+
+
+def test_idempotent_rerun_is_replayed():
+    memo, kernel = ExecutionMemo(), FakeKernel()
+    assert run(memo, kernel, "y = 2\ny * 21") == run(memo, kernel, "y = 2\ny * 21") == "42"
+    assert kernel.runs == 1
+    assert memo.stats()["hits"] == 1
+
+
+def test_least_recently_used_result_is_evicted():
+    memo, kernel = ExecutionMemo(max_entries=2), FakeKernel()
+    for code in ("1 + 1", "2 + 2", "1 + 1", "3 + 3"):
+        run(memo, kernel, code, session_id=None)
+    assert kernel.runs == 3
+
+    run(memo, kernel, "1 + 1", session_id=None)
+    assert kernel.runs == 3
+    run(memo, kernel, "2 + 2", session_id=None)
+    assert kernel.runs == 4
+
+
+def test_changed_input_file_invalidates_the_result(tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_text("a,b\n1,2\n")
+    code = f"len(open('{path}').read().splitlines())"
+    memo, kernel = ExecutionMemo(), FakeKernel()
+
+    assert run(memo, kernel, code) == run(memo, kernel, code) == "2"
+    assert kernel.runs == 1
+
+    path.write_text("a,b\n1,2\n3,4\n")
+    assert run(memo, kernel, code) == "3"
+    assert kernel.runs == 2
+
+
+@pytest.mark.parametrize("code, shared", [
+    ("sum(i * i for i in range(10))", True),
+    ("len(open('data.csv').read())", True),
+    ("import math\nmath.sqrt(2)", False),
+    ("total = 1\ntotal", False),
+    ("len(df)", False),
+    ("open('out.txt', 'w').write('done')", False),
+])
+def test_self_contained_detection(code, shared):
+    assert self_contained(code) is shared
+
+
+def test_self_contained_result_is_shared_across_sessions():
+    memo, first, second = ExecutionMemo(), FakeKernel(), FakeKernel()
+    code = "sum(i * i for i in range(10))"
+    assert run(memo, first, code, session_id="task-a") == run(memo, second, code, session_id="task-b") == "285"
+    assert (first.runs, second.runs) == (1, 0)
+
+    # Defines a name later snippets of the session rely on: always run in each session
+    run(memo, first, "squares = [i * i for i in range(10)]", session_id="task-a")
+    run(memo, second, "squares = [i * i for i in range(10)]", session_id="task-b")
+    assert "squares" in second.namespace
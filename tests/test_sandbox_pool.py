@@ -0,0 +1,142 @@
+"""SandboxPool leasing, recycling and reaping with fake sandboxes"""
+import threading
+import time
+
+import pytest
+
+import crawler_service
+from fakes import FakeSandbox
+from sandbox_pool import SandboxPool, SandboxPoolError
+
+
+def make_pool(**kwargs):
+    options = {"name": "test", "min_size": 0, "max_size": 2, "acquire_timeout": 5, "lifetime": 0}
+    options.update(kwargs)
+    return SandboxPool(FakeSandbox.create, **options)
+
+
+@pytest.fixture
+def pool():
+    pool = make_pool()
+    yield pool
+    pool.close()
+
+
+def wait_for(condition, timeout: float = 2.0):
+    """Released sandboxes are recycled in the background"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def test_released_sandbox_is_reused(pool):
+    entry = pool.acquire()
+    pool.release(entry)
+    wait_for(lambda: pool.stats()["idle"] == 1)
+
+    assert pool.acquire().sandbox_id == entry.sandbox_id
+    stats = pool.stats()
+    assert (stats["created"], stats["leases"], stats["leased"], stats["idle"]) == (1, 2, 1, 0)
+
+
+def test_lease_discards_the_sandbox_when_the_block_raises(pool):
+    with pytest.raises(ValueError):
+        with pool.lease() as sandbox:
+            raise ValueError("tool failed")
+    assert not sandbox.is_running()
+    assert pool.stats()["killed"] == 1
+
+
+def test_acquire_times_out_at_max_size(pool):
+    pool.acquire()
+    pool.acquire()
+    assert pool.exhausted()
+
+    started = time.monotonic()
+    with pytest.raises(SandboxPoolError):
+        pool.acquire(timeout=0.2)
+    assert time.monotonic() - started >= 0.2
+    assert pool.stats()["created"] == 2
+
+
+def test_acquire_waits_for_a_release_at_max_size(pool):
+    first = pool.acquire()
+    pool.acquire()
+    threading.Timer(0.1, pool.release, args=(first,)).start()
+
+    assert pool.acquire(timeout=2).sandbox_id == first.sandbox_id
+
+
+def test_unhealthy_sandbox_is_discarded_on_checkout(pool):
+    entry = pool.acquire()
+    pool.release(entry)
+    wait_for(lambda: pool.stats()["idle"] == 1)
+    entry.sandbox.kill()
+
+    fresh = pool.acquire()
+    assert fresh.sandbox_id != entry.sandbox_id
+    stats = pool.stats()
+    assert (stats["unhealthy"], stats["killed"], stats["created"]) == (1, 1, 2)
+
+
+def test_sandbox_is_recycled_after_max_uses():
+    pool = make_pool(max_uses=2)
+    try:
+        entry = pool.acquire()
+        pool.release(entry)
+        wait_for(lambda: pool.stats()["idle"] == 1)
+        assert pool.acquire().sandbox_id == entry.sandbox_id
+        pool.release(entry)
+
+        assert not entry.sandbox.is_running()
+        assert pool.stats()["idle"] == 0
+        assert pool.acquire().sandbox_id != entry.sandbox_id
+    finally:
+        pool.close()
+
+
+def test_idle_sandboxes_above_min_size_are_reaped():
+    pool = make_pool(min_size=1, idle_timeout=0.05)
+    try:
+        entries = [pool.acquire(), pool.acquire()]
+        for entry in entries:
+            pool.release(entry)
+        wait_for(lambda: pool.stats()["idle"] == 2)
+        time.sleep(0.1)
+
+        pool._reap_idle()
+        stats = pool.stats()
+        assert (stats["idle"], stats["killed"]) == (1, 1)
+    finally:
+        pool.close()
+
+
+def test_adopted_and_detached_sandboxes_count_against_max_size(pool):
+    sandbox = FakeSandbox.create()
+    adopted = pool.adopt(sandbox)
+    pool.acquire()
+    assert pool.exhausted()
+    assert sandbox.sandbox_id in pool.stats()["sandbox_ids"]
+
+    pool.detach(adopted)
+    assert not pool.exhausted()
+    assert sandbox.is_running()
+    assert pool.stats()["leased"] == 1
+    # No longer owned: releasing it is a no-op
+    pool.release(adopted)
+    assert pool.stats()["killed"] == 0
+
+
+def test_crawler_daemons_are_forgotten_with_their_sandbox():
+    pool = make_pool(on_discard=crawler_service.forget)
+    discarded, kept = pool.acquire(), pool.acquire()
+    for entry in (discarded, kept):
+        crawler_service._daemons[entry.sandbox_id] = {"url": "https://fake.invalid", "token": "token"}
+
+    pool.release(discarded, discard=True)
+    assert not crawler_service.has_daemon(discarded.sandbox)
+    assert crawler_service.has_daemon(kept.sandbox)
+
+    pool.close()
+    assert not crawler_service.has_daemon(kept.sandbox)
@@ -0,0 +1,106 @@
+"""SandboxRegistry leasing, single-flight creation and eviction with fake sandboxes"""
+import asyncio
+import time
+
+from fakes import FakeSandbox
+from sandbox_registry import SandboxRegistry
+
+
+class Creator:
+    """Counts creations, each taking `delay` seconds"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.created = []
+
+    def __call__(self):
+        time.sleep(self.delay)
+        sandbox = FakeSandbox.create()
+        self.created.append(sandbox)
+        return sandbox
+
+
+def run(scenario, **kwargs):
+    """Run `scenario(registry, creator)` on a fresh registry, closed afterwards"""
+    async def main():
+        creator = Creator(kwargs.pop("delay", 0.0))
+        registry = SandboxRegistry(creator, **{"max_size": 4, "health_interval": 3600, **kwargs})
+        try:
+            return await scenario(registry, creator)
+        finally:
+            await registry.close()
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_for_one_id_share_a_creation():
+    async def scenario(registry, creator):
+        sandboxes = await asyncio.gather(*(registry.get_or_create("gone") for _ in range(3)))
+        assert len(creator.created) == 1
+        assert {s.sandbox_id for s in sandboxes} == {creator.created[0].sandbox_id}
+    run(scenario, delay=0.05)
+
+
+def overlap(registry, sandbox_ids) -> int:
+    """Most leases held at once while leasing each id for a short while"""
+    active, peak = 0, 0
+
+    async def task(sandbox_id):
+        nonlocal active, peak
+        async with registry.lease(sandbox_id):
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.05)
+            active -= 1
+
+    return asyncio.gather(*(task(s) for s in sandbox_ids)), lambda: peak
+
+
+def test_leases_on_one_sandbox_run_one_after_another():
+    async def scenario(registry, creator):
+        sandbox = await registry.get_or_create()
+        tasks, peak = overlap(registry, [sandbox.sandbox_id] * 3)
+        await tasks
+        assert peak() == 1
+        assert len(creator.created) == 1
+    run(scenario)
+
+
+def test_leases_on_different_sandboxes_run_in_parallel():
+    async def scenario(registry, creator):
+        first, second = await registry.get_or_create(), await registry.get_or_create()
+        tasks, peak = overlap(registry, [first.sandbox_id, second.sandbox_id])
+        await tasks
+        assert peak() == 2
+    run(scenario)
+
+
+def test_expired_and_unhealthy_sandboxes_are_killed():
+    async def scenario(registry, creator):
+        sandbox = await registry.get_or_create()
+        assert await registry.evict() == [sandbox.sandbox_id]
+        assert not sandbox.is_running()
+    run(scenario, ttl=0)
+
+    async def scenario(registry, creator):
+        sandbox = await registry.get_or_create()
+        assert await registry.check() == [sandbox.sandbox_id]
+        assert not sandbox.is_running()
+        assert await registry.list() == []
+    run(scenario, probe=lambda sandbox: False)
+
+
+def test_new_lease_when_every_sandbox_is_leased():
+    # Regression: the sandbox created for the new lease was the only idle entry and
+    # was evicted before it could be held, so lease() created and killed sandboxes forever
+    async def scenario(registry, creator):
+        async with registry.lease():
+            async with registry.lease() as sandbox:
+                assert sandbox.is_running()
+            assert len(creator.created) == 2
+        # Back to capacity once nothing is held
+        await registry.evict()
+        assert len(await registry.list()) == 1
+
+    async def bounded(registry, creator):
+        await asyncio.wait_for(scenario(registry, creator), timeout=5)
+    run(bounded, max_size=1)
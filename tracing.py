@@ -0,0 +1,345 @@
+"""
+Tracing
+Spans for the request, the crew, LLM calls, tools and E2B operations
+
+A span opened with `span(...)` becomes the parent of every span opened in the
+same context, including crew worker threads (the execution engine copies the
+context). Finished spans go to the configured exporters from a background
+thread, and can be collected per request to return a timing breakdown.
+
+The trace is propagated in the W3C `traceparent` format: read from incoming
+HTTP requests, passed to sandbox-side scripts as the TRACEPARENT environment
+variable and to the crawler daemon as a header.
+
+Exporters (TRACE_EXPORTERS, comma separated):
+    json  -> one JSON span per line appended to TRACE_FILE
+    otlp  -> OTLP/HTTP JSON to OTEL_EXPORTER_OTLP_TRACES_ENDPOINT
+             (or OTEL_EXPORTER_OTLP_ENDPOINT + /v1/traces)
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+
+logger = logging.getLogger("e2b-crewai-mcp")
+
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "e2b-crewai")
+
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+# Span of the current context, None outside any trace
+current_span = contextvars.ContextVar("current_span", default=None)
+
+# Finished spans of the current request, when a timing breakdown was asked for
+_collected = contextvars.ContextVar("collected_spans", default=None)
+
+
+class Span:
+    """One timed operation of a trace"""
+
+    def __init__(self, name: str, trace_id: str, parent_id: str = None, attributes: dict = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self.end = None
+        self.error = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "end": self.end,
+            "duration": round(self.duration, 6),
+            "attributes": self.attributes,
+            "error": self.error,
+            "service": SERVICE_NAME,
+        }
+
+
+def parse_traceparent(header: str):
+    """(trace_id, parent span_id) from a traceparent header, None if invalid"""
+    match = TRACEPARENT_PATTERN.match((header or "").strip().lower())
+    if match is None or match.group(1) == "0" * 32:
+        return None
+    return match.group(1), match.group(2)
+
+
+@contextmanager
+def span(name: str, traceparent: str = None, **attributes):
+    """
+    Time a block as a child of the current span (or the root of a new trace)
+
+    Args:
+        name: Operation name ("execute_crewai_task", "tool.execute_python", "e2b.run_code", ...)
+        traceparent: Remote parent to continue, used when no span is current
+        **attributes: Span attributes
+
+    Yields:
+        The Span, to add attributes while it runs
+    """
+    parent = current_span.get()
+    remote = parse_traceparent(traceparent) if parent is None and traceparent else None
+    if parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    elif remote is not None:
+        trace_id, parent_id = remote
+    else:
+        trace_id, parent_id = secrets.token_hex(16), None
+
+    current = Span(name, trace_id, parent_id, attributes)
+    token = current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {str(e)}"
+        raise
+    finally:
+        current_span.reset(token)
+        current.end = time.time()
+        _finish(current)
+
+
+def traceparent():
+    """traceparent of the current span, None outside any trace"""
+    current = current_span.get()
+    return current.traceparent if current is not None else None
+
+
+def trace_envs() -> dict:
+    """Environment variables carrying the current trace into a sandbox-side process"""
+    header = traceparent()
+    return {"TRACEPARENT": header} if header else {}
+
+
+@contextmanager
+def collect():
+    """Collect the spans finished in this context (and its worker threads), for `breakdown`"""
+    spans = []
+    token = _collected.set(spans)
+    try:
+        yield spans
+    finally:
+        _collected.reset(token)
+
+
+def breakdown(spans: list) -> dict:
+    """
+    Time spent per operation in a request
+
+    Returns:
+        {"trace_id", "total", "operations": {name: {"count", "seconds"}}}; nested
+        operations are included in their parents' time
+    """
+    if not spans:
+        return {"trace_id": None, "total": 0.0, "operations": {}}
+    operations = {}
+    for finished in spans:
+        entry = operations.setdefault(finished.name, {"count": 0, "seconds": 0.0})
+        entry["count"] += 1
+        entry["seconds"] += finished.duration
+    for entry in operations.values():
+        entry["seconds"] = round(entry["seconds"], 3)
+    total = max(s.end for s in spans) - min(s.start for s in spans)
+    return {
+        "trace_id": spans[-1].trace_id,
+        "total": round(total, 3),
+        "operations": dict(sorted(operations.items(), key=lambda item: -item[1]["seconds"])),
+    }
+
+
+def _finish(finished: Span):
+    spans = _collected.get()
+    if spans is not None:
+        spans.append(finished)
+    exporter = get_span_exporter()
+    if exporter is not None:
+        exporter.submit(finished)
+
+
+# Exporters
+
+class JsonFileExporter:
+    """Appends one JSON span per line to a local file"""
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv("TRACE_FILE", "traces.jsonl")
+
+    def export(self, spans: list):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for finished in spans:
+                f.write(json.dumps(finished.to_dict(), default=str) + "\n")
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> list:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+class OtlpHttpExporter:
+    """Posts spans to an OTLP/HTTP collector, JSON encoding"""
+
+    def __init__(self, endpoint: str = None, headers: dict = None, timeout: float = 10.0):
+        base = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318").rstrip("/")
+        self.endpoint = endpoint or os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT", base + "/v1/traces")
+        if headers is None:
+            # "key1=value1,key2=value2", as in the OpenTelemetry SDKs
+            headers = dict(
+                item.split("=", 1) for item in os.getenv("OTEL_EXPORTER_OTLP_HEADERS", "").split(",") if "=" in item
+            )
+        self.headers = {"Content-Type": "application/json", **{k.strip(): v.strip() for k, v in headers.items()}}
+        self.timeout = timeout
+
+    def payload(self, spans: list) -> dict:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+                "scopeSpans": [{
+                    "scope": {"name": "e2b-crewai"},
+                    "spans": [self._span(finished) for finished in spans],
+                }],
+            }]
+        }
+
+    def export(self, spans: list):
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(self.payload(spans)).encode(),
+            method="POST",
+            headers=self.headers
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    @staticmethod
+    def _span(finished: Span) -> dict:
+        otlp = {
+            "traceId": finished.trace_id,
+            "spanId": finished.span_id,
+            "name": finished.name,
+            # SPAN_KIND_INTERNAL
+            "kind": 1,
+            "startTimeUnixNano": str(int(finished.start * 1e9)),
+            "endTimeUnixNano": str(int(finished.end * 1e9)),
+            "attributes": _otlp_attributes(finished.attributes),
+            "status": {"code": 2, "message": finished.error} if finished.error else {"code": 1},
+        }
+        if finished.parent_id:
+            otlp["parentSpanId"] = finished.parent_id
+        return otlp
+
+
+EXPORTERS = {
+    "json": JsonFileExporter,
+    "otlp": OtlpHttpExporter,
+}
+
+
+class SpanExporter:
+    """
+    Exports finished spans in batches from a background thread
+
+    Args:
+        exporters: Objects with an export(spans) method
+        interval: Seconds between two exports (TRACE_EXPORT_INTERVAL)
+        max_queue: Spans buffered before new ones are dropped
+    """
+
+    def __init__(self, exporters: list, interval: float = None, max_queue: int = 10000):
+        self.exporters = list(exporters)
+        self.interval = float(interval if interval is not None else os.getenv("TRACE_EXPORT_INTERVAL", "5"))
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._export_loop, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, finished: Span):
+        try:
+            self._queue.put_nowait(finished)
+        except queue.Full:
+            # Never slow down the traced code for an unreachable collector
+            pass
+
+    def flush(self):
+        spans = []
+        while True:
+            try:
+                spans.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not spans:
+            return
+        for exporter in self.exporters:
+            try:
+                exporter.export(spans)
+            except Exception as e:
+                logger.warning(f"Span export ({type(exporter).__name__}) failed: {str(e)}")
+
+    def shutdown(self):
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 10)
+        self.flush()
+
+    def _export_loop(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+
+_span_exporter = None
+_span_exporter_lock = threading.Lock()
+
+
+def get_span_exporter():
+    """Process-wide span exporter, None unless TRACE_EXPORTERS names at least one exporter"""
+    global _span_exporter
+    names = [name.strip().lower() for name in os.getenv("TRACE_EXPORTERS", "").split(",") if name.strip()]
+    if not names:
+        return None
+    with _span_exporter_lock:
+        if _span_exporter is None:
+            unknown = [name for name in names if name not in EXPORTERS]
+            if unknown:
+                logger.warning(f"Unknown trace exporters ignored: {', '.join(unknown)}")
+            _span_exporter = SpanExporter([EXPORTERS[name]() for name in names if name in EXPORTERS])
+            logger.info(f"Tracing enabled (exporters: {', '.join(names)})")
+        return _span_exporter
+
+
+def shutdown():
+    """Export the spans still buffered"""
+    with _span_exporter_lock:
+        exporter = _span_exporter
+    if exporter is not None:
+        exporter.shutdown()